@@ -0,0 +1,254 @@
+"""
+Combined entry analysis: one JSON LLM call returns sentiment, themes, emotions and the
+one-line reflection together, instead of one chat completion per analyzer.
+Each field is validated on its own; a missing or invalid field falls back to its keyword analyzer.
+Long entries are analyzed chunk by chunk in parallel and the chunk answers merged (chunking.py).
+"""
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Optional
+
+import analysis_cache
+import chunking
+import lexicon
+import term_stats
+from config import LLM_THEMES_ENABLED
+from emotions import EMOTION_TAXONOMY, compute_emotions_document
+from keywords import TokenizedDocument
+from llm import chat, get_model, is_available
+from metrics import ANALYSIS_CACHE, ANALYZER_PATH, STAGE_LATENCY
+from reflection import is_valid_reflection
+from sentiment import compute_sentiment_offline
+from themes import clean_llm_themes, extract_themes_tfidf
+
+# Bump when prompts or validation change so cached analyses from the old version are not reused.
+ANALYZER_VERSION = "2"
+SENTIMENT_LABELS = ("positive", "negative", "neutral", "mixed")
+
+ANALYSIS_THEMES_KEY = '"themes": up to {top_n} short theme tags, 1-3 words each, e.g. ["work stress", "family"].\n'
+ANALYSIS_SYSTEM_PROMPT = (
+    "You analyze one journal entry. Reply with ONLY a JSON object with these keys:\n"
+    '"score": number from -1 (very negative) to 1 (very positive), 0 = neutral.\n'
+    '"label": one of "positive", "negative", "neutral", "mixed" (mixed = clearly both, e.g. bittersweet).\n'
+    "{themes_key}"
+    '"emotions": 1-3 of: ' + ", ".join(EMOTION_TAXONOMY) + ".\n"
+    '"reflection": one short, warm sentence (under 15 words) acknowledging what they wrote, '
+    "e.g. \"That sounds exhausting.\" No labels, lists or advice.\n"
+    "No preamble, no markdown."
+)
+
+
+@dataclass
+class EntryAnalysis:
+    score: float
+    label: str
+    themes: list[str] = field(default_factory=list)
+    emotions: list[str] = field(default_factory=list)
+    reflection: Optional[str] = None
+    llm_used: bool = False  # True when the LLM answered (some fields may still be keyword fallbacks)
+    sentiment_source: Optional[str] = None  # "llm", "model" or "keyword"
+    lexicon_version: Optional[str] = None  # lexicon snapshot used by the keyword analyzers
+
+
+def _parse_json_object(raw: str) -> Optional[dict]:
+    """Parse the first JSON object in raw (tolerates code fences or a stray preamble)."""
+    match = re.search(r"\{.*\}", raw, re.DOTALL)
+    if not match:
+        return None
+    try:
+        parsed = json.loads(match.group(0))
+    except ValueError:
+        return None
+    return parsed if isinstance(parsed, dict) else None
+
+
+def _system_prompt(top_n: int) -> str:
+    themes_key = ANALYSIS_THEMES_KEY.format(top_n=top_n) if LLM_THEMES_ENABLED else ""
+    return ANALYSIS_SYSTEM_PROMPT.format(themes_key=themes_key)
+
+
+# Fields of the LLM answer that are cached; keyword fallbacks are recomputed on every call because they
+# depend on the user's term statistics, the lexicon and the sentiment model, none of which are in the key.
+_LLM_ANSWER_FIELDS = ("score", "label", "themes", "emotions", "reflection")
+
+
+def _cache_version() -> str:
+    # Without LLM themes the prompt and the themes in the result differ, so those analyses get their own keys
+    return ANALYZER_VERSION if LLM_THEMES_ENABLED else f"{ANALYZER_VERSION}-no-themes"
+
+
+def _analyze_chunk_llm(content: str, top_n: int) -> Optional[dict]:
+    raw = chat(
+        messages=[
+            {"role": "system", "content": _system_prompt(top_n)},
+            {"role": "user", "content": content},
+        ],
+        max_tokens=200,
+        response_format={"type": "json_object"},
+    )
+    return _parse_json_object(raw) if raw else None
+
+
+def analyze_entry_llm(content: str, top_n: int = 5) -> Optional[dict]:
+    """
+    One structured-output chat completion for the entry (one per chunk, in parallel, for entries longer
+    than LLM_CHUNK_CHARS). Return the raw parsed object, or the merged chunk answers, or None.
+    """
+    if not is_available() or not content.strip():
+        return None
+    chunks = chunking.chunk_text(content)
+    if len(chunks) == 1:
+        return _analyze_chunk_llm(chunks[0], top_n)
+    answers = chunking.map_chunks(lambda chunk: _analyze_chunk_llm(chunk, top_n), chunks)
+    return _merge_chunk_answers([(a, len(c)) for a, c in zip(answers, chunks) if a], top_n)
+
+
+def _merge_chunk_answers(answers: list[tuple[dict, int]], top_n: int) -> Optional[dict]:
+    """
+    Reduce per-chunk answers (parsed object, chunk length) to one object in the single-call shape.
+    Each field merges only the chunks where it is valid; the reflection comes from the chunk whose
+    score is closest to the merged score.
+    """
+    if not answers:
+        return None
+    merged: dict = {}
+    sentiments = [(s, w) for a, w in answers if (s := _valid_sentiment(a))]
+    if sentiments:
+        merged["score"] = round(chunking.weighted_mean((s[0] for s, _ in sentiments), (w for _, w in sentiments)), 3)
+        merged["label"] = chunking.merge_sentiment_labels([s[1] for s, _ in sentiments], [w for _, w in sentiments])
+    if LLM_THEMES_ENABLED:
+        theme_lists = [(_chunk_themes(a, top_n), w) for a, w in answers]
+        merged["themes"] = chunking.merge_ranked((t for t, _ in theme_lists), (w for _, w in theme_lists), top_n)
+    emotion_lists = [(_valid_emotions(a), w) for a, w in answers]
+    merged["emotions"] = chunking.merge_ranked((e for e, _ in emotion_lists), (w for _, w in emotion_lists), 3)
+    target = merged.get("score", 0.0)
+    candidates = []
+    for a, _ in answers:
+        reflection, sentiment = _valid_reflection(a), _valid_sentiment(a)
+        if reflection:
+            candidates.append((abs((sentiment[0] if sentiment else 0.0) - target), reflection))
+    if candidates:
+        merged["reflection"] = min(candidates, key=lambda c: c[0])[1]
+    return merged
+
+
+def _valid_sentiment(parsed: dict) -> Optional[tuple[float, str]]:
+    try:
+        score = float(parsed.get("score"))
+    except (TypeError, ValueError):
+        return None
+    if score != score:  # NaN
+        return None
+    label = str(parsed.get("label") or "").strip().lower()
+    if label not in SENTIMENT_LABELS:
+        return None
+    return round(max(-1.0, min(1.0, score)), 3), label
+
+
+def _valid_themes(parsed: dict, top_n: int, lex: lexicon.Lexicon) -> Optional[list[str]]:
+    raw = parsed.get("themes")
+    if isinstance(raw, str):
+        raw = raw.split(",")
+    if not isinstance(raw, list):
+        return None
+    return clean_llm_themes(raw, top_n, lex) or None
+
+
+def _chunk_themes(parsed: dict, top_n: int) -> list[str]:
+    raw = parsed.get("themes")
+    if isinstance(raw, str):
+        raw = raw.split(",")
+    return clean_llm_themes(raw, top_n) if isinstance(raw, list) else []
+
+
+def _keyword_themes(doc: TokenizedDocument, top_n: int, lex: lexicon.Lexicon, user_id: Optional[str]) -> list[str]:
+    """TF-IDF themes against the user's and global document frequencies (raw frequency without a user)."""
+    stats = term_stats.fetch_frequencies(user_id, term_stats.document_terms(doc)) if user_id else None
+    return extract_themes_tfidf(doc, stats, top_n, lex)
+
+
+def _valid_emotions(parsed: dict) -> Optional[list[str]]:
+    raw = parsed.get("emotions")
+    if not isinstance(raw, list):
+        return None
+    emotions: list[str] = []
+    for e in raw:
+        e = e.strip().lower() if isinstance(e, str) else None
+        if e in EMOTION_TAXONOMY and e not in emotions:
+            emotions.append(e)
+    return emotions[:3] or None
+
+
+def _valid_reflection(parsed: dict) -> Optional[str]:
+    raw = parsed.get("reflection")
+    if isinstance(raw, str) and is_valid_reflection(raw):
+        return raw.strip().strip('"').strip()
+    return None
+
+
+def _resolve(analyzer: str, llm_value, keyword_fn, *args):
+    """Use the validated LLM value when present, else the keyword analyzer; count which path won."""
+    if llm_value:
+        ANALYZER_PATH.inc(analyzer=analyzer, path="llm")
+        return llm_value
+    ANALYZER_PATH.inc(analyzer=analyzer, path="keyword")
+    return keyword_fn(*args)
+
+
+def analyze_entry(
+    content: str,
+    top_n: int = 5,
+    use_llm: bool = True,
+    doc: Optional[TokenizedDocument] = None,
+    user_id: Optional[str] = None,
+) -> EntryAnalysis:
+    """
+    Analyze an entry with at most one LLM round trip. Fields the LLM got wrong (or all of them
+    when no LLM is configured or use_llm is False) come from the keyword analyzers; reflection stays None.
+    The keyword analyzers share one TokenizedDocument (pass doc to reuse the caller's) and one
+    lexicon snapshot, so a reload mid-entry cannot mix vocabularies. With user_id, keyword themes are
+    ranked by TF-IDF against that user's document frequencies.
+    """
+    cache_key, parsed = None, None
+    if use_llm and is_available() and content.strip():
+        cache_key = analysis_cache.make_key(content, _cache_version(), get_model(), top_n)
+        parsed = analysis_cache.get(cache_key)
+        ANALYSIS_CACHE.inc(result="miss" if parsed is None else "hit")
+    if parsed is None:
+        with STAGE_LATENCY.time(stage="llm_analysis"):
+            parsed = (analyze_entry_llm(content, top_n) if use_llm else None) or {}
+        answer = {k: parsed[k] for k in _LLM_ANSWER_FIELDS if k in parsed}
+        if cache_key and answer:
+            # Only the LLM's own answer is cached (validated again below); never keyword fallbacks.
+            analysis_cache.put(cache_key, answer)
+    if doc is None:
+        doc = TokenizedDocument(content)
+    lex = lexicon.current()
+    with STAGE_LATENCY.time(stage="compute_sentiment"):
+        # Without a valid LLM answer the local model (if trained) beats the lexicon
+        sentiment = _valid_sentiment(parsed)
+        if sentiment:
+            sentiment_source = "llm"
+        else:
+            *sentiment, sentiment_source = compute_sentiment_offline(doc, lex)
+        ANALYZER_PATH.inc(analyzer="sentiment", path=sentiment_source)
+    with STAGE_LATENCY.time(stage="extract_themes"):
+        llm_themes = _valid_themes(parsed, top_n, lex) if LLM_THEMES_ENABLED else None
+        themes = _resolve("themes", llm_themes, _keyword_themes, doc, top_n, lex, user_id)
+    with STAGE_LATENCY.time(stage="compute_emotions"):
+        emotions = _resolve("emotions", _valid_emotions(parsed), compute_emotions_document, doc, lex)
+    reflection = _valid_reflection(parsed)
+    if reflection:
+        ANALYZER_PATH.inc(analyzer="reflection", path="llm")
+    analysis = EntryAnalysis(
+        score=sentiment[0],
+        label=sentiment[1],
+        themes=themes,
+        emotions=emotions,
+        reflection=reflection,
+        llm_used=bool(parsed),
+        sentiment_source=sentiment_source,
+        lexicon_version=lex.version,
+    )
+    return analysis
@@ -0,0 +1,94 @@
+"""
+Persistent analysis cache: the LLM's analysis answers keyed by normalized content hash plus analyzer
+version and model name, so duplicate submits, templates, re-edits and backfills skip the LLM.
+Keyword fallbacks are not stored; callers recompute them per call.
+Local SQLite file, size-bounded with least-recently-used eviction. Safe across threads and
+processes (each process opens its own connection; WAL mode).
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from config import ANALYSIS_CACHE_MAX_ENTRIES, ANALYSIS_CACHE_PATH
+
+# Evict at most every N writes; the table may briefly exceed the bound by that much.
+_EVICT_EVERY = 100
+
+_lock = threading.Lock()
+_conn: Optional[sqlite3.Connection] = None
+_conn_pid: Optional[int] = None
+_writes = 0
+
+
+def normalize_content(content: str) -> str:
+    """Case- and whitespace-insensitive form so trivially different copies share a cache entry."""
+    return re.sub(r"\s+", " ", content).strip().lower()
+
+
+def make_key(content: str, analyzer_version: str, model: str, top_n: int) -> str:
+    digest = hashlib.sha256(normalize_content(content).encode("utf-8")).hexdigest()
+    return f"{analyzer_version}:{model}:{top_n}:{digest}"
+
+
+def _connection() -> Optional[sqlite3.Connection]:
+    """Return this process's connection (re-opened after fork), or None when the cache is disabled."""
+    global _conn, _conn_pid
+    if not ANALYSIS_CACHE_PATH:
+        return None
+    if _conn is None or _conn_pid != os.getpid():
+        conn = sqlite3.connect(ANALYSIS_CACHE_PATH, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS analysis_cache ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, last_used REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_analysis_cache_last_used ON analysis_cache (last_used)")
+        conn.commit()
+        _conn, _conn_pid = conn, os.getpid()
+    return _conn
+
+
+def get(key: str) -> Optional[dict]:
+    """Return the cached LLM answer dict and mark it recently used, or None."""
+    with _lock:
+        conn = _connection()
+        if conn is None:
+            return None
+        try:
+            row = conn.execute("SELECT value FROM analysis_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE analysis_cache SET last_used = ? WHERE key = ?", (time.time(), key))
+            conn.commit()
+            return json.loads(row[0])
+        except (sqlite3.Error, ValueError):
+            return None
+
+
+def put(key: str, value: dict) -> None:
+    """Store an LLM answer dict; every _EVICT_EVERY writes, trim to ANALYSIS_CACHE_MAX_ENTRIES by last use."""
+    global _writes
+    with _lock:
+        conn = _connection()
+        if conn is None:
+            return
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO analysis_cache (key, value, last_used) VALUES (?, ?, ?)",
+                (key, json.dumps(value), time.time()),
+            )
+            _writes += 1
+            if _writes % _EVICT_EVERY == 0:
+                conn.execute(
+                    "DELETE FROM analysis_cache WHERE key IN ("
+                    " SELECT key FROM analysis_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                    (ANALYSIS_CACHE_MAX_ENTRIES,),
+                )
+            conn.commit()
+        except sqlite3.Error:
+            pass  # the cache is an optimization; never fail an analysis because of it
@@ -0,0 +1,214 @@
+"""
+Backfill / re-analysis: recompute sentiment_result and theme_result for existing entries
+(e.g. after a lexicon change or switching LLM models) without going through Kafka.
+
+Streams entries from the journal DB in keyset-paginated chunks (or from a JSONL dump), runs the
+analyzers across a process pool (or, with --keywords-only, one vectorized batch_analysis pass per
+chunk), bulk-upserts each chunk and checkpoints progress so an interrupted run resumes where it stopped.
+
+Usage:
+  python backfill.py                              # all entries from JOURNAL_DB_URL
+  python backfill.py --user <uuid> --since 2025-01-01
+  python backfill.py --jsonl entries.jsonl        # one entry per line: entryId/id, userId/user_id, content, createdAt/created_at
+  python backfill.py --keywords-only              # skip the LLM (fast vectorized keyword re-run)
+  python backfill.py --stale-lexicon              # only lexicon-scored rows stamped with an older lexicon version
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from functools import partial
+from typing import Iterator, Optional
+
+from sqlalchemy import create_engine, text
+
+import lexicon
+from batch_analysis import analyze_batch
+from config import JOURNAL_DB_URL
+from consumer import analyze_message, write_batch
+from db import engine as analytics_engine, init_db
+
+DEFAULT_CHECKPOINT = ".backfill-checkpoint.json"
+
+
+def _load_checkpoint(path: str, source: str) -> Optional[dict]:
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        checkpoint = json.load(f)
+    return checkpoint if checkpoint.get("source") == source else None
+
+
+def _save_checkpoint(path: str, checkpoint: dict) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp, path)  # atomic, so a crash never leaves a half-written checkpoint
+
+
+def iter_db_chunks(
+    chunk_size: int,
+    after: Optional[dict] = None,
+    user_id: Optional[str] = None,
+    since: Optional[datetime] = None,
+) -> Iterator[tuple[list[dict], dict]]:
+    """Yield (events, position) chunks ordered by (created_at, id) using keyset pagination."""
+    engine = create_engine(JOURNAL_DB_URL, pool_pre_ping=True)
+    last_created = datetime.fromisoformat(after["created_at"]) if after else None
+    last_id = after["id"] if after else None
+    filters = ""
+    params: dict = {"limit": chunk_size}
+    if user_id:
+        filters += " AND user_id = :uid"
+        params["uid"] = user_id
+    if since:
+        filters += " AND created_at >= :since"
+        params["since"] = since
+    with engine.connect() as conn:
+        while True:
+            keyset = ""
+            if last_created is not None:
+                keyset = " AND (created_at, id) > (:last_created, CAST(:last_id AS uuid))"
+                params.update(last_created=last_created, last_id=last_id)
+            rows = conn.execute(
+                text(f"""
+                    SELECT id, user_id, content, created_at FROM journal_entry
+                    WHERE true{filters}{keyset}
+                    ORDER BY created_at, id
+                    LIMIT :limit
+                """),
+                params,
+            ).fetchall()
+            if not rows:
+                return
+            last_created, last_id = rows[-1][3], str(rows[-1][0])
+            events = [
+                {"entryId": str(r[0]), "userId": r[1], "content": r[2], "createdAt": r[3].isoformat()}
+                for r in rows
+            ]
+            yield events, {"created_at": last_created.isoformat(), "id": last_id}
+
+
+def iter_jsonl_chunks(path: str, chunk_size: int, after: Optional[dict] = None) -> Iterator[tuple[list[dict], dict]]:
+    """Yield (events, position) chunks from a JSONL dump; the position is the last line consumed."""
+    skip = after["line"] if after else 0
+    events: list[dict] = []
+    line_no = 0
+    with open(path) as f:
+        for line_no, line in enumerate(f, start=1):
+            if line_no <= skip or not line.strip():
+                continue
+            row = json.loads(line)
+            events.append({
+                "entryId": row.get("entryId") or row.get("id"),
+                "userId": row.get("userId") or row.get("user_id"),
+                "content": row.get("content"),
+                "createdAt": row.get("createdAt") or row.get("created_at"),
+            })
+            if len(events) >= chunk_size:
+                yield events, {"line": line_no}
+                events = []
+    if events:
+        yield events, {"line": line_no}
+
+
+def analyze_keywords_chunk(events: list[dict]) -> list[dict]:
+    """Keyword-only results for a whole chunk from one vectorized analyze_batch call (model sentiment, per-user TF-IDF themes)."""
+    analyses = analyze_batch([e.get("content") or "" for e in events], user_ids=[e.get("userId") for e in events])
+    results = (analyze_message(e, use_llm=False, analysis=a) for e, a in zip(events, analyses))
+    return [r for r in results if r is not None]
+
+
+def stale_lexicon_entry_ids(version: str) -> set[str]:
+    """
+    Entries whose keyword-path results (lexicon sentiment) predate the given lexicon version. LLM and
+    model rows are left alone: their sentiment does not come from the lexicon.
+    """
+    with analytics_engine.connect() as conn:
+        rows = conn.execute(
+            text("""
+                SELECT CAST(entry_id AS text) FROM sentiment_result
+                WHERE lexicon_version IS DISTINCT FROM :version
+                  AND (sentiment_source IS NULL OR sentiment_source = 'keyword')
+            """),
+            {"version": version},
+        ).all()
+    return {r[0] for r in rows}
+
+
+def _init_worker() -> None:
+    """
+    Forked workers inherit the parent's pooled connections, which it used in init_db; sharing a socket
+    corrupts the protocol stream. Drop them without closing, so each worker opens its own.
+    """
+    analytics_engine.dispose(close=False)
+
+
+def run_backfill(args: argparse.Namespace) -> None:
+    init_db()
+    # The checkpoint only applies to a run over the same source and filters
+    source = f"jsonl:{args.jsonl}" if args.jsonl else f"db:{args.user or '*'}:{args.since or ''}"
+    stale = None
+    if args.stale_lexicon:
+        version = lexicon.current().version
+        source += f":stale-lexicon:{version}"
+        stale = stale_lexicon_entry_ids(version)
+        print(f"{len(stale)} entries analyzed with a lexicon other than version {version}", flush=True)
+    after = None if args.reset else _load_checkpoint(args.checkpoint, source)
+    if after:
+        print(f"Resuming from checkpoint {after}", flush=True)
+    if args.jsonl:
+        chunks = iter_jsonl_chunks(args.jsonl, args.chunk_size, after)
+    else:
+        since = datetime.fromisoformat(args.since) if args.since else None
+        chunks = iter_db_chunks(args.chunk_size, after, args.user, since)
+
+    analyze = partial(analyze_message, use_llm=True)
+    total = 0
+    started = time.monotonic()
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker) as pool:
+        for events, position in chunks:
+            if stale is not None:
+                events = [e for e in events if str(e.get("entryId")) in stale]
+            chunk_started = time.monotonic()
+            if args.keywords_only:
+                results = analyze_keywords_chunk(events)
+            else:
+                chunksize = max(1, len(events) // (args.workers * 4))
+                results = [r for r in pool.map(analyze, events, chunksize=chunksize) if r is not None]
+            write_batch(results)
+            _save_checkpoint(args.checkpoint, {"source": source, **position})
+            total += len(results)
+            elapsed = time.monotonic() - started
+            chunk_rate = len(results) / max(time.monotonic() - chunk_started, 1e-6)
+            print(
+                f"{total} rows upserted ({chunk_rate:.1f} rows/s this chunk, {total / max(elapsed, 1e-6):.1f} rows/s overall)",
+                flush=True,
+            )
+    print(f"Backfill done: {total} rows in {time.monotonic() - started:.1f}s", flush=True)
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Re-analyze existing journal entries into the analytics DB.")
+    parser.add_argument("--jsonl", help="read entries from a JSONL dump instead of JOURNAL_DB_URL")
+    parser.add_argument("--user", help="only entries for this user id (journal DB source)")
+    parser.add_argument("--since", help="only entries created at or after this ISO date (journal DB source)")
+    parser.add_argument("--chunk-size", type=int, default=500, help="entries per chunk / transaction (default 500)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="analyzer processes for LLM runs (default: CPU count)")
+    parser.add_argument("--keywords-only", action="store_true", help="skip the LLM and score each chunk with the vectorized keyword analyzer")
+    parser.add_argument("--stale-lexicon", action="store_true", help="only re-analyze keyword-path rows stamped with an older lexicon version")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT, help=f"checkpoint file (default {DEFAULT_CHECKPOINT})")
+    parser.add_argument("--reset", action="store_true", help="ignore an existing checkpoint and start from the beginning")
+    args = parser.parse_args(argv)
+    try:
+        run_backfill(args)
+    except KeyboardInterrupt:
+        print("Interrupted; re-run the same command to resume from the last checkpoint.", file=sys.stderr, flush=True)
+        sys.exit(130)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""
+Vectorized keyword analysis for bulk scoring (backfills, benchmark corpora).
+
+analyze_batch tokenizes every text once, builds one sparse document-term matrix for the whole
+batch and derives lexicon sentiment, emotion hits and top-N themes with array operations instead
+of a Python loop per entry. Like the consumer's keyword path, sentiment comes from the local model
+when one is trained (one matrix product for the batch) and, given user ids, themes are ranked by
+TF-IDF against each user's document frequencies (one lookup per user per batch). Results match
+analyze_entry(use_llm=False) on each text.
+"""
+from collections import defaultdict
+from itertools import chain
+from typing import Optional
+
+import numpy as np
+from scipy import sparse
+
+import lexicon
+import term_stats
+from analysis import EntryAnalysis
+from emotions import EMOTION_TAXONOMY
+from keywords import TokenizedDocument, tokenize
+from sentiment_model import get_model as get_sentiment_model
+from themes import extract_themes_tfidf
+
+_EMOTION_INDEX = {emotion: i for i, emotion in enumerate(EMOTION_TAXONOMY)}
+
+
+def _sentiment_polarity(word: str, lex: lexicon.Lexicon) -> int:
+    # Same precedence as the lexicon's sentiment matcher: negative wins if a word were in both lists.
+    if word in lex.negative_words:
+        return -1
+    if word in lex.positive_words:
+        return 1
+    return 0
+
+
+def _emotion_keywords(lex: lexicon.Lexicon) -> tuple[dict[str, list[int]], list[tuple[tuple[str, ...], list[int]]]]:
+    words: dict[str, list[int]] = {}
+    phrases: list[tuple[tuple[str, ...], list[int]]] = []
+    for keyword, emotions in lex.keyword_to_emotions.items():
+        parts = tuple(tokenize(keyword))
+        columns = [_EMOTION_INDEX[e] for e in emotions]
+        if len(parts) == 1:
+            words[parts[0]] = columns
+        elif parts:
+            phrases.append((parts, columns))
+    return words, phrases
+
+
+def _phrase_rows(token_ids: np.ndarray, doc_ids: np.ndarray, term_ids: dict[str, int], parts: tuple[str, ...]) -> np.ndarray:
+    """Rows (documents) in which the phrase occurs as consecutive tokens."""
+    n = len(parts)
+    if any(p not in term_ids for p in parts) or len(token_ids) < n:
+        return np.empty(0, dtype=np.int64)
+    span = len(token_ids) - n + 1
+    mask = doc_ids[:span] == doc_ids[n - 1:]
+    for offset, part in enumerate(parts):
+        mask &= token_ids[offset:offset + span] == term_ids[part]
+    return np.unique(doc_ids[:span][mask])
+
+
+def _user_frequencies(
+    docs: list[TokenizedDocument], user_ids: list[Optional[str]],
+) -> list[Optional[term_stats.DocumentFrequencies]]:
+    """Each document's TF-IDF frequencies: one lookup per user covering all of that user's documents."""
+    terms_by_user: dict[str, set[str]] = defaultdict(set)
+    for doc, user_id in zip(docs, user_ids):
+        if user_id:
+            terms_by_user[user_id] |= term_stats.document_terms(doc)
+    stats = {user_id: term_stats.fetch_frequencies(user_id, terms) for user_id, terms in terms_by_user.items()}
+    return [stats.get(user_id) if user_id else None for user_id in user_ids]
+
+
+def analyze_batch(texts: list[str], top_n: int = 5, user_ids: Optional[list[Optional[str]]] = None) -> list[EntryAnalysis]:
+    """
+    Keyword-only analysis of many texts in one vectorized pass (same output as analyze_entry(use_llm=False),
+    with user_id=user_ids[i] for text i when user_ids is given).
+    """
+    n_docs = len(texts)
+    if n_docs == 0:
+        return []
+    lex = lexicon.current()
+    docs = [TokenizedDocument(t or "") for t in texts]
+    tokenized = [d.tokens for d in docs]
+    lengths = np.fromiter(map(len, tokenized), dtype=np.int64, count=n_docs)
+    # Term ids in order of first appearance across the batch
+    flat = list(chain.from_iterable(tokenized))
+    words = list(dict.fromkeys(flat))
+    term_ids = {w: i for i, w in enumerate(words)}
+    token_ids = np.fromiter(map(term_ids.__getitem__, flat), dtype=np.int64, count=len(flat))
+    doc_ids = np.repeat(np.arange(n_docs, dtype=np.int64), lengths)
+    n_terms = len(words)
+
+    # One (doc, term) cell per distinct pair: count and position of its first occurrence
+    keys = doc_ids * max(n_terms, 1) + token_ids
+    cell_keys, first_pos, cell_counts = np.unique(keys, return_index=True, return_counts=True)
+    cell_docs, cell_terms = np.divmod(cell_keys, max(n_terms, 1))
+    presence = sparse.csr_matrix(
+        (np.ones(len(cell_keys), dtype=np.int32), (cell_docs, cell_terms)), shape=(n_docs, n_terms)
+    )
+
+    # Sentiment: distinct positive / negative lexicon words per document
+    polarity = np.fromiter((_sentiment_polarity(w, lex) for w in words), dtype=np.int8, count=n_terms)
+    pos = presence @ (polarity == 1).astype(np.int32)
+    neg = presence @ (polarity == -1).astype(np.int32)
+    total = pos + neg
+    with np.errstate(invalid="ignore", divide="ignore"):
+        scores = np.where(total > 0, (pos - neg) / np.maximum(total, 1), 0.0)
+    labels = np.select(
+        [total == 0, (pos >= 1) & (neg >= 1), scores > 0.2, scores < -0.2],
+        ["neutral", "mixed", "positive", "negative"],
+        default="neutral",
+    )
+
+    # Emotions: word hits via the term matrix, phrase hits via shifted token comparisons
+    emotion_words, emotion_phrases = _emotion_keywords(lex)
+    emotion_terms = np.zeros((n_terms, len(EMOTION_TAXONOMY)), dtype=np.int32)
+    for word, columns in emotion_words.items():
+        term = term_ids.get(word)
+        if term is not None:
+            emotion_terms[term, columns] = 1
+    hits = np.asarray(presence @ emotion_terms) > 0
+    for parts, columns in emotion_phrases:
+        rows = _phrase_rows(token_ids, doc_ids, term_ids, parts)
+        hits[np.ix_(rows, columns)] = True
+    # Taxonomy order, at most 3
+    hits &= np.cumsum(hits, axis=1) <= 3
+
+    # Themes: most frequent non-stop words (len > 2); ties keep first-occurrence order like Counter.most_common
+    eligible = np.fromiter((len(w) > 2 and w not in lex.stop_words for w in words), dtype=bool, count=n_terms)
+    keep = eligible[cell_terms] if n_terms else np.zeros(0, dtype=bool)
+    t_docs, t_terms, t_counts, t_first = cell_docs[keep], cell_terms[keep], cell_counts[keep], first_pos[keep]
+    order = np.lexsort((t_first, -t_counts, t_docs))
+    t_docs, t_terms = t_docs[order], t_terms[order]
+    group_start = np.searchsorted(t_docs, t_docs, side="left")
+    rank = np.arange(len(t_docs)) - group_start
+    top = rank < top_n
+    theme_bounds = np.searchsorted(t_docs[top], np.arange(n_docs + 1), side="left")
+
+    # Plain Python lists for the per-entry assembly (indexing numpy scalars one at a time is slow)
+    top_terms, bounds = t_terms[top].tolist(), theme_bounds.tolist()
+    themes = [[words[t] for t in top_terms[bounds[d]:bounds[d + 1]]] for d in range(n_docs)]
+    if user_ids is not None:
+        # TF-IDF ranks per user; documents without enough counted entries keep the raw-frequency themes
+        for d, stats in enumerate(_user_frequencies(docs, user_ids)):
+            if stats is not None:
+                themes[d] = extract_themes_tfidf(docs[d], stats, top_n, lex)
+    emotion_rows = [[EMOTION_TAXONOMY[e] for e in row] for row in _row_indices(hits)]
+    sentiments = [(round(score, 3), label) for score, label in zip(scores.tolist(), labels.tolist())]
+    sentiment_source = "keyword"
+    model = get_sentiment_model()
+    if model is not None:
+        sentiments, sentiment_source = model.predict_batch(docs), "model"
+    return [
+        EntryAnalysis(
+            score=score,
+            label=label,
+            themes=themes[d],
+            emotions=emotion_rows[d],
+            sentiment_source=sentiment_source,
+            lexicon_version=lex.version,
+        )
+        for d, (score, label) in enumerate(sentiments)
+    ]
+
+
+def _row_indices(mask: np.ndarray) -> list[list[int]]:
+    """Column indexes of the True cells of each row."""
+    rows, cols = np.nonzero(mask)
+    bounds = np.searchsorted(rows, np.arange(mask.shape[0] + 1)).tolist()
+    cols = cols.tolist()
+    return [cols[bounds[d]:bounds[d + 1]] for d in range(mask.shape[0])]
@@ -0,0 +1,146 @@
+"""
+Map-reduce helpers for long entries: the LLM sees sentence-aligned chunks of at most LLM_CHUNK_CHARS
+instead of long entries being skipped or truncated.
+
+Chunks of one entry are analyzed in parallel on a shared pool of LLM_CHUNK_CONCURRENCY threads (the
+cap applies across all entries in the process), so a long entry costs about one chunk's latency.
+Per-chunk answers are reduced with length weights: a chunk's score counts in proportion to its
+share of the text, and themes/emotions are ranked by the total weight of the chunks naming them.
+"""
+import re
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Optional, Sequence, TypeVar
+
+from config import LLM_CHUNK_CHARS, LLM_CHUNK_CONCURRENCY
+
+T = TypeVar("T")
+
+# Split after sentence punctuation (with optional closing quotes/brackets) or at blank-ish line breaks
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?…])[\"')\]]*\s+|\n\s*")
+
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def split_sentences(text: str) -> list[str]:
+    return [s.strip() for s in _SENTENCE_END_RE.split(text) if s and s.strip()]
+
+
+def _split_long(sentence: str, max_chars: int) -> list[str]:
+    """Break one over-long sentence at whitespace (or hard, for a single giant word)."""
+    parts: list[str] = []
+    while len(sentence) > max_chars:
+        cut = sentence.rfind(" ", 0, max_chars + 1)
+        if cut <= 0:
+            cut = max_chars
+        parts.append(sentence[:cut].strip())
+        sentence = sentence[cut:].strip()
+    if sentence:
+        parts.append(sentence)
+    return parts
+
+
+def chunk_text(text: str, max_chars: int = LLM_CHUNK_CHARS) -> list[str]:
+    """Greedily pack whole sentences into chunks of at most max_chars. Short text is one chunk."""
+    if len(text) <= max_chars:
+        return [text] if text.strip() else []
+    chunks: list[str] = []
+    current = ""
+    for sentence in split_sentences(text):
+        for piece in _split_long(sentence, max_chars):
+            if current and len(current) + 1 + len(piece) > max_chars:
+                chunks.append(current)
+                current = ""
+            current = f"{current} {piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def excerpt(text: str, max_chars: int = LLM_CHUNK_CHARS) -> str:
+    """
+    Whole sentences from the start and the end of text within max_chars, joined by " ... "
+    (for single-answer prompts such as the reflection, which cannot be merged across chunks).
+    """
+    if len(text) <= max_chars:
+        return text
+    sentences = split_sentences(text)
+    head: list[str] = []
+    tail: list[str] = []
+    used = 0
+    i, j = 0, len(sentences) - 1
+    while i <= j:
+        # Alternate start and end so the excerpt shows how the entry opens and how it ends
+        take_head = len(head) <= len(tail)
+        sentence = sentences[i] if take_head else sentences[j]
+        if used + len(sentence) + 5 > max_chars:
+            break
+        used += len(sentence) + 1
+        if take_head:
+            head.append(sentence)
+            i += 1
+        else:
+            tail.append(sentence)
+            j -= 1
+    if not head:
+        return _split_long(text, max_chars)[0]
+    joined = " ".join(head)
+    if i <= j and tail:
+        return f"{joined} ... {' '.join(reversed(tail))}"
+    return f"{joined} {' '.join(reversed(tail))}".strip()
+
+
+def _get_pool() -> ThreadPoolExecutor:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=max(1, LLM_CHUNK_CONCURRENCY), thread_name_prefix="llm-chunk")
+    return _pool
+
+
+def map_chunks(fn: Callable[[str], T], chunks: Sequence[str]) -> list[T]:
+    """fn over the chunks in parallel (shared, capped pool), results in chunk order. One chunk runs inline."""
+    if len(chunks) <= 1:
+        return [fn(c) for c in chunks]
+    return list(_get_pool().map(fn, chunks))
+
+
+def weighted_mean(values: Iterable[float], weights: Iterable[float]) -> Optional[float]:
+    total = weighted = 0.0
+    for value, weight in zip(values, weights):
+        total += weight
+        weighted += weight * value
+    return weighted / total if total else None
+
+
+def merge_sentiment_labels(labels: Sequence[str], weights: Sequence[float]) -> str:
+    """Heaviest label, except that substantial positive and negative parts make the whole entry mixed."""
+    totals: dict[str, float] = defaultdict(float)
+    for label, weight in zip(labels, weights):
+        totals[label] += weight
+    if not any(totals.values()):
+        return "neutral"
+    positive, negative = totals.get("positive", 0.0), totals.get("negative", 0.0)
+    if positive and negative and min(positive, negative) >= 0.25 * sum(totals.values()):
+        return "mixed"
+    return max(totals, key=lambda label: totals[label])
+
+
+def merge_ranked(lists: Iterable[Optional[list[str]]], weights: Iterable[float], top_n: int) -> list[str]:
+    """
+    Merge per-chunk tag lists: a tag scores the summed weight of the chunks naming it (case-insensitive,
+    first spelling kept). Ties keep first appearance, so a single chunk's list comes back unchanged.
+    """
+    scores: dict[str, float] = defaultdict(float)
+    spelling: dict[str, str] = {}
+    for tags, weight in zip(lists, weights):
+        for tag in dict.fromkeys(t.strip().lower() for t in tags or [] if isinstance(t, str) and t.strip()):
+            scores[tag] += weight
+        for t in tags or []:
+            if isinstance(t, str) and t.strip():
+                spelling.setdefault(t.strip().lower(), t.strip())
+    ranked = sorted(scores, key=lambda tag: -scores[tag])
+    return [spelling[tag] for tag in ranked[:top_n]]
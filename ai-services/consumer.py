@@ -1,16 +1,78 @@
-"""Consume EntryCreated from Kafka; compute sentiment and themes; store in Analytics DB."""
+"""
+Consume entry events from Kafka; compute sentiment and themes; store in Analytics DB.
+entry.created and entry.updated are (re-)analyzed; entry.deleted removes the entry's rows. Each event
+moves the entry's contribution to the rollups and document frequencies instead of recomputing them.
+"""
 import json
 import sys
+import time
 import uuid
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from datetime import datetime, timezone
-from kafka import KafkaConsumer
+from typing import Optional
+
+from kafka import ConsumerRebalanceListener, KafkaConsumer
+from kafka.structs import OffsetAndMetadata
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
 from sqlalchemy.orm import Session
 
-from config import KAFKA_BOOTSTRAP_SERVERS, KAFKA_TOPIC_ENTRY_CREATED
-from db import init_db, Session as DBSession, SentimentResult, ThemeResult
-from emotions import compute_emotions
-from sentiment import compute_sentiment
-from themes import extract_themes
+import lexicon
+from analysis import EntryAnalysis, analyze_entry
+from config import (
+    CONSUMER_BATCH_SIZE,
+    CONSUMER_DEGRADE_LAG,
+    CONSUMER_MAX_IN_FLIGHT,
+    CONSUMER_POLL_TIMEOUT_MS,
+    CONSUMER_RECOVER_LAG,
+    CONSUMER_WORKERS,
+    CONSUMER_WRITE_RETRIES,
+    KAFKA_BOOTSTRAP_SERVERS,
+    KAFKA_TOPIC_ENTRY_CREATED,
+    METRICS_PORT,
+    METRICS_REFRESH_SECONDS,
+    REENRICH_BATCH_SIZE,
+    REENRICH_INTERVAL_SECONDS,
+    REENRICH_MAX_ATTEMPTS,
+)
+from db import (
+    init_db,
+    Session as DBSession,
+    claim_reenrichment_batch,
+    content_hash,
+    delete_entry_results,
+    sync_reenrichment_queue,
+    upsert_sentiment_results,
+    upsert_theme_results,
+)
+from emotions import emotion_mask
+from keywords import TokenizedDocument
+from llm import is_available
+from metrics import (
+    CONSUMER_DEGRADED,
+    CONSUMER_LAG,
+    MESSAGES_PER_SECOND,
+    MESSAGES_TOTAL,
+    REENRICHED_TOTAL,
+    STAGE_LATENCY,
+    WRITE_SKIPPED,
+    start_metrics_server,
+)
+from offsets import OffsetTracker
+from reflection_stage import ReflectionStage
+from rollups import apply_rollup_deltas, fetch_existing, remove_rollup_contributions
+from term_stats import apply_df_deltas, remove_df_counts
+from theme_registry import assign_theme_ids, replace_entry_themes
+
+
+# Event types on the entry topic (the "type" field; events without one are entry.created)
+ENTRY_CREATED = "entry.created"
+ENTRY_UPDATED = "entry.updated"
+ENTRY_DELETED = "entry.deleted"
+
+
+def _entry_id(data: dict):
+    return uuid.UUID(data["entryId"]) if isinstance(data.get("entryId"), str) else data.get("entryId")
 
 
 def _parse_entry_created_at(data: dict):
@@ -32,21 +94,264 @@ def _parse_entry_created_at(data: dict):
     return None
 
 
-def process_message(data: dict) -> None:
-    entry_id = uuid.UUID(data["entryId"]) if isinstance(data.get("entryId"), str) else data.get("entryId")
+def analyze_message(
+    data: dict, use_llm: bool = True, defer_llm: bool = False, analysis: Optional[EntryAnalysis] = None
+) -> Optional[dict]:
+    """
+    Run the analyzers for one event. Return a result dict ready for write_results, or None to skip.
+    defer_llm analyzes keyword-only now and marks the result provisional, queued for LLM re-enrichment.
+    analysis is a precomputed result (e.g. from batch_analysis.analyze_batch); the analyzers are skipped.
+    """
+    entry_id = _entry_id(data)
     user_id = data.get("userId")
     content = data.get("content") or ""
     if not user_id or not entry_id:
+        return None
+    if analysis is None:
+        # Tokenize once; the sentiment, theme and emotion keyword analyzers all read this document.
+        doc = TokenizedDocument(content)
+        analysis = analyze_entry(content, use_llm=use_llm and not defer_llm, doc=doc, user_id=user_id)
+    return {
+        "entry_id": entry_id,
+        "user_id": user_id,
+        "entry_created_at": _parse_entry_created_at(data),
+        "score": analysis.score,
+        "label": analysis.label,
+        "emotions": analysis.emotions,
+        "themes": analysis.themes,
+        "reflection": analysis.reflection,
+        "content": content,
+        "previous_content": data.get("previousContent"),  # entry.updated: what the entry said before
+        "llm_used": analysis.llm_used,
+        "sentiment_source": analysis.sentiment_source,
+        "lexicon_version": analysis.lexicon_version,
+        "provisional": defer_llm and is_available(),
+    }
+
+
+def handle_event(data: dict, use_llm: bool = True, defer_llm: bool = False) -> Optional[dict]:
+    """
+    Turn one entry event into a result for write_results: an analysis for entry.created/entry.updated,
+    a deletion marker for entry.deleted. None to skip (invalid or unknown event).
+    """
+    event_type = data.get("type") or ENTRY_CREATED
+    if event_type == ENTRY_DELETED:
+        entry_id = _entry_id(data)
+        if not entry_id:
+            return None
+        return {"entry_id": entry_id, "user_id": data.get("userId"), "content": data.get("content"), "deleted": True}
+    if event_type not in (ENTRY_CREATED, ENTRY_UPDATED):
+        print(f"Skipping unknown event type {event_type!r}", file=sys.stderr, flush=True)
+        return None
+    return analyze_message(data, use_llm=use_llm, defer_llm=defer_llm)
+
+
+def _collapse_events(results: list[dict]) -> list[dict]:
+    """
+    The last event per entry wins (events of one entry arrive in order); ON CONFLICT can't touch one
+    row twice per statement anyway. Its term move must start from the content stored before the first
+    of those events, so that content becomes the update's previous_content (or the delete's content).
+    """
+    first: dict = {}
+    last: dict = {}
+    for r in results:
+        first.setdefault(r["entry_id"], r)
+        last[r["entry_id"]] = r
+    final = []
+    for entry_id, r in last.items():
+        head = first[entry_id]
+        before = head.get("previous_content")
+        if before is None and not head.get("deleted"):
+            before = head.get("content")  # a created (or replayed) entry: stored as this content, if at all
+        if head is not r and before is not None:
+            r = {**r, "content": before} if r.get("deleted") else {**r, "previous_content": before}
+        final.append(r)
+    return final
+
+
+def _reenrichment_applies(old: Optional[dict], result: dict) -> bool:
+    """
+    A re-enrichment result replaces only the provisional row it was queued for: not a deleted entry,
+    not a final result written meanwhile (by this or another consumer), not a newer edit.
+    """
+    return (
+        old is not None and old["provisional"]
+        and old["content_hash"] in (None, content_hash(result["content"]))
+    )
+
+
+def write_results(session: Session, results: list[dict]) -> None:
+    """
+    Upsert sentiment and theme rows for a batch of analyzed entries, map their themes to canonical
+    theme ids (entry_theme) and apply the matching daily rollup deltas (caller commits). Deletion
+    results remove the entry's rows and subtract its contribution. Idempotent per entry_id, so replays
+    and rebalances never duplicate rows or double-count aggregates.
+
+    Re-enrichment results (analyzed from queued content) are checked under the row lock and skipped
+    if the row has moved on; skipped results are flagged "superseded".
+    """
+    if not results:
         return
-    entry_created_at = _parse_entry_created_at(data)
+    # An entry event in the same batch is newer than the queued content
+    live = {r["entry_id"] for r in results if not r.get("reenrichment")}
+    for r in results:
+        if r.get("reenrichment") and r["entry_id"] in live:
+            r["superseded"] = True
+    final = _collapse_events([r for r in results if not r.get("superseded")])
+    existing = fetch_existing(session, [r["entry_id"] for r in final])
+    for r in final:
+        if r.get("reenrichment") and not _reenrichment_applies(existing.get(r["entry_id"]), r):
+            r["superseded"] = True
+    final = [r for r in final if not r.get("superseded")]
+    deleted = [r for r in final if r.get("deleted")]
+    if deleted:
+        remove_rollup_contributions(session, [existing[r["entry_id"]] for r in deleted if r["entry_id"] in existing])
+        remove_df_counts(session, existing, deleted)
+        delete_entry_results(session, [r["entry_id"] for r in deleted])
+    latest = [r for r in final if not r.get("deleted")]
+    if not latest:
+        return
+    now = datetime.utcnow()
+    upsert_sentiment_results(session, [
+        {
+            "entry_id": r["entry_id"],
+            "user_id": r["user_id"],
+            "score": r["score"],
+            "label": r["label"],
+            "emotions": r["emotions"] or None,
+            "emotion_mask": emotion_mask(r["emotions"]),
+            "entry_created_at": r["entry_created_at"],
+            "provisional": r.get("provisional", False),
+            "sentiment_source": r.get("sentiment_source"),
+            "lexicon_version": r.get("lexicon_version"),
+            "content_hash": content_hash(r["content"]),
+            "computed_at": now,
+        }
+        for r in latest
+    ])
+    upsert_theme_results(session, [
+        {
+            "entry_id": r["entry_id"],
+            "user_id": r["user_id"],
+            "themes": r["themes"],
+            "entry_created_at": r["entry_created_at"],
+            "provisional": r.get("provisional", False),
+            "lexicon_version": r.get("lexicon_version"),
+            "computed_at": now,
+        }
+        for r in latest
+    ])
+    latest = assign_theme_ids(session, latest)
+    replace_entry_themes(session, existing, latest, today=now.date())
+    apply_rollup_deltas(session, existing, latest, today=now.date())
+    apply_df_deltas(session, existing, latest)
+    sync_reenrichment_queue(session, latest)
+
+
+def write_batch(results: list[dict]) -> None:
+    """Write analyzed results in their own transaction."""
     session: Session = DBSession()
     try:
-        score, label = compute_sentiment(content)
-        emotions = compute_emotions(content)
-        session.add(SentimentResult(entry_id=entry_id, user_id=user_id, score=score, label=label, emotions=emotions or None, entry_created_at=entry_created_at))
-        themes = extract_themes(content)
-        session.add(ThemeResult(entry_id=entry_id, user_id=user_id, themes=themes, entry_created_at=entry_created_at))
+        with STAGE_LATENCY.time(stage="db_commit"):
+            write_results(session, results)
+            session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def _is_transient_write_error(e: Exception) -> bool:
+    """Connection and operational errors (DB down, deadlock, serialization) are worth retrying as a batch."""
+    if isinstance(e, (OperationalError, InterfaceError)):
+        return True
+    return isinstance(e, DBAPIError) and e.connection_invalidated
+
+
+def _write_one_by_one(unwritten: list[tuple]) -> tuple[list[tuple], list[tuple], list[tuple]]:
+    """
+    Write (tp, offset, result) items one transaction each, after the batch write kept failing.
+    Items whose row still fails are logged and skipped. A transient error stops early and leaves the
+    rest for the next loop. Return (written, skipped, remaining).
+    """
+    written, skipped = [], []
+    for i, item in enumerate(unwritten):
+        try:
+            write_batch([item[2]])
+        except Exception as e:
+            if _is_transient_write_error(e):
+                return written, skipped, unwritten[i:]
+            WRITE_SKIPPED.inc()
+            print(f"Skipping entry {item[2].get('entry_id')}: cannot be written: {e}", file=sys.stderr, flush=True)
+            skipped.append(item)
+            continue
+        written.append(item)
+    return written, skipped, []
+
+
+class _RebalanceListener(ConsumerRebalanceListener):
+    def __init__(self, tracker: OffsetTracker):
+        self._tracker = tracker
+        self.revoked: set = set()  # partitions revoked since the loop last dropped their work
+
+    def on_partitions_revoked(self, revoked):
+        self._tracker.revoke(revoked)
+        self.revoked.update(revoked)
+
+    def on_partitions_assigned(self, assigned):
+        pass
+
+
+def _drop_revoked(revoked: set, in_flight: dict, busy: dict, unwritten: list, stale: set) -> list:
+    """
+    Forget the work of partitions another consumer now owns: their queued events and unwritten results
+    are dropped and their in-flight analyses are marked stale, so the results are discarded when they
+    finish. Writing them would apply rollup and term_df deltas next to the new owner's. Return the
+    unwritten results that are kept.
+    """
+    stale.update(fut for fut, (tp, _, _) in in_flight.items() if tp is not None and tp in revoked)
+    for waiting in busy.values():
+        kept = [item for item in waiting if item[0] not in revoked]
+        if len(kept) < len(waiting):
+            waiting.clear()
+            waiting.extend(kept)
+    return [item for item in unwritten if item[0] is None or item[0] not in revoked]
+
+
+def _commit_offsets(consumer: KafkaConsumer, tracker: OffsetTracker) -> None:
+    positions = tracker.committable()
+    if not positions:
+        return
+    try:
+        consumer.commit({tp: OffsetAndMetadata(pos, "", -1) for tp, pos in positions.items()})
+        tracker.mark_committed(positions)
+    except Exception as e:
+        print(f"Error committing offsets: {e}", file=sys.stderr, flush=True)
+
+
+def _refresh_lag(consumer: KafkaConsumer) -> int:
+    """Update the per-partition lag gauge (log end offset minus consumer position). Return total lag."""
+    assigned = list(consumer.assignment())
+    if not assigned:
+        return 0
+    end_offsets = consumer.end_offsets(assigned)
+    total = 0
+    for tp in assigned:
+        position = consumer.position(tp)
+        if position is not None and tp in end_offsets:
+            lag = max(0, end_offsets[tp] - position)
+            CONSUMER_LAG.set(lag, topic=tp.topic, partition=tp.partition)
+            total += lag
+    return total
+
+
+def _claim_reenrichment(limit: int) -> list[dict]:
+    session: Session = DBSession()
+    try:
+        events = claim_reenrichment_batch(session, limit, REENRICH_MAX_ATTEMPTS)
         session.commit()
+        return events
     except Exception:
         session.rollback()
         raise
@@ -55,22 +360,174 @@ def process_message(data: dict) -> None:
 
 
 def run_consumer():
+    """
+    Poll in batches and analyze messages on a worker pool (CONSUMER_WORKERS threads, at most
+    CONSUMER_MAX_IN_FLIGHT at once). Finished results are bulk-written, then offsets are committed
+    per partition up to the last contiguous completed message. Reflections are generated afterwards
+    by the background ReflectionStage so a slow LLM never delays the sentiment/theme rows.
+
+    Lag-aware degradation: above CONSUMER_DEGRADE_LAG messages of lag the keyword analyzers are used
+    and rows are marked provisional and queued; once lag is back under CONSUMER_RECOVER_LAG, idle
+    workers re-enrich queued entries with the LLM.
+
+    Lexicon edits (or SIGHUP) are picked up between polls without restarting, so lag is kept.
+
+    Events of one entry (same key, same partition) are analyzed one at a time in offset order: a
+    later event waits in `busy` until the previous one has finished, so an update never races its create.
+    When a rebalance revokes partitions, their pending work is dropped rather than written (the new
+    owner re-reads it from the last committed offset).
+    """
     init_db()
+    lexicon.current()  # fail fast on a broken lexicon file
+    lexicon.install_reload_signal()
     consumer = KafkaConsumer(
-        KAFKA_TOPIC_ENTRY_CREATED,
         bootstrap_servers=KAFKA_BOOTSTRAP_SERVERS.split(","),
         group_id="journal-ai-consumer",
         auto_offset_reset="earliest",
-        enable_auto_commit=True,
+        enable_auto_commit=False,
+        max_poll_records=CONSUMER_BATCH_SIZE,
         value_deserializer=lambda m: json.loads(m.decode("utf-8")) if m else None,
     )
-    print("Consumer started. Waiting for entry.created events...", flush=True)
-    for message in consumer:
-        try:
-            if message.value:
-                process_message(message.value)
-        except Exception as e:
-            print(f"Error processing message: {e}", file=sys.stderr, flush=True)
+    tracker = OffsetTracker()
+    listener = _RebalanceListener(tracker)
+    consumer.subscribe([KAFKA_TOPIC_ENTRY_CREATED], listener=listener)
+    reflections = ReflectionStage().start()
+    start_metrics_server(METRICS_PORT)
+    last_refresh, last_count = time.monotonic(), 0.0
+    degraded, lag = False, 0
+    last_reenrich = 0.0
+    executor = ThreadPoolExecutor(max_workers=CONSUMER_WORKERS, thread_name_prefix="analyze")
+    in_flight: dict[Future, tuple] = {}  # future -> (tp, offset, entry key); tp/offset None for re-enrichment jobs
+    busy: dict[str, deque] = {}  # entry key -> (tp, offset, event) waiting for that entry's in-flight event
+    unwritten: list[tuple] = []  # (tp, offset, result) analyzed but not yet committed to the DB
+    stale: set[Future] = set()  # in-flight analyses of revoked partitions; their results are discarded
+    write_failures = 0  # consecutive failed writes of the current unwritten batch
+    print("Consumer started. Waiting for entry events...", flush=True)
+    while True:
+        lexicon.maybe_reload()
+        now = time.monotonic()
+        if now - last_refresh >= METRICS_REFRESH_SECONDS:
+            count = MESSAGES_TOTAL.value()
+            MESSAGES_PER_SECOND.set((count - last_count) / (now - last_refresh))
+            last_refresh, last_count = now, count
+            try:
+                lag = _refresh_lag(consumer)
+            except Exception as e:
+                print(f"Error refreshing consumer lag: {e}", file=sys.stderr, flush=True)
+            # Hysteresis so the mode doesn't flap around a single threshold
+            if not degraded and lag > CONSUMER_DEGRADE_LAG and is_available():
+                degraded = True
+                print(f"Consumer lag {lag}: switching to keyword analyzers (provisional rows).", flush=True)
+            elif degraded and lag <= CONSUMER_RECOVER_LAG:
+                degraded = False
+                print(f"Consumer lag {lag}: back to LLM analysis; re-enriching provisional rows.", flush=True)
+            CONSUMER_DEGRADED.set(1 if degraded else 0)
+        # Results waiting for a write count too, and nothing new is fetched while a failed write is pending
+        # retry, so a DB outage applies backpressure instead of analyzing (and spending LLM calls) unbounded
+        capacity = CONSUMER_MAX_IN_FLIGHT - len(in_flight) - sum(len(q) for q in busy.values()) - len(unwritten)
+        if write_failures:
+            capacity = 0
+        # Keep polling (heartbeats, rebalances) but stop fetching while the pool is saturated
+        if capacity <= 0:
+            consumer.pause(*consumer.assignment())
+        else:
+            consumer.resume(*consumer.paused())
+        polled = consumer.poll(
+            timeout_ms=0 if in_flight or unwritten else CONSUMER_POLL_TIMEOUT_MS,
+            max_records=max(1, min(capacity, CONSUMER_BATCH_SIZE)),
+        )
+        if listener.revoked:
+            # Before adding this poll's records: a partition may have been revoked and assigned back
+            unwritten = _drop_revoked(listener.revoked, in_flight, busy, unwritten, stale)
+            listener.revoked.clear()
+            if not unwritten:
+                write_failures = 0
+        for tp, records in polled.items():
+            for m in records:
+                tracker.add(tp, m.offset)
+                if m.value:
+                    key = str(m.value.get("entryId"))
+                    if key in busy:
+                        busy[key].append((tp, m.offset, m.value))
+                    else:
+                        busy[key] = deque()
+                        in_flight[executor.submit(handle_event, m.value, True, degraded)] = (tp, m.offset, key)
+                else:
+                    tracker.complete(tp, m.offset)
+        # Use spare workers for LLM re-enrichment of provisional rows once the backlog has drained
+        spare = min(CONSUMER_WORKERS, CONSUMER_MAX_IN_FLIGHT) - len(in_flight)
+        if (
+            not polled and not unwritten and not degraded and spare > 0 and lag <= CONSUMER_RECOVER_LAG and is_available()
+            and time.monotonic() - last_reenrich >= REENRICH_INTERVAL_SECONDS
+        ):
+            last_reenrich = time.monotonic()
+            try:
+                for event in _claim_reenrichment(min(spare, REENRICH_BATCH_SIZE)):
+                    key = str(event.get("entryId"))
+                    if key in busy:
+                        continue  # the entry has a newer event in flight; claimed again once the claim expires
+                    busy[key] = deque()
+                    in_flight[executor.submit(analyze_message, event, True)] = (None, None, key)
+            except Exception as e:
+                print(f"Error claiming re-enrichment batch: {e}", file=sys.stderr, flush=True)
+        if in_flight:
+            done, _ = wait(in_flight, timeout=CONSUMER_POLL_TIMEOUT_MS / 1000.0, return_when=FIRST_COMPLETED)
+            for fut in done:
+                tp, offset, key = in_flight.pop(fut)
+                try:
+                    result = fut.result()
+                except Exception as e:
+                    print(f"Error analyzing message: {e}", file=sys.stderr, flush=True)
+                    result = None
+                waiting = busy.get(key)
+                if waiting:
+                    next_tp, next_offset, next_event = waiting.popleft()
+                    in_flight[executor.submit(handle_event, next_event, True, degraded)] = (next_tp, next_offset, key)
+                else:
+                    busy.pop(key, None)
+                if fut in stale:
+                    stale.discard(fut)
+                    continue
+                if tp is None:
+                    # Re-enrichment: stays queued (provisional) if the LLM failed again; attempts are capped
+                    if result is not None:
+                        result["provisional"] = not result["llm_used"]
+                        result["reenrichment"] = True
+                        unwritten.append((None, None, result))
+                        REENRICHED_TOTAL.inc(result="provisional" if result["provisional"] else "enriched")
+                    continue
+                MESSAGES_TOTAL.inc()
+                if result is None:
+                    tracker.complete(tp, offset)
+                else:
+                    unwritten.append((tp, offset, result))
+        if unwritten:
+            try:
+                write_batch([r for _, _, r in unwritten])
+                written, skipped, remaining = unwritten, [], []
+            except Exception as e:
+                # Keep the results and retry the write next loop; offsets stay uncommitted. A batch that
+                # keeps failing for a non-connection reason is split so the bad rows can be skipped.
+                print(f"Error writing batch: {e}", file=sys.stderr, flush=True)
+                write_failures += 1
+                if _is_transient_write_error(e) or write_failures < CONSUMER_WRITE_RETRIES:
+                    time.sleep(1)
+                    continue
+                written, skipped, remaining = _write_one_by_one(unwritten)
+            write_failures = 0
+            for tp, offset, _ in skipped:
+                if tp is not None:
+                    tracker.complete(tp, offset)
+            for tp, offset, result in written:
+                if tp is not None:
+                    tracker.complete(tp, offset)
+                    # Provisional (degraded) rows get their reflection from re-enrichment, not during the backlog
+                    if not result.get("deleted") and not result.get("provisional"):
+                        reflections.submit(result)
+                elif result.get("reflection") and not result.get("superseded"):
+                    reflections.submit(result)  # re-enrichment: only when it produced a reflection for free
+            unwritten = remaining
+        _commit_offsets(consumer, tracker)
 
 
 if __name__ == "__main__":
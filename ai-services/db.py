@@ -1,7 +1,8 @@
-from sqlalchemy import create_engine, Column, String, Float, DateTime, Text, Index
-from sqlalchemy.dialects.postgresql import UUID, JSONB
+from sqlalchemy import create_engine, Boolean, Column, String, Float, DateTime, Date, ForeignKey, Integer, SmallInteger, Text, Index, text
+from sqlalchemy.dialects.postgresql import UUID, JSONB, insert as pg_insert
 from sqlalchemy.orm import declarative_base, sessionmaker
 from datetime import datetime
+import hashlib
 import uuid
 
 from config import ANALYTICS_DB_URL
@@ -14,27 +15,115 @@ Session = sessionmaker(bind=engine, autocommit=False, autoflush=False)
 class SentimentResult(Base):
     __tablename__ = "sentiment_result"
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    entry_id = Column(UUID(as_uuid=True), nullable=False, index=True)
+    entry_id = Column(UUID(as_uuid=True), nullable=False, index=True, unique=True)  # one row per entry (upsert target)
     user_id = Column(String(255), nullable=False, index=True)
     score = Column(Float, nullable=False)  # -1 to 1
     label = Column(String(50), nullable=True)  # e.g. positive, negative, neutral, mixed
     emotions = Column(JSONB, nullable=True)  # list of strings from fixed taxonomy
+    emotion_mask = Column(SmallInteger, nullable=False, default=0, server_default=text("0"))  # same emotions, bit i = EMOTION_TAXONOMY[i]
     entry_created_at = Column(DateTime, nullable=True)  # from journal entry for time-of-day filter
+    provisional = Column(Boolean, nullable=False, default=False, server_default=text("false"))  # keyword result pending LLM re-enrichment
+    sentiment_source = Column(String(16), nullable=True)  # llm | model | keyword; llm rows train the local model
+    lexicon_version = Column(String(64), nullable=True, index=True)  # keyword lexicon used (finds stale rows)
+    content_hash = Column(String(64), nullable=True)  # sha256 of the analyzed content (entry.updated idempotency)
     computed_at = Column(DateTime, default=datetime.utcnow)
-    __table_args__ = (Index("idx_sentiment_user_computed", "user_id", "computed_at"),)
+    __table_args__ = (
+        Index("idx_sentiment_user_computed", "user_id", "computed_at"),
+        # Emotion counts read only the mask: index-only scans over the user's date range
+        Index(
+            "idx_sentiment_user_computed_emotions", "user_id", "computed_at",
+            postgresql_include=["emotion_mask"], postgresql_where=text("emotion_mask <> 0"),
+        ),
+    )
 
 
 class ThemeResult(Base):
     __tablename__ = "theme_result"
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    entry_id = Column(UUID(as_uuid=True), nullable=False, index=True)
+    entry_id = Column(UUID(as_uuid=True), nullable=False, index=True, unique=True)  # one row per entry (upsert target)
     user_id = Column(String(255), nullable=False, index=True)
     themes = Column(JSONB, nullable=False)  # list of strings
     entry_created_at = Column(DateTime, nullable=True)  # from journal entry for time-of-day filter
+    provisional = Column(Boolean, nullable=False, default=False, server_default=text("false"))
+    lexicon_version = Column(String(64), nullable=True)
     computed_at = Column(DateTime, default=datetime.utcnow)
     __table_args__ = (Index("idx_theme_user_computed", "user_id", "computed_at"),)
 
 
+class Theme(Base):
+    """Canonical theme registry: one row per normalized theme (theme_registry.normalize_theme)."""
+    __tablename__ = "theme"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    name = Column(String(64), nullable=False, unique=True)
+
+
+class EntryTheme(Base):
+    """An entry's canonical themes, one row each; day matches the entry's rollup day."""
+    __tablename__ = "entry_theme"
+    entry_id = Column(UUID(as_uuid=True), primary_key=True)
+    theme_id = Column(Integer, ForeignKey("theme.id"), primary_key=True, index=True)
+    user_id = Column(String(255), nullable=False)
+    day = Column(Date, nullable=False)
+    __table_args__ = (Index("idx_entry_theme_user_day", "user_id", "day", "theme_id"),)
+
+
+class UserDailySentiment(Base):
+    """Per-user, per-day sentiment rollup maintained by the consumer (day = DATE(computed_at))."""
+    __tablename__ = "user_daily_sentiment"
+    user_id = Column(String(255), primary_key=True)
+    day = Column(Date, primary_key=True)
+    score_sum = Column(Float, nullable=False, default=0.0)
+    score_count = Column(Integer, nullable=False, default=0)
+    score_sumsq = Column(Float, nullable=False, default=0.0)
+    positive_count = Column(Integer, nullable=False, default=0)
+    negative_count = Column(Integer, nullable=False, default=0)
+    neutral_count = Column(Integer, nullable=False, default=0)
+    mixed_count = Column(Integer, nullable=False, default=0)
+
+
+class UserDailyTheme(Base):
+    __tablename__ = "user_daily_theme"
+    user_id = Column(String(255), primary_key=True)
+    day = Column(Date, primary_key=True)
+    theme_id = Column(Integer, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class UserDailyEmotion(Base):
+    __tablename__ = "user_daily_emotion"
+    user_id = Column(String(255), primary_key=True)
+    day = Column(Date, primary_key=True)
+    emotion = Column(String(50), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class TermDocumentFrequency(Base):
+    """Number of a scope's entries containing a term; scope is a user_id or "*" for all users (TF-IDF themes)."""
+    __tablename__ = "term_df"
+    scope = Column(String(255), primary_key=True)
+    term = Column(String(64), primary_key=True)
+    df = Column(Integer, nullable=False, default=0)
+
+
+class TermDocumentCount(Base):
+    """Number of entries counted into term_df per scope (the N in idf)."""
+    __tablename__ = "term_df_docs"
+    scope = Column(String(255), primary_key=True)
+    docs = Column(Integer, nullable=False, default=0)
+
+
+class ReenrichmentQueue(Base):
+    """Entries analyzed keyword-only under backlog, waiting for LLM re-enrichment once lag drains."""
+    __tablename__ = "reenrichment_queue"
+    entry_id = Column(UUID(as_uuid=True), primary_key=True)
+    user_id = Column(String(255), nullable=False)
+    content = Column(Text, nullable=False)
+    entry_created_at = Column(DateTime, nullable=True)
+    enqueued_at = Column(DateTime, default=datetime.utcnow, index=True)
+    claimed_at = Column(DateTime, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+
+
 class EntryReflection(Base):
     __tablename__ = "entry_reflection"
     entry_id = Column(UUID(as_uuid=True), primary_key=True)
@@ -54,5 +143,126 @@ class ReflectionSummary(Base):
     generated_at = Column(DateTime, default=datetime.utcnow)
 
 
+def upsert_sentiment_results(session, rows: list[dict]) -> None:
+    """
+    INSERT ... ON CONFLICT (entry_id) DO UPDATE for a batch of sentiment rows (caller commits).
+    computed_at is kept from the first write so a replayed entry stays on its original day.
+    """
+    if not rows:
+        return
+    stmt = pg_insert(SentimentResult).values(rows)
+    session.execute(stmt.on_conflict_do_update(
+        index_elements=[SentimentResult.entry_id],
+        set_={
+            "user_id": stmt.excluded.user_id,
+            "score": stmt.excluded.score,
+            "label": stmt.excluded.label,
+            "emotions": stmt.excluded.emotions,
+            "emotion_mask": stmt.excluded.emotion_mask,
+            "entry_created_at": stmt.excluded.entry_created_at,
+            "provisional": stmt.excluded.provisional,
+            "sentiment_source": stmt.excluded.sentiment_source,
+            "lexicon_version": stmt.excluded.lexicon_version,
+            "content_hash": stmt.excluded.content_hash,
+        },
+    ))
+
+
+def content_hash(content: str) -> str:
+    return hashlib.sha256((content or "").encode("utf-8")).hexdigest()
+
+
+def upsert_theme_results(session, rows: list[dict]) -> None:
+    """INSERT ... ON CONFLICT (entry_id) DO UPDATE for a batch of theme rows (caller commits)."""
+    if not rows:
+        return
+    stmt = pg_insert(ThemeResult).values(rows)
+    session.execute(stmt.on_conflict_do_update(
+        index_elements=[ThemeResult.entry_id],
+        set_={
+            "user_id": stmt.excluded.user_id,
+            "themes": stmt.excluded.themes,
+            "entry_created_at": stmt.excluded.entry_created_at,
+            "provisional": stmt.excluded.provisional,
+            "lexicon_version": stmt.excluded.lexicon_version,
+        },
+    ))
+
+
+def sync_reenrichment_queue(session, results: list[dict]) -> None:
+    """Queue provisional results for LLM re-enrichment; drop entries that now have a final result (caller commits)."""
+    provisional = [r for r in results if r.get("provisional")]
+    final_ids = [r["entry_id"] for r in results if not r.get("provisional")]
+    if provisional:
+        stmt = pg_insert(ReenrichmentQueue).values([
+            {
+                "entry_id": r["entry_id"],
+                "user_id": r["user_id"],
+                "content": r["content"],
+                "entry_created_at": r["entry_created_at"],
+            }
+            for r in provisional
+        ])
+        session.execute(stmt.on_conflict_do_update(
+            index_elements=[ReenrichmentQueue.entry_id],
+            set_={"content": stmt.excluded.content, "claimed_at": None},
+        ))
+    if final_ids:
+        session.execute(
+            text("DELETE FROM reenrichment_queue WHERE entry_id = ANY(:ids)"),
+            {"ids": final_ids},
+        )
+
+
+def claim_reenrichment_batch(session, limit: int, max_attempts: int, reclaim_after_seconds: int = 600) -> list[dict]:
+    """
+    Atomically claim up to `limit` queued entries (SKIP LOCKED, so several consumers can drain in parallel).
+    Claims older than reclaim_after_seconds are considered abandoned and can be claimed again.
+    """
+    rows = session.execute(
+        text("""
+            UPDATE reenrichment_queue q SET claimed_at = (NOW() AT TIME ZONE 'utc'), attempts = q.attempts + 1
+            WHERE q.entry_id IN (
+                SELECT entry_id FROM reenrichment_queue
+                WHERE attempts < :max_attempts
+                  AND (claimed_at IS NULL OR claimed_at < (NOW() AT TIME ZONE 'utc') - make_interval(secs => :reclaim))
+                ORDER BY enqueued_at
+                LIMIT :limit
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING q.entry_id, q.user_id, q.content, q.entry_created_at
+        """),
+        {"limit": limit, "max_attempts": max_attempts, "reclaim": reclaim_after_seconds},
+    ).fetchall()
+    return [
+        {"entryId": row[0], "userId": row[1], "content": row[2], "createdAt": row[3].isoformat() if row[3] else None}
+        for row in rows
+    ]
+
+
+def upsert_entry_reflection(session, entry_id, user_id: str, reflection: str) -> None:
+    """
+    Insert or replace the one-line reflection for an entry (caller commits). Skipped when the entry's
+    results are gone, so a reflection finishing after entry.deleted does not bring it back.
+    """
+    session.execute(
+        text("""
+            INSERT INTO entry_reflection (entry_id, user_id, reflection, computed_at)
+            SELECT :eid, :uid, :reflection, :now
+            WHERE EXISTS (SELECT 1 FROM sentiment_result WHERE entry_id = :eid)
+            ON CONFLICT (entry_id) DO UPDATE SET reflection = EXCLUDED.reflection, computed_at = EXCLUDED.computed_at
+        """),
+        {"eid": entry_id, "uid": user_id, "reflection": reflection, "now": datetime.utcnow()},
+    )
+
+
+def delete_entry_results(session, entry_ids: list) -> None:
+    """Remove every analytics row of the entries (caller commits and corrects the rollups first)."""
+    if not entry_ids:
+        return
+    for table in ("entry_theme", "theme_result", "entry_reflection", "reenrichment_queue", "sentiment_result"):
+        session.execute(text(f"DELETE FROM {table} WHERE entry_id = ANY(:ids)"), {"ids": list(entry_ids)})
+
+
 def init_db():
     Base.metadata.create_all(engine)
@@ -1,97 +1,52 @@
 """
 Emotion tags: map entry content to a fixed taxonomy (1-3 emotions per entry).
 Keyword-based; can be extended with LLM for richer detection.
+The keyword -> emotions map lives in the lexicon file (lexicon.py); the taxonomy stays here.
+Stored rows also carry the emotions as a bitmask (sentiment_result.emotion_mask, bit i = EMOTION_TAXONOMY[i])
+so per-emotion counts are one SQL pass of bit tests.
 """
+from typing import Iterable, Optional
+
+import lexicon
+from keywords import TokenizedDocument
+
+# Append only: an emotion's position is its bit in emotion_mask (smallint, so at most 15 emotions).
 EMOTION_TAXONOMY = [
     "anxious", "sad", "frustrated", "grateful", "calm", "hopeful", "tired", "content",
 ]
+EMOTION_BITS = {emotion: 1 << i for i, emotion in enumerate(EMOTION_TAXONOMY)}
+
+
+def emotion_mask(emotions: Optional[Iterable[str]]) -> int:
+    """Bitmask of the taxonomy emotions in the list (anything else is ignored)."""
+    mask = 0
+    for emotion in emotions or []:
+        mask |= EMOTION_BITS.get(emotion, 0)
+    return mask
+
 
-# Keywords (lowercase) -> emotion. One word can map to multiple emotions.
-KEYWORD_TO_EMOTIONS: dict[str, list[str]] = {
-    "anxious": ["anxious"],
-    "anxiety": ["anxious"],
-    "worried": ["anxious"],
-    "worry": ["anxious"],
-    "nervous": ["anxious"],
-    "stress": ["anxious"],
-    "stressed": ["anxious"],
-    "overwhelm": ["anxious"],
-    "overwhelmed": ["anxious"],
-    "sad": ["sad"],
-    "sadness": ["sad"],
-    "depressed": ["sad"],
-    "lonely": ["sad"],
-    "down": ["sad"],
-    "unhappy": ["sad"],
-    "grief": ["sad"],
-    "frustrated": ["frustrated"],
-    "frustration": ["frustrated"],
-    "angry": ["frustrated"],
-    "anger": ["frustrated"],
-    "annoyed": ["frustrated"],
-    "irritated": ["frustrated"],
-    "stuck": ["frustrated"],
-    "grateful": ["grateful"],
-    "gratitude": ["grateful"],
-    "thankful": ["grateful"],
-    "thanks": ["grateful"],
-    "appreciate": ["grateful"],
-    "blessed": ["grateful"],
-    "calm": ["calm"],
-    "peaceful": ["calm"],
-    "peace": ["calm"],
-    "relaxed": ["calm"],
-    "serene": ["calm"],
-    "hopeful": ["hopeful"],
-    "hope": ["hopeful"],
-    "optimistic": ["hopeful"],
-    "excited": ["hopeful"],
-    "looking forward": ["hopeful"],
-    "tired": ["tired"],
-    "exhausted": ["tired"],
-    "drained": ["tired"],
-    "sleepy": ["tired"],
-    "rest": ["tired"],
-    "content": ["content"],
-    "happy": ["content"],
-    "joy": ["content"],
-    "satisfied": ["content"],
-    "good": ["content"],
-    "fine": ["content"],
-    "okay": ["content"],
-    "ok": ["content"],
-}
+def emotion_count_columns(column: str = "emotion_mask") -> str:
+    """SELECT list counting rows per emotion with bit tests, one column per taxonomy emotion in order."""
+    return ", ".join(f"COUNT(*) FILTER (WHERE {column} & {bit} <> 0)" for bit in EMOTION_BITS.values())
+
+
+def top_emotions(counts, limit: int = 5) -> list[str]:
+    """Emotions by count (a row of emotion_count_columns), most frequent first; ties keep taxonomy order."""
+    ranked = sorted(zip(EMOTION_TAXONOMY, counts), key=lambda ec: -(ec[1] or 0))
+    return [emotion for emotion, n in ranked[:limit] if n]
 
 
 def compute_emotions(content: str) -> list[str]:
     """
-    Return 1-3 emotions from the fixed taxonomy based on keyword presence.
-    Deduplicates and limits to 3.
+    Return 1-3 emotions from the fixed taxonomy based on whole-word / phrase keyword presence.
+    Deduplicates, keeps taxonomy order and limits to 3.
     """
     if not content or not content.strip():
         return []
-    seen: set[str] = set()
-    result: list[str] = []
-    lower = content.lower()
-    words = lower.replace(".", " ").replace(",", " ").split()
-    # Also check 2-grams for phrases like "looking forward"
-    for emotion, keywords in [
-        ("anxious", ["anxious", "anxiety", "worried", "worry", "nervous", "stress", "stressed", "overwhelm", "overwhelmed"]),
-        ("sad", ["sad", "sadness", "depressed", "lonely", "down", "unhappy", "grief"]),
-        ("frustrated", ["frustrated", "frustration", "angry", "anger", "annoyed", "irritated", "stuck"]),
-        ("grateful", ["grateful", "gratitude", "thankful", "thanks", "appreciate", "blessed"]),
-        ("calm", ["calm", "peaceful", "peace", "relaxed", "serene"]),
-        ("hopeful", ["hopeful", "hope", "optimistic", "excited", "looking forward"]),
-        ("tired", ["tired", "exhausted", "drained", "sleepy", "rest"]),
-        ("content", ["content", "happy", "joy", "satisfied", "good", "fine", "okay", "ok"]),
-    ]:
-        if emotion in seen:
-            continue
-        for kw in keywords:
-            if kw in lower or kw in words:
-                seen.add(emotion)
-                result.append(emotion)
-                break
-        if len(result) >= 3:
-            break
-    return result[:3]
+    return compute_emotions_document(TokenizedDocument(content))
+
+
+def compute_emotions_document(doc: TokenizedDocument, lex: Optional[lexicon.Lexicon] = None) -> list[str]:
+    """compute_emotions on an already tokenized entry (lex: lexicon snapshot, default the current one)."""
+    found = (lex or lexicon.current()).emotion_matcher.labels(doc)
+    return [emotion for emotion in EMOTION_TAXONOMY if emotion in found][:3]
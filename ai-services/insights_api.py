@@ -17,6 +17,7 @@ from sqlalchemy.exc import ProgrammingError
 from sqlalchemy.orm import sessionmaker
 
 from config import ANALYTICS_DB_URL
+from emotions import emotion_count_columns, top_emotions
 
 # JWT secret must match Auth Service
 JWT_SECRET = os.getenv("JWT_SECRET", "your-256-bit-secret-for-jwt-signing-change-in-production")
@@ -212,17 +213,16 @@ def get_theme_sentiment(
     try:
         result = session.execute(
             text(f"""
-                WITH themed AS (
-                    SELECT tr.entry_id, sr.score, jsonb_array_elements_text(tr.themes) AS theme
-                    FROM theme_result tr
-                    JOIN sentiment_result sr ON tr.entry_id = sr.entry_id AND tr.user_id = sr.user_id
-                    WHERE tr.user_id = :uid AND tr.computed_at >= :from_dt AND tr.computed_at <= :to_dt{time_sql}
-                )
-                SELECT theme,
-                    CASE WHEN score < -0.2 THEN 'low' WHEN score > 0.2 THEN 'high' ELSE 'neutral' END AS bucket
-                FROM themed
+                SELECT t.name, b.bucket FROM (
+                    SELECT DISTINCT et.theme_id,
+                        CASE WHEN sr.score < -0.2 THEN 'low' WHEN sr.score > 0.2 THEN 'high' ELSE 'neutral' END AS bucket
+                    FROM entry_theme et
+                    JOIN sentiment_result sr ON sr.entry_id = et.entry_id
+                    WHERE et.user_id = :uid AND et.day >= :from_day AND et.day <= :to_day{time_sql}
+                ) b
+                JOIN theme t ON t.id = b.theme_id
             """),
-            {"uid": user_id, "from_dt": from_dt, "to_dt": to_dt, **time_params},
+            {"uid": user_id, "from_day": from_dt.date(), "to_day": to_dt.date(), **time_params},
         )
         rows = result.fetchall()
         low_set: set[str] = set()
@@ -260,11 +260,11 @@ def get_week_caption(
     try:
         result = session.execute(
             text("""
-                SELECT AVG(score) AS avg_score
-                FROM sentiment_result
-                WHERE user_id = :uid AND computed_at >= :from_dt AND computed_at <= :to_dt
+                SELECT SUM(score_sum) / NULLIF(SUM(score_count), 0) AS avg_score
+                FROM user_daily_sentiment
+                WHERE user_id = :uid AND day >= :from_day AND day <= :to_day
             """),
-            {"uid": user_id, "from_dt": from_dt, "to_dt": to_dt},
+            {"uid": user_id, "from_day": from_dt.date(), "to_day": to_dt.date()},
         )
         row = result.fetchone()
         if row is None or row[0] is None:
@@ -293,23 +293,14 @@ def get_emotions(
     from_dt = to_dt - timedelta(days=days)
     session = Session()
     try:
-        result = session.execute(
-            text("""
-                SELECT emotions FROM sentiment_result
-                WHERE user_id = :uid AND computed_at >= :from_dt AND computed_at <= :to_dt
-                  AND emotions IS NOT NULL
-                  AND CASE WHEN jsonb_typeof(emotions) = 'array' THEN jsonb_array_length(emotions) > 0 ELSE false END
+        counts = session.execute(
+            text(f"""
+                SELECT {emotion_count_columns()} FROM sentiment_result
+                WHERE user_id = :uid AND computed_at >= :from_dt AND computed_at <= :to_dt AND emotion_mask <> 0
             """),
             {"uid": user_id, "from_dt": from_dt, "to_dt": to_dt},
-        )
-        rows = result.fetchall()
-        counter: Counter[str] = Counter()
-        for (emotions_json,) in rows:
-            if emotions_json and isinstance(emotions_json, list):
-                for e in emotions_json:
-                    if isinstance(e, str):
-                        counter[e] += 1
-        top = [emotion for emotion, _ in counter.most_common(5)]
+        ).fetchone()
+        top = top_emotions(counts or [], 5)
         caption = None
         if top:
             caption = f"This week you often felt: {', '.join(top)}."
@@ -363,22 +354,19 @@ def get_pattern_insights(
                     break
         theme_corr = session.execute(
             text("""
-                WITH themed AS (
-                    SELECT tr.entry_id, sr.score, jsonb_array_elements_text(tr.themes) AS theme
-                    FROM theme_result tr
-                    JOIN sentiment_result sr ON tr.entry_id = sr.entry_id AND tr.user_id = sr.user_id
-                    WHERE tr.user_id = :uid AND tr.computed_at >= :from_dt AND tr.computed_at <= :to_dt
-                ),
-                theme_avg AS (
-                    SELECT theme, AVG(score) AS theme_score, COUNT(*) AS n
-                    FROM themed WHERE theme IS NOT NULL AND theme != ''
-                    GROUP BY theme HAVING COUNT(*) >= 2
+                WITH theme_avg AS (
+                    SELECT et.theme_id, AVG(sr.score) AS theme_score
+                    FROM entry_theme et
+                    JOIN sentiment_result sr ON sr.entry_id = et.entry_id
+                    WHERE et.user_id = :uid AND et.day >= :from_day AND et.day <= :to_day
+                    GROUP BY et.theme_id HAVING COUNT(*) >= 2
                 )
-                SELECT theme, theme_score FROM theme_avg
-                WHERE theme_score > :overall_plus
-                ORDER BY theme_score DESC LIMIT 2
+                SELECT t.name, a.theme_score FROM theme_avg a
+                JOIN theme t ON t.id = a.theme_id
+                WHERE a.theme_score > :overall_plus
+                ORDER BY a.theme_score DESC LIMIT 2
             """),
-            {"uid": user_id, "from_dt": from_dt, "to_dt": to_dt, "overall_plus": overall_avg + 0.2},
+            {"uid": user_id, "from_day": from_dt.date(), "to_day": to_dt.date(), "overall_plus": overall_avg + 0.2},
         )
         for theme, theme_score in theme_corr.fetchall():
             if theme and is_valid_theme(theme):
@@ -410,15 +398,19 @@ def get_sentiment(
         else:
             to_dt = datetime.utcnow()
             from_dt = to_dt - timedelta(days=days)
+        # Daily rollup rows; the label expression reproduces MAX(label) over the day's entries.
         result = session.execute(
             text("""
-                SELECT DATE(computed_at) AS d, AVG(score) AS avg_score, MAX(label) AS label
-                FROM sentiment_result
-                WHERE user_id = :uid AND computed_at >= :from_dt AND computed_at <= :to_dt
-                GROUP BY DATE(computed_at)
+                SELECT day AS d, score_sum / score_count AS avg_score,
+                    CASE WHEN positive_count > 0 THEN 'positive'
+                         WHEN neutral_count > 0 THEN 'neutral'
+                         WHEN negative_count > 0 THEN 'negative'
+                         WHEN mixed_count > 0 THEN 'mixed' END AS label
+                FROM user_daily_sentiment
+                WHERE user_id = :uid AND day >= :from_day AND day <= :to_day AND score_count > 0
                 ORDER BY d
             """),
-            {"uid": user_id, "from_dt": from_dt, "to_dt": to_dt},
+            {"uid": user_id, "from_day": from_dt.date(), "to_day": to_dt.date()},
         )
         rows = result.fetchall()
         data = [
@@ -471,14 +463,16 @@ def get_themes(
     try:
         result = session.execute(
             text("""
-                SELECT theme FROM (
-                    SELECT jsonb_array_elements_text(themes) AS theme
-                    FROM theme_result
+                SELECT t.name FROM (
+                    SELECT theme_id, COUNT(*) AS n
+                    FROM entry_theme
                     WHERE user_id = :uid
-                ) t
-                GROUP BY theme
-                ORDER BY COUNT(*) DESC
-                LIMIT :limit
+                    GROUP BY theme_id
+                    ORDER BY n DESC
+                    LIMIT :limit
+                ) c
+                JOIN theme t ON t.id = c.theme_id
+                ORDER BY c.n DESC
             """),
             {"uid": user_id, "limit": limit},
         )
@@ -503,18 +497,19 @@ def get_themes_with_counts(
     try:
         result = session.execute(
             text("""
-                SELECT theme, COUNT(*) AS cnt
-                FROM (
-                    SELECT jsonb_array_elements_text(tr.themes) AS theme
-                    FROM theme_result tr
-                    WHERE tr.user_id = :uid AND tr.computed_at >= :from_dt AND tr.computed_at <= :to_dt
-                ) t
-                WHERE theme IS NOT NULL AND theme != ''
-                GROUP BY theme
-                ORDER BY cnt DESC
-                LIMIT :limit
+                SELECT t.name, c.cnt FROM (
+                    SELECT theme_id, SUM(count) AS cnt
+                    FROM user_daily_theme
+                    WHERE user_id = :uid AND day >= :from_day AND day <= :to_day
+                    GROUP BY theme_id
+                    HAVING SUM(count) > 0
+                    ORDER BY cnt DESC
+                    LIMIT :limit
+                ) c
+                JOIN theme t ON t.id = c.theme_id
+                ORDER BY c.cnt DESC
             """),
-            {"uid": user_id, "from_dt": from_dt, "to_dt": to_dt, "limit": limit},
+            {"uid": user_id, "from_day": from_dt.date(), "to_day": to_dt.date(), "limit": limit},
         )
         themes = [ThemeWithCount(theme=row[0], count=row[1]) for row in result.fetchall() if is_valid_theme(row[0])]
         return ThemesWithCountsResponse(themes=themes)
@@ -539,23 +534,14 @@ def get_emotions_over_time(
     try:
         result = session.execute(
             text("""
-                SELECT DATE(computed_at) AS d, emotions
-                FROM sentiment_result
-                WHERE user_id = :uid AND computed_at >= :from_dt AND computed_at <= :to_dt
-                  AND emotions IS NOT NULL
-                  AND CASE WHEN jsonb_typeof(emotions) = 'array' THEN jsonb_array_length(emotions) > 0 ELSE false END
+                SELECT day AS d, emotion, count
+                FROM user_daily_emotion
+                WHERE user_id = :uid AND day >= :from_day AND day <= :to_day AND count > 0
             """),
-            {"uid": user_id, "from_dt": from_dt, "to_dt": to_dt},
+            {"uid": user_id, "from_day": from_dt.date(), "to_day": to_dt.date()},
         )
-        for row in result.fetchall():
-            d_str = str(row[0])
-            if d_str not in by_date:
-                by_date[d_str] = Counter()
-            em = row[1]
-            if em and isinstance(em, list):
-                for e in em:
-                    if isinstance(e, str):
-                        by_date[d_str][e] += 1
+        for d, emotion, count in result.fetchall():
+            by_date.setdefault(str(d), Counter())[emotion] += count
         data = [
             EmotionsOverTimePoint(
                 date=d_str,
@@ -585,27 +571,24 @@ def get_theme_sentiment_breakdown(
     try:
         result = session.execute(
             text("""
-                WITH themed AS (
-                    SELECT tr.entry_id, sr.score, jsonb_array_elements_text(tr.themes) AS theme
-                    FROM theme_result tr
-                    JOIN sentiment_result sr ON tr.entry_id = sr.entry_id AND tr.user_id = sr.user_id
-                    WHERE tr.user_id = :uid AND tr.computed_at >= :from_dt AND tr.computed_at <= :to_dt
-                ),
-                bucketed AS (
-                    SELECT theme,
-                        CASE WHEN score < -0.2 THEN 'low' WHEN score > 0.2 THEN 'high' ELSE 'neutral' END AS bucket
-                    FROM themed WHERE theme IS NOT NULL AND theme != ''
+                WITH bucketed AS (
+                    SELECT et.theme_id,
+                        COUNT(*) FILTER (WHERE sr.score < -0.2) AS low,
+                        COUNT(*) FILTER (WHERE sr.score >= -0.2 AND sr.score <= 0.2) AS neutral,
+                        COUNT(*) FILTER (WHERE sr.score > 0.2) AS high,
+                        COUNT(*) AS total
+                    FROM entry_theme et
+                    JOIN sentiment_result sr ON sr.entry_id = et.entry_id
+                    WHERE et.user_id = :uid AND et.day >= :from_day AND et.day <= :to_day
+                    GROUP BY et.theme_id
+                    ORDER BY total DESC
+                    LIMIT :limit
                 )
-                SELECT theme,
-                    COUNT(*) FILTER (WHERE bucket = 'low') AS low,
-                    COUNT(*) FILTER (WHERE bucket = 'neutral') AS neutral,
-                    COUNT(*) FILTER (WHERE bucket = 'high') AS high
-                FROM bucketed
-                GROUP BY theme
-                ORDER BY (low + neutral + high) DESC
-                LIMIT :limit
+                SELECT t.name, b.low, b.neutral, b.high FROM bucketed b
+                JOIN theme t ON t.id = b.theme_id
+                ORDER BY b.total DESC
             """),
-            {"uid": user_id, "from_dt": from_dt, "to_dt": to_dt, "limit": limit},
+            {"uid": user_id, "from_day": from_dt.date(), "to_day": to_dt.date(), "limit": limit},
         )
         data = [
             ThemeSentimentBreakdownItem(theme=row[0], low=row[1] or 0, neutral=row[2] or 0, high=row[3] or 0)
@@ -635,18 +618,18 @@ def get_actionable_insights(
         # Low-sentiment themes → suggest self-care
         low_themes = session.execute(
             text("""
-                WITH themed AS (
-                    SELECT jsonb_array_elements_text(tr.themes) AS theme, sr.score
-                    FROM theme_result tr
-                    JOIN sentiment_result sr ON tr.entry_id = sr.entry_id AND tr.user_id = sr.user_id
-                    WHERE tr.user_id = :uid AND tr.computed_at >= :from_dt AND tr.computed_at <= :to_dt
-                )
-                SELECT theme FROM themed
-                WHERE theme IS NOT NULL AND theme != '' AND score < -0.2
-                GROUP BY theme HAVING COUNT(*) >= 2
-                ORDER BY COUNT(*) DESC LIMIT 3
+                SELECT t.name FROM (
+                    SELECT et.theme_id, COUNT(*) AS n
+                    FROM entry_theme et
+                    JOIN sentiment_result sr ON sr.entry_id = et.entry_id
+                    WHERE et.user_id = :uid AND et.day >= :from_day AND et.day <= :to_day AND sr.score < -0.2
+                    GROUP BY et.theme_id HAVING COUNT(*) >= 2
+                    ORDER BY n DESC LIMIT 3
+                ) c
+                JOIN theme t ON t.id = c.theme_id
+                ORDER BY c.n DESC
             """),
-            {"uid": user_id, "from_dt": from_dt, "to_dt": to_dt},
+            {"uid": user_id, "from_day": from_dt.date(), "to_day": to_dt.date()},
         )
         low_list = [r[0] for r in low_themes.fetchall() if is_valid_theme(r[0])]
         if low_list:
@@ -686,18 +669,18 @@ def get_actionable_insights(
         # High-sentiment theme → encourage
         high_themes = session.execute(
             text("""
-                WITH themed AS (
-                    SELECT jsonb_array_elements_text(tr.themes) AS theme, sr.score
-                    FROM theme_result tr
-                    JOIN sentiment_result sr ON tr.entry_id = sr.entry_id AND tr.user_id = sr.user_id
-                    WHERE tr.user_id = :uid AND tr.computed_at >= :from_dt AND tr.computed_at <= :to_dt
-                )
-                SELECT theme FROM themed
-                WHERE theme IS NOT NULL AND theme != '' AND score > 0.2
-                GROUP BY theme HAVING COUNT(*) >= 2
-                ORDER BY COUNT(*) DESC LIMIT 1
+                SELECT t.name FROM (
+                    SELECT et.theme_id, COUNT(*) AS n
+                    FROM entry_theme et
+                    JOIN sentiment_result sr ON sr.entry_id = et.entry_id
+                    WHERE et.user_id = :uid AND et.day >= :from_day AND et.day <= :to_day AND sr.score > 0.2
+                    GROUP BY et.theme_id HAVING COUNT(*) >= 2
+                    ORDER BY n DESC LIMIT 1
+                ) c
+                JOIN theme t ON t.id = c.theme_id
+                ORDER BY c.n DESC
             """),
-            {"uid": user_id, "from_dt": from_dt, "to_dt": to_dt},
+            {"uid": user_id, "from_day": from_dt.date(), "to_day": to_dt.date()},
         )
         high_row = high_themes.fetchone()
         if high_row and is_valid_theme(high_row[0]) and not any("brighter" in a for a in actions):
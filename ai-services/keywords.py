@@ -0,0 +1,113 @@
+"""
+Compiled keyword matcher shared by the keyword analyzers (sentiment, emotions).
+Built once at import from a keyword -> labels mapping; each text gets one tokenizing pass with
+whole-word matching ("down" no longer matches "download") and multi-word phrases ("looking forward").
+"""
+import re
+from collections import Counter
+from functools import cached_property
+from typing import Hashable, Iterable
+
+_TOKEN_RE = re.compile(r"[a-z]+")
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercase and split into alphabetic tokens (same as replacing [^a-z] with spaces and splitting)."""
+    return _TOKEN_RE.findall(text.lower())
+
+
+class TokenizedDocument:
+    """
+    One entry tokenized once and shared by the keyword analyzers (sentiment, themes, emotions).
+    Derived views are computed on first use, so an entry the LLM fully answered costs nothing.
+    """
+
+    def __init__(self, text: str):
+        self.text = text or ""
+
+    @cached_property
+    def tokens(self) -> list[str]:
+        return tokenize(self.text)
+
+    @cached_property
+    def token_set(self) -> frozenset[str]:
+        return frozenset(self.tokens)
+
+    @cached_property
+    def bigrams(self) -> frozenset[tuple[str, str]]:
+        tokens = self.tokens
+        return frozenset(zip(tokens, tokens[1:]))
+
+    @cached_property
+    def counts(self) -> Counter:
+        """Token counts in first-occurrence order (ties in most_common() keep that order)."""
+        return Counter(self.tokens)
+
+
+def as_document(text_or_doc: "str | TokenizedDocument") -> TokenizedDocument:
+    if isinstance(text_or_doc, TokenizedDocument):
+        return text_or_doc
+    return TokenizedDocument(text_or_doc)
+
+
+class KeywordMatcher:
+    """Match single words and phrases against a token stream in one linear pass."""
+
+    def __init__(self, mapping: dict[str, Iterable[Hashable]]):
+        self._words: dict[str, tuple] = {}
+        self._phrases: dict[str, list[tuple[tuple[str, ...], str, tuple]]] = {}
+        for keyword, labels in mapping.items():
+            parts = tuple(tokenize(keyword))
+            if not parts:
+                continue
+            labels = tuple(labels)
+            if len(parts) == 1:
+                self._words[parts[0]] = labels
+            else:
+                self._phrases.setdefault(parts[0], []).append((parts, keyword, labels))
+
+    def find_tokens(self, tokens: list[str]) -> dict[str, tuple]:
+        """Return {matched keyword: labels} for every distinct keyword present in the tokens."""
+        found: dict[str, tuple] = {}
+        words, phrases = self._words, self._phrases
+        for i, tok in enumerate(tokens):
+            labels = words.get(tok)
+            if labels is not None:
+                found[tok] = labels
+            for parts, keyword, phrase_labels in phrases.get(tok, ()):
+                if tuple(tokens[i:i + len(parts)]) == parts:
+                    found[keyword] = phrase_labels
+        return found
+
+    def find_document(self, doc: TokenizedDocument) -> dict[str, tuple]:
+        """Like find_tokens, but single words and two-word phrases are set lookups on the shared document."""
+        found: dict[str, tuple] = {}
+        token_set = doc.token_set
+        words = self._words
+        if len(token_set) < len(words):
+            for tok in token_set:
+                if tok in words:
+                    found[tok] = words[tok]
+        else:
+            for word, labels in words.items():
+                if word in token_set:
+                    found[word] = labels
+        for first, entries in self._phrases.items():
+            if first not in token_set:
+                continue
+            for parts, keyword, labels in entries:
+                if len(parts) == 2:
+                    hit = parts in doc.bigrams
+                else:
+                    n, tokens = len(parts), doc.tokens
+                    hit = any(tuple(tokens[i:i + n]) == parts for i in range(len(tokens) - n + 1))
+                if hit:
+                    found[keyword] = labels
+        return found
+
+    def find(self, text: "str | TokenizedDocument") -> dict[str, tuple]:
+        return self.find_document(as_document(text))
+
+    def labels(self, text: "str | TokenizedDocument") -> set:
+        """Union of labels of all keywords present in the text."""
+        return {label for labels in self.find(text).values() for label in labels}
@@ -0,0 +1,161 @@
+"""
+Keyword lexicons (sentiment words, emotion keywords, theme stop words) loaded from a versioned JSON
+file (LEXICON_PATH, default lexicons/lexicon.json) instead of Python literals.
+
+The file is compiled into a frozen Lexicon (sets and KeywordMatchers) and published by swapping one
+module-level reference, so readers never see a half-updated vocabulary. Callers take current() once
+per entry and use that snapshot for every analyzer. Optional theme_aliases map alias tags to their
+canonical theme for the theme registry (theme_registry.py). maybe_reload() picks up file changes (the consumer
+calls it from its poll loop); SIGHUP forces a reload on the next check. The emotion taxonomy itself
+stays in emotions.py: it is part of the LLM prompt and the stored data, so the file may only map
+keywords to it.
+"""
+import json
+import os
+import signal
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+from config import LEXICON_CHECK_SECONDS, LEXICON_PATH
+from keywords import KeywordMatcher, tokenize
+
+
+@dataclass(frozen=True)
+class Lexicon:
+    version: str
+    positive_words: frozenset[str]
+    negative_words: frozenset[str]
+    keyword_to_emotions: dict[str, tuple[str, ...]]
+    stop_words: frozenset[str]
+    sentiment_matcher: KeywordMatcher
+    emotion_matcher: KeywordMatcher
+    theme_aliases: dict[str, str] = field(default_factory=dict)  # alias key -> canonical theme key
+
+
+def _words(raw, field: str) -> list[str]:
+    if not isinstance(raw, list) or not all(isinstance(w, str) and w.strip() for w in raw):
+        raise ValueError(f"{field} must be a list of non-empty strings")
+    return [w.strip().lower() for w in raw]
+
+
+def parse_lexicon(data: dict, taxonomy: list[str]) -> Lexicon:
+    """Validate the file contents and compile them; raises ValueError on anything malformed."""
+    version = data.get("version")
+    if not isinstance(version, str) or not version.strip():
+        raise ValueError("version must be a non-empty string")
+    sentiment = data.get("sentiment") or {}
+    positive = _words(sentiment.get("positive"), "sentiment.positive")
+    negative = _words(sentiment.get("negative"), "sentiment.negative")
+    emotions_raw = data.get("emotions")
+    if not isinstance(emotions_raw, dict):
+        raise ValueError("emotions must map keyword -> list of emotions")
+    keyword_to_emotions: dict[str, tuple[str, ...]] = {}
+    for keyword, emotions in emotions_raw.items():
+        emotions = _words(emotions, f"emotions.{keyword}")
+        unknown = [e for e in emotions if e not in taxonomy]
+        if unknown:
+            raise ValueError(f"emotions.{keyword}: {unknown} not in the taxonomy {taxonomy}")
+        keyword_to_emotions[keyword.strip().lower()] = tuple(emotions)
+    stop_words = _words(data.get("stop_words"), "stop_words")
+    aliases_raw = data.get("theme_aliases") or {}
+    if not isinstance(aliases_raw, dict):
+        raise ValueError("theme_aliases must map canonical theme -> list of aliases")
+    theme_aliases: dict[str, str] = {}
+    for canonical, aliases in aliases_raw.items():
+        key = " ".join(tokenize(canonical))
+        if not key:
+            raise ValueError(f"theme_aliases: {canonical!r} has no words")
+        for alias in _words(aliases, f"theme_aliases.{canonical}"):
+            theme_aliases[" ".join(tokenize(alias))] = key
+    return Lexicon(
+        version=version.strip(),
+        positive_words=frozenset(positive),
+        negative_words=frozenset(negative),
+        keyword_to_emotions=keyword_to_emotions,
+        stop_words=frozenset(stop_words),
+        # A word in both lists counts as negative (later keys win)
+        sentiment_matcher=KeywordMatcher({
+            **{w: ("positive",) for w in positive},
+            **{w: ("negative",) for w in negative},
+        }),
+        emotion_matcher=KeywordMatcher(keyword_to_emotions),
+        theme_aliases=theme_aliases,
+    )
+
+
+def load_lexicon(path: str) -> Lexicon:
+    from emotions import EMOTION_TAXONOMY  # emotions imports this module
+
+    with open(path, encoding="utf-8") as f:
+        return parse_lexicon(json.load(f), EMOTION_TAXONOMY)
+
+
+_current: Optional[Lexicon] = None
+_stamp: Optional[tuple[float, int]] = None
+_last_check = 0.0
+_force_reload = False
+_lock = threading.Lock()
+
+
+def _file_stamp() -> tuple[float, int]:
+    st = os.stat(LEXICON_PATH)
+    return st.st_mtime, st.st_size
+
+
+def current() -> Lexicon:
+    """The active lexicon (loaded on first use). Take it once per entry and reuse the snapshot."""
+    lex = _current
+    if lex is None:
+        reload(force=True)
+        lex = _current
+    return lex
+
+
+def reload(force: bool = False) -> bool:
+    """
+    Re-read LEXICON_PATH if it changed (or always with force). Return True when a new lexicon was
+    published. A broken file keeps the previous lexicon (only the first load raises).
+    """
+    global _current, _stamp
+    with _lock:
+        stamp = None
+        try:
+            stamp = _file_stamp()
+            if not force and stamp == _stamp:
+                return False
+            lex = load_lexicon(LEXICON_PATH)
+        except (OSError, ValueError) as e:
+            if _current is None:
+                raise
+            _stamp = stamp  # report a broken file once, not on every check
+            print(f"Lexicon reload from {LEXICON_PATH} failed, keeping version {_current.version}: {e}", flush=True)
+            return False
+        previous = _current.version if _current else None
+        _current, _stamp = lex, stamp
+    if previous is not None:
+        print(f"Lexicon reloaded: version {previous} -> {lex.version}", flush=True)
+    return True
+
+
+def maybe_reload() -> bool:
+    """Cheap periodic check (at most every LEXICON_CHECK_SECONDS, or right after SIGHUP) for an edited file."""
+    global _last_check, _force_reload
+    now = time.monotonic()
+    if not _force_reload and now - _last_check < LEXICON_CHECK_SECONDS:
+        return False
+    force, _force_reload, _last_check = _force_reload, False, now
+    return reload(force=force)
+
+
+def _request_reload(signum, frame) -> None:
+    # Only set a flag: the handler can interrupt the main thread while it holds _lock.
+    global _force_reload
+    _force_reload = True
+
+
+def install_reload_signal() -> None:
+    """Force a reload on the next maybe_reload() after SIGHUP (main thread only; no-op without SIGHUP)."""
+    if hasattr(signal, "SIGHUP"):
+        signal.signal(signal.SIGHUP, _request_reload)
@@ -5,13 +5,38 @@ Configure via LLM_PROVIDER and provider-specific env vars.
 To add a new provider (e.g. groq): add a branch in get_client(), get_model(), and
 is_available(), and set env vars (e.g. GROQ_API_KEY, GROQ_BASE_URL). Same OpenAI
 client works for any endpoint that speaks the OpenAI chat completions API.
+
+Clients are long-lived: get_client() returns one shared client per (provider, base URL, timeout),
+each on its own keep-alive httpx connection pool, so calls reuse open TCP/TLS connections instead
+of paying a handshake each time. OpenAI clients are safe to share across threads. Async handlers
+use async_chat(), which awaits an AsyncOpenAI client from the same registry.
+
+Call sites can opt in to the persistent response cache (llm_cache.py) with cache_site and cache_ttl.
+Identical concurrent calls are coalesced into one upstream request (singleflight.py), which then
+waits for a slot of its workload class (llm_scheduler.py): interactive before summary before
+background, across all services when LLM_SCHEDULER_DB_URL is set, so a consumer backlog cannot
+starve the Today page.
 """
+import asyncio
 import os
+import threading
 from typing import Any, Optional
 
+import llm_cache
+import llm_scheduler
+from metrics import LLM_ACTIVE, LLM_CACHE, LLM_QUEUE_DEPTH, LLM_QUEUE_WAIT, LLM_REJECTED
+from singleflight import SingleFlight
+
 # Ollama can be slow (e.g. weekly summary); use a long timeout so requests don't fail mid-stream.
 OLLAMA_TIMEOUT = float(os.getenv("OLLAMA_TIMEOUT", "300"))
 
+# Connection pool per client: LLM_MAX_CONNECTIONS concurrent requests (size it to the worker and
+# chunk threads sharing the client), LLM_MAX_KEEPALIVE idle connections kept open for
+# LLM_KEEPALIVE_SECONDS.
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "32"))
+LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "16"))
+LLM_KEEPALIVE_SECONDS = float(os.getenv("LLM_KEEPALIVE_SECONDS", "60"))
+
 # --- Provider selection ---
 # LLM_PROVIDER=openai | ollama (future: groq, gemini, ...)
 _raw = (os.getenv("LLM_PROVIDER") or "").strip().lower()
@@ -45,17 +70,104 @@ def is_available() -> bool:
     return False
 
 
-def get_client(timeout: Optional[float] = None):
-    """Return an OpenAI-compatible client for the configured provider."""
-    from openai import OpenAI
+_clients: dict[tuple, Any] = {}
+_clients_lock = threading.Lock()
+# Identical concurrent requests (same model, messages and params) share one upstream call
+_in_flight = SingleFlight()
+
+
+def _scheduler_changed(workload: str, queued: int, active: int) -> None:
+    LLM_QUEUE_DEPTH.set(queued, workload=workload)
+    LLM_ACTIVE.set(active, workload=workload)
+
+
+# Every upstream call takes a slot for its workload class, shared with the other services when configured
+scheduler = llm_scheduler.LLMScheduler(on_change=_scheduler_changed, table=llm_scheduler.shared_table())
+
+
+def _client_settings(timeout: Optional[float]) -> tuple[str, Optional[str], Optional[float]]:
+    """(api_key, base_url, timeout) for the configured provider; timeout None = the OpenAI default."""
     if LLM_PROVIDER == "ollama":
-        return OpenAI(api_key="ollama", base_url=OLLAMA_BASE_URL, timeout=timeout or OLLAMA_TIMEOUT)
+        return "ollama", OLLAMA_BASE_URL, timeout or OLLAMA_TIMEOUT
     if LLM_PROVIDER == "openai":
         if OPENAI_BASE_URL:
-            return OpenAI(api_key=OPENAI_API_KEY or "ollama", base_url=OPENAI_BASE_URL)
-        return OpenAI(api_key=OPENAI_API_KEY)
+            return OPENAI_API_KEY or "ollama", OPENAI_BASE_URL, timeout
+        return OPENAI_API_KEY, None, timeout
     # Fallback for unknown provider
-    return OpenAI(api_key=OPENAI_API_KEY or "ollama", base_url=OPENAI_BASE_URL or None)
+    return OPENAI_API_KEY or "ollama", OPENAI_BASE_URL or None, timeout
+
+
+def _pool_limits():
+    import httpx
+    return httpx.Limits(
+        max_connections=LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=LLM_MAX_KEEPALIVE,
+        keepalive_expiry=LLM_KEEPALIVE_SECONDS,
+    )
+
+
+def _pooled_client(is_async: bool, timeout: Optional[float] = None):
+    api_key, base_url, timeout = _client_settings(timeout)
+    key = (LLM_PROVIDER, base_url, timeout, is_async)
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                import httpx
+                from openai import AsyncOpenAI, OpenAI
+                options = {"timeout": timeout} if timeout is not None else {}
+                if is_async:
+                    client = AsyncOpenAI(
+                        api_key=api_key,
+                        base_url=base_url,
+                        http_client=httpx.AsyncClient(limits=_pool_limits()),
+                        **options,
+                    )
+                else:
+                    client = OpenAI(
+                        api_key=api_key,
+                        base_url=base_url,
+                        http_client=httpx.Client(limits=_pool_limits()),
+                        **options,
+                    )
+                _clients[key] = client
+    return client
+
+
+def get_client(timeout: Optional[float] = None):
+    """Return the shared OpenAI-compatible client for the configured provider (created on first use)."""
+    return _pooled_client(False, timeout)
+
+
+def get_async_client(timeout: Optional[float] = None):
+    """
+    Shared async client for the configured provider. Its connections belong to the event loop that
+    first uses them, so call it from the service's loop only (threads use get_client()).
+    """
+    return _pooled_client(True, timeout)
+
+
+def close_clients() -> None:
+    """Close the pooled sync clients and their connections (the next call opens new ones)."""
+    with _clients_lock:
+        clients = {key: c for key, c in _clients.items() if not key[-1]}
+        for key in clients:
+            del _clients[key]
+    for client in clients.values():
+        client.close()
+
+
+async def aclose_clients() -> None:
+    """Close every pooled client, sync and async (server shutdown)."""
+    with _clients_lock:
+        clients = list(_clients.items())
+        _clients.clear()
+    for key, client in clients:
+        if key[-1]:
+            await client.close()
+        else:
+            client.close()
 
 
 def get_model() -> str:
@@ -65,10 +177,28 @@ def get_model() -> str:
     return OPENAI_MODEL
 
 
+def _reply_text(r) -> Optional[str]:
+    text = (r.choices[0].message.content or "").strip()
+    return text if text else None
+
+
+def _cache_key(messages: list[dict[str, str]], max_tokens: int, kwargs: dict) -> str:
+    return llm_cache.make_key(get_model(), messages, {"max_tokens": max_tokens, **kwargs})
+
+
+def _cached_reply(key: str, site: str) -> Optional[str]:
+    cached = llm_cache.get(key)
+    LLM_CACHE.inc(site=site, result="hit" if cached is not None else "miss")
+    return cached
+
+
 def chat(
     messages: list[dict[str, str]],
     max_tokens: int = 80,
     timeout: Optional[float] = None,
+    cache_site: str = "chat",
+    cache_ttl: Optional[float] = None,
+    workload: str = llm_scheduler.BACKGROUND,
     **kwargs: Any,
 ) -> Optional[str]:
     """
@@ -76,18 +206,78 @@ def chat(
     Returns the assistant message content or None on failure or timeout.
     When timeout is set (e.g. 90), the call gives up after that many seconds (useful for
     weekly summary with Ollama so we can fall back to instant non-LLM summary).
+    With cache_ttl, replies are cached for that many seconds (counted per cache_site); failures never are.
+    Concurrent identical calls (from any thread or task) wait for the first one and share its reply.
+    workload is the scheduler class (interactive, summary or background); None when its queue rejects the call.
     """
     if not is_available():
         return None
-    try:
-        client = get_client(timeout=timeout)
-        r = client.chat.completions.create(
-            model=get_model(),
-            messages=messages,
-            max_tokens=max_tokens,
-            **kwargs,
-        )
-        text = (r.choices[0].message.content or "").strip()
-        return text if text else None
-    except Exception:
+    key = _cache_key(messages, max_tokens, kwargs)
+    if cache_ttl and (cached := _cached_reply(key, cache_site)) is not None:
+        return cached
+
+    def complete() -> Optional[str]:
+        try:
+            client = get_client(timeout=timeout)
+            with scheduler.slot(workload) as waited:
+                LLM_QUEUE_WAIT.observe(waited, workload=workload)
+                r = client.chat.completions.create(
+                    model=get_model(),
+                    messages=messages,
+                    max_tokens=max_tokens,
+                    **kwargs,
+                )
+            text = _reply_text(r)
+        except llm_scheduler.SchedulerRejected as e:
+            LLM_REJECTED.inc(workload=e.workload, reason=e.reason)
+            return None
+        except Exception:
+            return None
+        if cache_ttl and text:
+            llm_cache.put(key, text, cache_ttl)
+        return text
+
+    return _in_flight.do(key, complete)
+
+
+async def async_chat(
+    messages: list[dict[str, str]],
+    max_tokens: int = 80,
+    timeout: Optional[float] = None,
+    cache_site: str = "chat",
+    cache_ttl: Optional[float] = None,
+    workload: str = llm_scheduler.BACKGROUND,
+    **kwargs: Any,
+) -> Optional[str]:
+    """
+    chat() for async handlers: awaiting the LLM holds a coroutine, not a threadpool worker.
+    Cache reads and writes are SQLite calls that can wait on a lock, so they run in a worker thread.
+    """
+    if not is_available():
         return None
+    key = _cache_key(messages, max_tokens, kwargs)
+    if cache_ttl and (cached := await asyncio.to_thread(_cached_reply, key, cache_site)) is not None:
+        return cached
+
+    async def complete() -> Optional[str]:
+        try:
+            client = get_async_client(timeout=timeout)
+            async with scheduler.slot_async(workload) as waited:
+                LLM_QUEUE_WAIT.observe(waited, workload=workload)
+                r = await client.chat.completions.create(
+                    model=get_model(),
+                    messages=messages,
+                    max_tokens=max_tokens,
+                    **kwargs,
+                )
+            text = _reply_text(r)
+        except llm_scheduler.SchedulerRejected as e:
+            LLM_REJECTED.inc(workload=e.workload, reason=e.reason)
+            return None
+        except Exception:
+            return None
+        if cache_ttl and text:
+            await asyncio.to_thread(llm_cache.put, key, text, cache_ttl)
+        return text
+
+    return await _in_flight.do_async(key, complete)
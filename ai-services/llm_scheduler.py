@@ -0,0 +1,464 @@
+"""
+Priority LLM scheduler: every LLM call takes a slot for its workload class first, so interactive
+requests are not stuck behind a consumer backlog or a backfill.
+
+Classes, highest priority first: interactive (prompt-service follow-ups and nudges), summary (summary
+endpoints), background (consumer analysis, reflections, backfill). At most LLM_MAX_CONCURRENCY calls
+run at once, and each class at most LLM_<CLASS>_MAX_CONCURRENCY. A call that cannot run waits in its
+class's FIFO queue (LLM_<CLASS>_QUEUE_SIZE bound) for up to LLM_<CLASS>_QUEUE_TIMEOUT seconds; when a
+slot frees, waiting interactive calls are served before summary and background ones. A full queue or
+an expired wait rejects the call (SchedulerRejected) and the caller falls back as it does when the
+LLM is down.
+
+Without LLM_SCHEDULER_DB_URL the limits and the priority hold within one process. With it, every
+process (consumer, backfill workers, Summary and Prompt Service) admits its calls through one slot
+table in that Postgres database (llm_slot), so the limits and the priority cover all traffic to the
+LLM backend. A dispatcher thread per process syncs its waiting and finished calls with the table,
+every LLM_SCHEDULER_POLL_SECONDS while calls wait. Rows of a process that stops syncing expire after
+LLM_SCHEDULER_LEASE_SECONDS. While the table cannot be reached, the process admits by its own limits.
+
+Slots are granted through concurrent.futures.Future, so threads and asyncio tasks share one queue.
+Same module as prompt-service/llm_scheduler.py.
+"""
+import asyncio
+import os
+import socket
+import sys
+import threading
+import time
+import uuid
+import weakref
+from collections import Counter, deque
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Iterator, Optional, Protocol
+
+INTERACTIVE = "interactive"
+SUMMARY = "summary"
+BACKGROUND = "background"
+WORKLOADS = (INTERACTIVE, SUMMARY, BACKGROUND)  # priority order
+
+
+@dataclass(frozen=True)
+class WorkloadLimits:
+    max_concurrency: int
+    queue_size: int
+    queue_timeout: float  # seconds a call may wait for a slot
+
+
+def _limits_from_env(workload: str, max_concurrency: int, queue_size: int, queue_timeout: float) -> WorkloadLimits:
+    prefix = f"LLM_{workload.upper()}_"
+    return WorkloadLimits(
+        max_concurrency=int(os.getenv(prefix + "MAX_CONCURRENCY", str(max_concurrency))),
+        queue_size=int(os.getenv(prefix + "QUEUE_SIZE", str(queue_size))),
+        queue_timeout=float(os.getenv(prefix + "QUEUE_TIMEOUT", str(queue_timeout))),
+    )
+
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+DEFAULT_LIMITS = {
+    INTERACTIVE: _limits_from_env(INTERACTIVE, 8, 64, 10),
+    SUMMARY: _limits_from_env(SUMMARY, 4, 32, 30),
+    # Below the total limit, so background work always leaves slots for interactive calls
+    BACKGROUND: _limits_from_env(BACKGROUND, 6, 256, 300),
+}
+LLM_SCHEDULER_DB_URL = os.getenv("LLM_SCHEDULER_DB_URL", "")
+LLM_SCHEDULER_POLL_SECONDS = float(os.getenv("LLM_SCHEDULER_POLL_SECONDS", "0.05"))
+LLM_SCHEDULER_LEASE_SECONDS = float(os.getenv("LLM_SCHEDULER_LEASE_SECONDS", "30"))
+
+
+class SchedulerRejected(Exception):
+    """The call did not get a slot: its queue was full ("full") or the wait expired ("timeout")."""
+
+    def __init__(self, workload: str, reason: str):
+        super().__init__(f"LLM {workload} queue {reason}")
+        self.workload = workload
+        self.reason = reason
+
+
+def admit(rows: list[tuple[int, str, bool]], max_concurrency: int, limits: dict[str, WorkloadLimits]) -> list[int]:
+    """
+    Ids of the waiting rows to start. rows are (id, workload, active) in priority, then arrival order;
+    waiting rows start in that order while the total and their class's limit leave room.
+    """
+    running = Counter(workload for _, workload, active in rows if active)
+    total = sum(running.values())
+    started = []
+    for row_id, workload, active in rows:
+        if total >= max_concurrency:
+            break
+        if active or workload not in limits or running[workload] >= limits[workload].max_concurrency:
+            continue
+        started.append(row_id)
+        running[workload] += 1
+        total += 1
+    return started
+
+
+class SlotTable(Protocol):
+    lease_seconds: float
+
+    def sync(
+        self, owner: str, released: list[int], waiting: list[str],
+        admit_rows: Callable[[list[tuple[int, str, bool]]], list[int]],
+    ) -> tuple[list[int], set[int]]:
+        ...
+
+
+# Connections a forked child inherited: never used or closed there, since closing one ends the
+# parent's session on the shared socket
+_inherited_connections: list = []
+
+
+class PostgresSlotTable:
+    """llm_slot: one row per waiting or running LLM call of every process sharing the database."""
+
+    LOCK_KEY = 7_246_001  # advisory lock that serializes admission rounds
+
+    def __init__(self, url: str, lease_seconds: float = LLM_SCHEDULER_LEASE_SECONDS) -> None:
+        self.lease_seconds = lease_seconds
+        self._url = url
+        self._conn = None
+        self._pid = os.getpid()
+
+    def _connect(self):
+        import psycopg2  # only needed with LLM_SCHEDULER_DB_URL
+
+        conn = psycopg2.connect(self._url, connect_timeout=2)
+        with conn, conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_xact_lock(%s)", (self.LOCK_KEY,))
+            # Slots only matter while their processes run, so the table skips the WAL
+            cur.execute("""
+                CREATE UNLOGGED TABLE IF NOT EXISTS llm_slot (
+                    id BIGSERIAL PRIMARY KEY,
+                    owner TEXT NOT NULL,
+                    workload TEXT NOT NULL,
+                    priority INT NOT NULL,
+                    active BOOLEAN NOT NULL DEFAULT false,
+                    heartbeat_at TIMESTAMPTZ NOT NULL DEFAULT now()
+                )
+            """)
+        return conn
+
+    def close(self) -> None:
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+            self._conn = None
+
+    def sync(
+        self, owner: str, released: list[int], waiting: list[str],
+        admit_rows: Callable[[list[tuple[int, str, bool]]], list[int]],
+    ) -> tuple[list[int], set[int]]:
+        """
+        One admission round: drop released and expired rows, renew owner's rows, add a row per waiting
+        call and start the rows admit_rows picks. Returns (ids of the added rows, in order; ids of
+        owner's running rows).
+        """
+        if self._pid != os.getpid():
+            _inherited_connections.append(self._conn)
+            self._conn, self._pid = None, os.getpid()
+        if self._conn is None:
+            self._conn = self._connect()
+        try:
+            with self._conn, self._conn.cursor() as cur:
+                cur.execute("SELECT pg_advisory_xact_lock(%s)", (self.LOCK_KEY,))
+                if released:
+                    cur.execute("DELETE FROM llm_slot WHERE id = ANY(%s)", (released,))
+                cur.execute(
+                    "DELETE FROM llm_slot WHERE heartbeat_at < now() - %s * interval '1 second'",
+                    (self.lease_seconds,),
+                )
+                cur.execute("UPDATE llm_slot SET heartbeat_at = now() WHERE owner = %s", (owner,))
+                added = []
+                for workload in waiting:
+                    cur.execute(
+                        "INSERT INTO llm_slot (owner, workload, priority) VALUES (%s, %s, %s) RETURNING id",
+                        (owner, workload, WORKLOADS.index(workload)),
+                    )
+                    added.append(cur.fetchone()[0])
+                cur.execute("SELECT id, owner, workload, active FROM llm_slot ORDER BY priority, id")
+                rows = cur.fetchall()
+                started = set(admit_rows([(row_id, w, active) for row_id, _, w, active in rows]))
+                if started:
+                    cur.execute("UPDATE llm_slot SET active = true WHERE id = ANY(%s)", (list(started),))
+        except Exception:
+            self.close()
+            raise
+        return added, {row_id for row_id, o, _, active in rows if o == owner and (active or row_id in started)}
+
+
+def shared_table() -> Optional[PostgresSlotTable]:
+    """The slot table configured by LLM_SCHEDULER_DB_URL, or None for per-process limits."""
+    return PostgresSlotTable(LLM_SCHEDULER_DB_URL) if LLM_SCHEDULER_DB_URL else None
+
+
+_schedulers: "weakref.WeakSet[LLMScheduler]" = weakref.WeakSet()
+
+
+class LLMScheduler:
+    def __init__(
+        self,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        limits: Optional[dict[str, WorkloadLimits]] = None,
+        on_change: Optional[Callable[[str, int, int], None]] = None,
+        table: Optional[SlotTable] = None,
+        poll_seconds: float = LLM_SCHEDULER_POLL_SECONDS,
+    ) -> None:
+        """
+        on_change(workload, queued, active) is called after every change to a class's counts.
+        With a table, calls are admitted through it (see the module docstring).
+        """
+        self._max_concurrency = max(1, max_concurrency)
+        self._limits = limits or DEFAULT_LIMITS
+        self._on_change = on_change
+        self._table = table
+        self._poll_seconds = poll_seconds
+        self._reset()
+        _schedulers.add(self)
+
+    def _reset(self) -> None:
+        """Fresh state; also run in a forked child, which holds none of the parent's slots or threads."""
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._active = {w: 0 for w in WORKLOADS}
+        self._queues: dict[str, deque] = {w: deque() for w in WORKLOADS}
+        self._admitted = {w: 0 for w in WORKLOADS}
+        self._wait_seconds = {w: 0.0 for w in WORKLOADS}
+        self._rejected = {(w, r): 0 for w in WORKLOADS for r in ("full", "timeout")}
+        # Shared mode: table row of each queued call, rows of running calls, rows to delete
+        self._row_of: dict[Future, int] = {}
+        self._held: dict[str, list[int]] = {w: [] for w in WORKLOADS}
+        self._released: list[int] = []
+        self._table_down_until = 0.0
+        self._owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._dispatcher: Optional[threading.Thread] = None
+        self._closed = False
+
+    def _shared(self) -> bool:
+        return self._table is not None and time.monotonic() >= self._table_down_until
+
+    def _can_run(self, workload: str) -> bool:
+        return (
+            sum(self._active.values()) < self._max_concurrency
+            and self._active[workload] < self._limits[workload].max_concurrency
+        )
+
+    def _changed(self, workload: str) -> None:
+        if self._on_change:
+            self._on_change(workload, len(self._queues[workload]), self._active[workload])
+
+    def _dispatch(self) -> None:
+        """Hand free slots to queued calls, highest priority class first (caller holds the lock)."""
+        for workload in WORKLOADS:
+            queue = self._queues[workload]
+            granted = False
+            while queue and self._can_run(workload):
+                waiter = queue.popleft()
+                if waiter in self._row_of:  # queued in the table, which cannot be reached now
+                    self._released.append(self._row_of.pop(waiter))
+                self._active[workload] += 1
+                waiter.set_result(True)
+                granted = True
+            if granted:
+                self._changed(workload)
+
+    def _enqueue(self, workload: str) -> Optional[Future]:
+        """Take a slot now (None) or a place in the class queue (the Future resolves when granted)."""
+        if workload not in self._limits:
+            raise ValueError(f"unknown LLM workload {workload!r}; expected one of {WORKLOADS}")
+        with self._lock:
+            shared = self._shared()
+            # After every release no queued call can run, so a non-empty queue means this call waits too
+            if not shared and not self._queues[workload] and self._can_run(workload):
+                self._active[workload] += 1
+                self._changed(workload)
+                return None
+            if len(self._queues[workload]) >= self._limits[workload].queue_size:
+                self._rejected[(workload, "full")] += 1
+                raise SchedulerRejected(workload, "full")
+            waiter: Future = Future()
+            self._queues[workload].append(waiter)
+            self._changed(workload)
+            if shared:
+                self._start_dispatcher()
+        if shared:
+            self._wake.set()
+        return waiter
+
+    def _abandon(self, workload: str, waiter: Future, reason: Optional[str]) -> bool:
+        """Leave the queue; False if the slot was granted meanwhile (the caller now holds it)."""
+        with self._lock:
+            if waiter.done():
+                return False
+            waiter.cancel()  # tells a sync round in progress that its new row is not needed
+            self._queues[workload].remove(waiter)
+            if waiter in self._row_of:
+                self._released.append(self._row_of.pop(waiter))
+            if reason:
+                self._rejected[(workload, reason)] += 1
+            self._changed(workload)
+        self._wake.set()
+        return True
+
+    def _admitted_after(self, workload: str, started: float) -> float:
+        waited = time.monotonic() - started
+        with self._lock:
+            self._admitted[workload] += 1
+            self._wait_seconds[workload] += waited
+        return waited
+
+    def acquire(self, workload: str) -> float:
+        """Block until the call may run; return the seconds waited. Raises SchedulerRejected."""
+        started = time.monotonic()
+        waiter = self._enqueue(workload)
+        if waiter is not None:
+            try:
+                waiter.result(timeout=self._limits[workload].queue_timeout)
+            except FutureTimeout:
+                if self._abandon(workload, waiter, "timeout"):
+                    raise SchedulerRejected(workload, "timeout") from None
+        return self._admitted_after(workload, started)
+
+    async def acquire_async(self, workload: str) -> float:
+        """acquire() for coroutines: the wait holds no thread."""
+        started = time.monotonic()
+        waiter = self._enqueue(workload)
+        if waiter is not None:
+            try:
+                await asyncio.wait_for(
+                    asyncio.shield(asyncio.wrap_future(waiter)), self._limits[workload].queue_timeout,
+                )
+            except asyncio.TimeoutError:
+                if self._abandon(workload, waiter, "timeout"):
+                    raise SchedulerRejected(workload, "timeout") from None
+            except asyncio.CancelledError:
+                if not self._abandon(workload, waiter, None):
+                    self.release(workload)
+                raise
+        return self._admitted_after(workload, started)
+
+    def release(self, workload: str) -> None:
+        with self._lock:
+            self._active[workload] -= 1
+            if self._held[workload]:
+                self._released.append(self._held[workload].pop())
+            if not self._shared():
+                self._dispatch()
+            self._changed(workload)
+            wake = bool(self._released)
+        if wake:
+            self._wake.set()
+
+    @contextmanager
+    def slot(self, workload: str) -> Iterator[float]:
+        waited = self.acquire(workload)
+        try:
+            yield waited
+        finally:
+            self.release(workload)
+
+    @asynccontextmanager
+    async def slot_async(self, workload: str) -> AsyncIterator[float]:
+        waited = await self.acquire_async(workload)
+        try:
+            yield waited
+        finally:
+            self.release(workload)
+
+    def _start_dispatcher(self) -> None:
+        """Caller holds the lock."""
+        if self._dispatcher is None:
+            self._dispatcher = threading.Thread(target=self._run_dispatcher, name="llm-scheduler", daemon=True)
+            self._dispatcher.start()
+
+    def _next_sync_in(self) -> Optional[float]:
+        """Seconds until the next sync round; None when nothing needs one (caller holds the lock)."""
+        waiting = any(self._queues.values()) or self._released
+        held = any(self._held.values())
+        if not (waiting or held):
+            return None
+        if not self._shared():
+            return max(self._table_down_until - time.monotonic(), 0.0)
+        return self._poll_seconds if waiting else self._table.lease_seconds / 3
+
+    def _run_dispatcher(self) -> None:
+        while True:
+            with self._lock:
+                if self._closed:
+                    return
+                timeout = self._next_sync_in()
+            self._wake.wait(timeout)
+            self._wake.clear()
+            self._sync()
+
+    def _sync(self) -> None:
+        """One round with the table; when it fails, admit by this process's limits for a lease."""
+        with self._lock:
+            if self._closed or not self._shared():
+                return
+            released, self._released = self._released, []
+            new = [(w, f) for w in WORKLOADS for f in self._queues[w] if f not in self._row_of]
+            if not (released or new or self._row_of or any(self._held.values())):
+                return
+        try:
+            added, running = self._table.sync(
+                self._owner, released, [w for w, _ in new],
+                lambda rows: admit(rows, self._max_concurrency, self._limits),
+            )
+        except Exception as e:
+            print(f"LLM slot table unavailable, admitting by this process's limits: {e}", file=sys.stderr, flush=True)
+            with self._lock:
+                self._released[:0] = released
+                self._table_down_until = time.monotonic() + self._table.lease_seconds
+                self._dispatch()
+            return
+        with self._lock:
+            for (_, waiter), row_id in zip(new, added):
+                if waiter.cancelled():
+                    self._released.append(row_id)
+                else:
+                    self._row_of[waiter] = row_id
+            for workload in WORKLOADS:
+                queue = self._queues[workload]
+                granted = [f for f in queue if self._row_of.get(f) in running]
+                for waiter in granted:
+                    queue.remove(waiter)
+                    self._held[workload].append(self._row_of.pop(waiter))
+                    self._active[workload] += 1
+                    waiter.set_result(True)
+                if granted:
+                    self._changed(workload)
+
+    def close(self) -> None:
+        """Stop the dispatcher thread; rows left in the table expire with their lease."""
+        with self._lock:
+            self._closed = True
+        self._wake.set()
+
+    def stats(self) -> dict[str, dict[str, float]]:
+        """Per class: queued, active, admitted, wait_seconds (total), rejected_full, rejected_timeout."""
+        with self._lock:
+            return {
+                w: {
+                    "queued": len(self._queues[w]),
+                    "active": self._active[w],
+                    "admitted": self._admitted[w],
+                    "wait_seconds": self._wait_seconds[w],
+                    "rejected_full": self._rejected[(w, "full")],
+                    "rejected_timeout": self._rejected[(w, "timeout")],
+                }
+                for w in WORKLOADS
+            }
+
+
+def _reset_after_fork() -> None:
+    for scheduler in list(_schedulers):
+        scheduler._reset()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,165 @@
+"""
+Minimal in-process metrics with a Prometheus text-format endpoint (no extra dependency).
+The consumer serves GET /metrics on METRICS_PORT (the summary service on its own port); the
+analyzers, DB writes and LLM layer record into the module-level metrics below.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterator, Optional
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_registry: list["_Metric"] = []
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: tuple, extra: Optional[tuple] = None) -> str:
+    pairs = list(key) + list(extra or ())
+    if not pairs:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str):
+        super().__init__(name, documentation)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(_label_key(labels), 0.0)
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return super().render() + [f"{self.name}{_format_labels(k)} {_format_value(v)}" for k, v in items]
+
+
+class Gauge(Counter):
+    type_name = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[_label_key(labels)] = float(value)
+
+    def remove(self, **labels) -> None:
+        with self._lock:
+            self._values.pop(_label_key(labels), None)
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, documentation)
+        self._buckets = tuple(sorted(buckets))
+        self._series: dict[tuple, list] = {}  # key -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.setdefault(key, [0] * len(self._buckets) + [0.0, 0])
+            for i, bound in enumerate(self._buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        lines = super().render()
+        for key, series in items:
+            for bound, count in zip(self._buckets, series):
+                lines.append(f"{self.name}_bucket{_format_labels(key, (('le', repr(bound)),))} {count}")
+            lines.append(f"{self.name}_bucket{_format_labels(key, (('le', '+Inf'),))} {series[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {series[-1]}")
+        return lines
+
+
+def render_metrics() -> str:
+    lines: list[str] = []
+    for metric in list(_registry):
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_metrics().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # scrapes every few seconds would flood the consumer's stderr
+
+
+def start_metrics_server(port: int) -> Optional[ThreadingHTTPServer]:
+    """Serve /metrics on a daemon thread. Port 0 disables the endpoint."""
+    if not port:
+        return None
+    server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
+
+
+# --- Consumer / analyzer metrics ---
+MESSAGES_TOTAL = Counter("consumer_messages_total", "Kafka messages handled by the consumer.")
+MESSAGES_PER_SECOND = Gauge("consumer_messages_per_second", "Messages handled per second over the last refresh interval.")
+CONSUMER_LAG = Gauge("consumer_lag", "Messages between the consumer position and the log end, per partition.")
+WRITE_SKIPPED = Counter("consumer_write_skipped_total", "Analyzed results skipped because their row could not be written.")
+STAGE_LATENCY = Histogram("analysis_stage_seconds", "Latency of analyzer stages and the DB commit.")
+ANALYZER_PATH = Counter("analyzer_path_total", "Analyzer results by path (llm or keyword).")
+ANALYSIS_CACHE = Counter("analysis_cache_total", "Analysis cache lookups by result (hit or miss).")
+LLM_CACHE = Counter("llm_cache_total", "LLM response cache lookups by call site and result (hit or miss).")
+LLM_QUEUE_DEPTH = Gauge("llm_queue_depth", "LLM calls waiting for a scheduler slot, per workload class.")
+LLM_ACTIVE = Gauge("llm_active_calls", "LLM calls holding a scheduler slot, per workload class.")
+LLM_QUEUE_WAIT = Histogram("llm_queue_wait_seconds", "Time LLM calls waited for a scheduler slot, per workload class.")
+LLM_REJECTED = Counter("llm_rejected_total", "LLM calls rejected by the scheduler, by workload class and reason (full or timeout).")
+CONSUMER_DEGRADED = Gauge("consumer_degraded", "1 while the consumer uses keyword analyzers because of lag.")
+REENRICHED_TOTAL = Counter("reenrichment_total", "Provisional entries re-analyzed with the LLM, by outcome.")
@@ -0,0 +1,55 @@
+"""
+Per-partition offset bookkeeping for the concurrent consumer.
+Messages finish out of order in the worker pool; offsets are only committed up to
+the last contiguous completed message of each partition so a crash never skips work.
+"""
+from collections import deque
+from typing import Hashable, Iterable
+
+
+class OffsetTracker:
+    """Track in-flight offsets per partition and report the next safe commit position."""
+
+    def __init__(self) -> None:
+        self._pending: dict[Hashable, deque[int]] = {}
+        self._done: dict[Hashable, set[int]] = {}
+        self._position: dict[Hashable, int] = {}
+        self._committed: dict[Hashable, int] = {}
+
+    def add(self, tp: Hashable, offset: int) -> None:
+        """Register a message handed to the worker pool (offsets arrive in order per partition)."""
+        self._pending.setdefault(tp, deque()).append(offset)
+        self._done.setdefault(tp, set())
+
+    def complete(self, tp: Hashable, offset: int) -> None:
+        """Mark a message as fully handled (written or deliberately skipped)."""
+        if tp not in self._pending:
+            return  # partition was revoked while the message was in flight
+        self._done[tp].add(offset)
+        pending = self._pending[tp]
+        done = self._done[tp]
+        while pending and pending[0] in done:
+            off = pending.popleft()
+            done.discard(off)
+            self._position[tp] = off + 1
+
+    def in_flight(self) -> int:
+        return sum(len(p) for p in self._pending.values())
+
+    def committable(self) -> dict[Hashable, int]:
+        """Return {partition: next offset} for partitions whose contiguous position advanced since last commit."""
+        return {
+            tp: pos for tp, pos in self._position.items()
+            if self._committed.get(tp) != pos
+        }
+
+    def mark_committed(self, positions: dict[Hashable, int]) -> None:
+        self._committed.update(positions)
+
+    def revoke(self, partitions: Iterable[Hashable]) -> None:
+        """Forget partitions taken away by a rebalance; late completions for them are ignored."""
+        for tp in partitions:
+            self._pending.pop(tp, None)
+            self._done.pop(tp, None)
+            self._position.pop(tp, None)
+            self._committed.pop(tp, None)
@@ -5,6 +5,7 @@ Uses only the entry text so the model doesn't echo metadata. Non-judgmental.
 import re
 from typing import Optional
 
+from chunking import excerpt
 from llm import chat, is_available
 
 # Reject reflections that look like metadata, instructions, or are too long.
@@ -17,7 +18,7 @@ BAD_PATTERNS = re.compile(
 MAX_REFLECTION_WORDS = 25
 
 
-def _is_valid_reflection(text: str) -> bool:
+def is_valid_reflection(text: str) -> bool:
     """True if the response looks like one short empathetic sentence, not metadata or garbage."""
     if not text or len(text) < 5:
         return False
@@ -43,10 +44,11 @@ def generate_reflection(
     """
     Return one short empathetic sentence, or None if no LLM or invalid response.
     We send only the entry text (no sentiment/themes) so the model doesn't echo our metadata.
+    Long entries are cut to whole sentences from their start and end (chunking.excerpt).
     """
     if not is_available() or not content or not content.strip():
         return None
-    snippet = (content[:300] + "...") if len(content) > 300 else content
+    snippet = excerpt(content)
     raw = chat(
         messages=[
             {
@@ -65,6 +67,6 @@ def generate_reflection(
         ],
         max_tokens=40,
     )
-    if raw and _is_valid_reflection(raw):
+    if raw and is_valid_reflection(raw):
         return raw.strip()
     return None
@@ -0,0 +1,103 @@
+"""
+Background reflection stage: generates the one-line reflection per entry off the consumer's
+write path and upserts it into entry_reflection.
+Jobs sit in a bounded priority queue: fresh entries (just saved by the user) are served before
+backfill, and when the queue is full a fresh job evicts the oldest-priority backfill job.
+"""
+import heapq
+import itertools
+import sys
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from config import REFLECTION_FRESH_SECONDS, REFLECTION_QUEUE_SIZE, REFLECTION_WORKERS
+from db import Session as DBSession, upsert_entry_reflection
+from reflection import generate_reflection
+
+PRIORITY_FRESH = 0
+PRIORITY_BACKFILL = 1
+
+
+def priority_for(entry_created_at: Optional[datetime]) -> int:
+    """Fresh if the entry was created within REFLECTION_FRESH_SECONDS (or the time is unknown)."""
+    if entry_created_at is None:
+        return PRIORITY_FRESH
+    if entry_created_at.tzinfo is None:
+        entry_created_at = entry_created_at.replace(tzinfo=timezone.utc)
+    age = datetime.now(timezone.utc) - entry_created_at
+    return PRIORITY_FRESH if age <= timedelta(seconds=REFLECTION_FRESH_SECONDS) else PRIORITY_BACKFILL
+
+
+class ReflectionStage:
+    """Bounded priority queue plus worker threads that write EntryReflection rows."""
+
+    def __init__(self, workers: int = REFLECTION_WORKERS, maxsize: int = REFLECTION_QUEUE_SIZE):
+        self._heap: list[tuple[int, int, dict]] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._maxsize = maxsize
+        self.dropped = 0
+        self._threads = [
+            threading.Thread(target=self._run, name=f"reflection-{i}", daemon=True)
+            for i in range(max(1, workers))
+        ]
+
+    def start(self) -> "ReflectionStage":
+        for t in self._threads:
+            t.start()
+        return self
+
+    def qsize(self) -> int:
+        with self._cond:
+            return len(self._heap)
+
+    def submit(self, job: dict, priority: Optional[int] = None) -> bool:
+        """
+        Enqueue a job (entry_id, user_id, content, score, label, themes, optional precomputed reflection).
+        Never blocks. Return False if the job was dropped because the queue is full of equal or higher priority work.
+        """
+        if priority is None:
+            priority = priority_for(job.get("entry_created_at"))
+        with self._cond:
+            if len(self._heap) >= self._maxsize:
+                worst = max(self._heap)
+                if worst[0] <= priority:
+                    self.dropped += 1
+                    return False
+                self._heap.remove(worst)
+                heapq.heapify(self._heap)
+                self.dropped += 1
+            heapq.heappush(self._heap, (priority, next(self._seq), job))
+            self._cond.notify()
+        return True
+
+    def _next(self) -> dict:
+        with self._cond:
+            while not self._heap:
+                self._cond.wait()
+            return heapq.heappop(self._heap)[2]
+
+    def _run(self) -> None:
+        while True:
+            job = self._next()
+            try:
+                self._handle(job)
+            except Exception as e:
+                print(f"Error writing reflection for entry {job.get('entry_id')}: {e}", file=sys.stderr, flush=True)
+
+    def _handle(self, job: dict) -> None:
+        reflection = job.get("reflection") or generate_reflection(
+            job.get("content") or "", job.get("score", 0.0), job.get("label"), job.get("themes") or [],
+        )
+        if not reflection:
+            return
+        session = DBSession()
+        try:
+            upsert_entry_reflection(session, job["entry_id"], job["user_id"], reflection)
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
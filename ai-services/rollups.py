@@ -0,0 +1,131 @@
+"""
+Incremental per-user daily rollups (user_daily_sentiment, user_daily_theme, user_daily_emotion).
+The consumer applies deltas in the same transaction as the raw sentiment/theme upsert: an entry's
+previous contribution (if it was already analyzed) is subtracted and the new one added, so replays
+and re-analysis keep the aggregates exact without recomputing a user's history. Themes are counted
+by canonical theme id (theme_registry.py).
+Rows for one entry are expected to be written by one consumer at a time (entryId is the Kafka key).
+"""
+from collections import defaultdict
+from datetime import date
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from db import UserDailyEmotion, UserDailySentiment, UserDailyTheme
+
+LABEL_COLUMNS = {
+    "positive": "positive_count",
+    "negative": "negative_count",
+    "neutral": "neutral_count",
+    "mixed": "mixed_count",
+}
+SENTIMENT_COLUMNS = ["score_sum", "score_count", "score_sumsq", *LABEL_COLUMNS.values()]
+
+
+def fetch_existing(session, entry_ids: list) -> dict:
+    """
+    Return {entry_id: row} for entries that already have analytics rows, locking their sentiment rows.
+    Each row has user_id, day, score, label, emotions, theme_ids (the entry's current rollup contribution),
+    content_hash (of the content it was analyzed from; None for rows written before it existed) and provisional.
+    """
+    if not entry_ids:
+        return {}
+    result = session.execute(
+        text("""
+            SELECT sr.entry_id, sr.user_id, DATE(sr.computed_at), sr.score, sr.label, sr.emotions,
+                ARRAY(SELECT et.theme_id FROM entry_theme et WHERE et.entry_id = sr.entry_id ORDER BY et.theme_id),
+                sr.content_hash, sr.provisional
+            FROM sentiment_result sr
+            WHERE sr.entry_id = ANY(:ids)
+            FOR UPDATE OF sr
+        """),
+        {"ids": list(entry_ids)},
+    )
+    return {
+        row[0]: {
+            "user_id": row[1], "day": row[2], "score": row[3], "label": row[4],
+            "emotions": row[5] or [], "theme_ids": row[6] or [], "content_hash": row[7],
+            "provisional": bool(row[8]),
+        }
+        for row in result.fetchall()
+    }
+
+
+class RollupDelta:
+    """Accumulates signed contributions of entries to the daily rollups."""
+
+    def __init__(self) -> None:
+        self.sentiment: dict[tuple, dict[str, float]] = defaultdict(lambda: dict.fromkeys(SENTIMENT_COLUMNS, 0))
+        self.themes: dict[tuple, int] = defaultdict(int)
+        self.emotions: dict[tuple, int] = defaultdict(int)
+
+    def add(self, row: dict, day: date, sign: int = 1) -> None:
+        """Add (sign=1) or remove (sign=-1) one entry's contribution on the given day."""
+        key = (row["user_id"], day)
+        score = float(row["score"])
+        s = self.sentiment[key]
+        s["score_sum"] += sign * score
+        s["score_count"] += sign
+        s["score_sumsq"] += sign * score * score
+        column = LABEL_COLUMNS.get(row.get("label") or "")
+        if column:
+            s[column] += sign
+        for theme_id in row.get("theme_ids") or []:
+            self.themes[(row["user_id"], day, theme_id)] += sign
+        for emotion in row.get("emotions") or []:
+            if isinstance(emotion, str) and emotion:
+                self.emotions[(row["user_id"], day, emotion)] += sign
+
+    def apply(self, session) -> None:
+        """Upsert the accumulated deltas (caller commits). Zero deltas are skipped."""
+        sentiment_rows = [
+            {"user_id": user_id, "day": day, **values}
+            for (user_id, day), values in self.sentiment.items()
+            if any(values.values())
+        ]
+        if sentiment_rows:
+            stmt = pg_insert(UserDailySentiment).values(sentiment_rows)
+            session.execute(stmt.on_conflict_do_update(
+                index_elements=[UserDailySentiment.user_id, UserDailySentiment.day],
+                set_={c: getattr(UserDailySentiment, c) + getattr(stmt.excluded, c) for c in SENTIMENT_COLUMNS},
+            ))
+        for model, column, counts in (
+            (UserDailyTheme, "theme_id", self.themes),
+            (UserDailyEmotion, "emotion", self.emotions),
+        ):
+            rows = [
+                {"user_id": user_id, "day": day, column: name, "count": n}
+                for (user_id, day, name), n in counts.items()
+                if n
+            ]
+            if not rows:
+                continue
+            stmt = pg_insert(model).values(rows)
+            session.execute(stmt.on_conflict_do_update(
+                index_elements=[model.user_id, model.day, getattr(model, column)],
+                set_={"count": model.count + stmt.excluded.count},
+            ))
+
+
+def apply_rollup_deltas(session, existing: dict, results: list[dict], today: Optional[date] = None) -> None:
+    """
+    Move each entry's rollup contribution from its previous analysis (if any) to the new one.
+    Re-analyzed entries stay on their original day; new entries count on `today` (their computed_at date).
+    """
+    delta = RollupDelta()
+    for r in results:
+        old = existing.get(r["entry_id"])
+        if old is not None:
+            delta.add(old, old["day"], sign=-1)
+        delta.add(r, old["day"] if old is not None else today)
+    delta.apply(session)
+
+
+def remove_rollup_contributions(session, removed: list[dict]) -> None:
+    """Subtract deleted entries' contributions (rows from fetch_existing) from the rollups on their day."""
+    delta = RollupDelta()
+    for old in removed:
+        delta.add(old, old["day"], sign=-1)
+    delta.apply(session)
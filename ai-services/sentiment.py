@@ -1,24 +1,25 @@
-"""Simple sentiment: keyword-based score in [-1, 1]. Optional OpenAI for better accuracy."""
-import re
-from llm import get_client, get_model, is_available
+"""
+Simple sentiment: keyword-based score in [-1, 1]. Optional OpenAI for better accuracy.
+Between the two sits the local statistical model (sentiment_model.py) when one has been trained.
+The positive / negative word lists live in the lexicon file (lexicon.py).
+"""
+from typing import Optional
 
-NEGATIVE_WORDS = {
-    "stress", "stressed", "anxious", "sad", "angry", "tired", "worried", "frustrated",
-    "overwhelm", "bad", "hard", "difficult", "hate", "fail", "failed", "lonely",
-    "scared", "afraid", "guilty", "ashamed", "hopeless", "exhausted",
-}
-POSITIVE_WORDS = {
-    "happy", "calm", "grateful", "peaceful", "joy", "good", "great", "love", "loved",
-    "thankful", "relaxed", "energized", "hopeful", "proud", "excited", "relief",
-    "better", "peace", "content", "blessed", "wonderful", "amazing",
-}
+import chunking
+import lexicon
+from keywords import TokenizedDocument
+from llm import chat, is_available
+from sentiment_model import get_model as get_sentiment_model
 
 
 def compute_sentiment_simple(content: str) -> tuple[float, str]:
-    content_lower = re.sub(r"[^a-z\s]", " ", content.lower())
-    words = set(content_lower.split())
-    pos = sum(1 for w in words if w in POSITIVE_WORDS)
-    neg = sum(1 for w in words if w in NEGATIVE_WORDS)
+    return compute_sentiment_document(TokenizedDocument(content))
+
+
+def compute_sentiment_document(doc: TokenizedDocument, lex: Optional[lexicon.Lexicon] = None) -> tuple[float, str]:
+    found = (lex or lexicon.current()).sentiment_matcher.find_document(doc)  # distinct lexicon words present
+    pos = sum(1 for labels in found.values() if "positive" in labels)
+    neg = sum(1 for labels in found.values() if "negative" in labels)
     total = pos + neg
     if total == 0:
         return 0.0, "neutral"
@@ -35,32 +36,50 @@ def compute_sentiment_simple(content: str) -> tuple[float, str]:
     return round(score, 3), label
 
 
-def compute_sentiment_openai(content: str) -> tuple[float, str] | None:
-    if not is_available() or len(content) > 2000:
-        return None
+def compute_sentiment_offline(doc: TokenizedDocument, lex: Optional[lexicon.Lexicon] = None) -> tuple[float, str, str]:
+    """(score, label, source) without the LLM: the local model when loaded, else the lexicon."""
+    model = get_sentiment_model()
+    if model is not None:
+        return (*model.predict(doc), "model")
+    return (*compute_sentiment_document(doc, lex), "keyword")
+
+
+def _sentiment_openai_chunk(content: str) -> tuple[float, str] | None:
+    raw = chat(
+        messages=[
+            {"role": "system", "content": "Reply with only a number from -1 to 1 (sentiment: -1=very negative, 0=neutral, 1=very positive) and one word: positive, negative, neutral, or mixed. Use mixed when the entry clearly has both positive and negative emotions (e.g. bittersweet). Format: score label e.g. 0.5 positive"},
+            {"role": "user", "content": content},
+        ],
+        max_tokens=20,
+    )
     try:
-        client = get_client()
-        r = client.chat.completions.create(
-            model=get_model(),
-            messages=[
-                {"role": "system", "content": "Reply with only a number from -1 to 1 (sentiment: -1=very negative, 0=neutral, 1=very positive) and one word: positive, negative, neutral, or mixed. Use mixed when the entry clearly has both positive and negative emotions (e.g. bittersweet). Format: score label e.g. 0.5 positive"},
-                {"role": "user", "content": content[:2000]},
-            ],
-            max_tokens=20,
-        )
-        raw = (r.choices[0].message.content or "").strip()
-        parts = raw.split()
+        parts = (raw or "").split()
         if len(parts) >= 2:
             score = float(parts[0])
             label = parts[1].lower() if parts[1].lower() in ("positive", "negative", "neutral", "mixed") else "neutral"
             return max(-1, min(1, score)), label
-    except Exception:
+    except ValueError:
         pass
     return None
 
 
+def compute_sentiment_openai(content: str) -> tuple[float, str] | None:
+    """LLM sentiment; long entries are scored per chunk in parallel and merged, weighted by chunk length."""
+    if not is_available() or not content.strip():
+        return None
+    chunks = chunking.chunk_text(content)
+    scored = [(r, len(c)) for r, c in zip(chunking.map_chunks(_sentiment_openai_chunk, chunks), chunks) if r]
+    if not scored:
+        return None
+    if len(scored) == 1:
+        return scored[0][0]
+    score = chunking.weighted_mean((r[0] for r, _ in scored), (w for _, w in scored))
+    return round(score, 3), chunking.merge_sentiment_labels([r[1] for r, _ in scored], [w for _, w in scored])
+
+
 def compute_sentiment(content: str) -> tuple[float, str]:
     out = compute_sentiment_openai(content) if is_available() else None
     if out is not None:
         return out
-    return compute_sentiment_simple(content)
+    score, label, _ = compute_sentiment_offline(TokenizedDocument(content))
+    return score, label
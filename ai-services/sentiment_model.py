@@ -0,0 +1,197 @@
+"""
+Local statistical sentiment model: hashed unigram + bigram features and a multinomial logistic
+regression, trained offline from LLM-labelled sentiment_result rows (see train_sentiment_model.py).
+
+Prediction is a handful of row lookups in a NumPy weight matrix, so it runs at keyword-path latency
+and is used instead of the lexicon whenever the LLM is off, degraded or skipped for the entry.
+The artifact is a single .npz file; MODEL_FORMAT guards against loading an incompatible layout.
+"""
+import os
+import threading
+import zlib
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Optional
+
+import numpy as np
+from scipy import sparse
+
+from config import SENTIMENT_MODEL_PATH
+from keywords import TokenizedDocument
+
+MODEL_FORMAT = 1
+DEFAULT_N_FEATURES = 2 ** 18
+LABELS = ("positive", "negative", "neutral", "mixed")
+
+
+@lru_cache(maxsize=200_000)
+def _bucket(feature: str, n_features: int) -> int:
+    # crc32 rather than hash(): Python's str hash is salted per process and must match at train time.
+    return zlib.crc32(feature.encode("utf-8")) % n_features
+
+
+def feature_indices(doc: TokenizedDocument, n_features: int) -> np.ndarray:
+    """Distinct hashed buckets of the entry's unigrams and bigrams."""
+    buckets = {_bucket(tok, n_features) for tok in doc.token_set}
+    buckets.update(_bucket(f"{a} {b}", n_features) for a, b in doc.bigrams)
+    return np.fromiter(buckets, dtype=np.int64, count=len(buckets))
+
+
+def feature_matrix(docs: list[TokenizedDocument], n_features: int) -> sparse.csr_matrix:
+    """Binary hashed features, each row scaled to unit L2 norm."""
+    rows = [feature_indices(d, n_features) for d in docs]
+    lengths = np.fromiter(map(len, rows), dtype=np.int64, count=len(rows))
+    indptr = np.concatenate(([0], np.cumsum(lengths)))
+    indices = np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+    data = np.repeat(1.0 / np.sqrt(np.maximum(lengths, 1)), lengths).astype(np.float32)
+    return sparse.csr_matrix((data, indices, indptr), shape=(len(docs), n_features))
+
+
+def _softmax(z: np.ndarray) -> np.ndarray:
+    z = z - z.max(axis=-1, keepdims=True)
+    e = np.exp(z)
+    return e / e.sum(axis=-1, keepdims=True)
+
+
+class SentimentModel:
+    """
+    weights: (n_features, n_labels) logistic regression weights; bias: (n_labels,).
+    label_scores: mean LLM score per label; the predicted score is their probability-weighted mean.
+    """
+
+    def __init__(
+        self,
+        weights: np.ndarray,
+        bias: np.ndarray,
+        label_scores: np.ndarray,
+        labels: tuple[str, ...] = LABELS,
+        version: str = "",
+    ):
+        self.weights = weights
+        self.bias = bias
+        self.label_scores = label_scores
+        self.labels = tuple(labels)
+        self.version = version
+
+    @property
+    def n_features(self) -> int:
+        return self.weights.shape[0]
+
+    def predict_proba(self, doc: TokenizedDocument) -> np.ndarray:
+        idx = feature_indices(doc, self.n_features)
+        z = self.bias.copy()
+        if len(idx):
+            z += self.weights[idx].sum(axis=0) / np.sqrt(len(idx))
+        return _softmax(z)
+
+    def predict(self, doc: TokenizedDocument) -> tuple[float, str]:
+        """(score in [-1, 1], label) for one entry; no words at all is neutral, as with the lexicon."""
+        if not doc.tokens:
+            return 0.0, "neutral"
+        p = self.predict_proba(doc)
+        score = float(np.clip(p @ self.label_scores, -1.0, 1.0))
+        return round(score, 3), self.labels[int(p.argmax())]
+
+    def predict_batch(self, docs: list[TokenizedDocument]) -> list[tuple[float, str]]:
+        """predict() for many entries with one sparse matrix product (bulk scoring)."""
+        if not docs:
+            return []
+        p = _softmax(np.asarray(feature_matrix(docs, self.n_features) @ self.weights) + self.bias)
+        scores = np.clip(p @ self.label_scores, -1.0, 1.0).tolist()
+        best = p.argmax(axis=1).tolist()
+        return [
+            (round(score, 3), self.labels[i]) if d.tokens else (0.0, "neutral")
+            for d, score, i in zip(docs, scores, best)
+        ]
+
+    def save(self, path: str) -> None:
+        """Write the .npz atomically so a running consumer never loads a half-written file."""
+        tmp = f"{path}.tmp.npz"
+        np.savez_compressed(
+            tmp,
+            format=np.array(MODEL_FORMAT),
+            version=np.array(self.version),
+            labels=np.array(self.labels),
+            weights=self.weights,
+            bias=self.bias,
+            label_scores=self.label_scores,
+        )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "SentimentModel":
+        with np.load(path, allow_pickle=False) as f:
+            if int(f["format"]) != MODEL_FORMAT:
+                raise ValueError(f"{path}: model format {int(f['format'])}, expected {MODEL_FORMAT}")
+            return cls(
+                weights=f["weights"].astype(np.float32),
+                bias=f["bias"].astype(np.float32),
+                label_scores=f["label_scores"].astype(np.float32),
+                labels=tuple(str(label) for label in f["labels"]),
+                version=str(f["version"]),
+            )
+
+
+def train(
+    docs: list[TokenizedDocument],
+    labels: list[str],
+    scores: list[float],
+    n_features: int = DEFAULT_N_FEATURES,
+    epochs: int = 20,
+    learning_rate: float = 0.5,
+    l2: float = 1e-6,
+    batch_size: int = 256,
+    seed: int = 0,
+) -> SentimentModel:
+    """Fit multinomial logistic regression with mini-batch AdaGrad on hashed features."""
+    label_index = {label: i for i, label in enumerate(LABELS)}
+    y = np.array([label_index[label] for label in labels], dtype=np.int64)
+    x = feature_matrix(docs, n_features)
+    n, k = x.shape[0], len(LABELS)
+    targets = np.eye(k, dtype=np.float32)[y]
+    score_arr = np.asarray(scores, dtype=np.float32)
+    label_scores = np.array(
+        [score_arr[y == i].mean() if (y == i).any() else 0.0 for i in range(k)], dtype=np.float32
+    )
+    weights = np.zeros((n_features, k), dtype=np.float32)
+    bias = np.log(np.maximum(targets.mean(axis=0), 1e-6)).astype(np.float32)
+    g2_w = np.full_like(weights, 1e-8)
+    g2_b = np.full_like(bias, 1e-8)
+    rng = np.random.default_rng(seed)
+    for _ in range(epochs):
+        order = rng.permutation(n)
+        for start in range(0, n, batch_size):
+            batch = order[start:start + batch_size]
+            xb = x[batch]
+            err = (_softmax(xb @ weights + bias) - targets[batch]) / len(batch)
+            # Only the feature rows present in the batch get a gradient (and L2 shrinkage)
+            touched = np.unique(xb.indices)
+            grad_w = (xb.T @ err)[touched] + l2 * weights[touched]
+            grad_b = err.sum(axis=0)
+            g2_w[touched] += grad_w ** 2
+            g2_b += grad_b ** 2
+            weights[touched] -= learning_rate * grad_w / np.sqrt(g2_w[touched])
+            bias -= learning_rate * grad_b / np.sqrt(g2_b)
+    version = datetime.now(timezone.utc).strftime("%Y%m%d%H%M%S")
+    return SentimentModel(weights, bias, label_scores, LABELS, version)
+
+
+_model: Optional[SentimentModel] = None
+_model_loaded = False
+_model_lock = threading.Lock()
+
+
+def get_model() -> Optional[SentimentModel]:
+    """The model at SENTIMENT_MODEL_PATH, loaded once per process; None when unset, missing or invalid."""
+    global _model, _model_loaded
+    if _model_loaded:
+        return _model
+    with _model_lock:
+        if not _model_loaded:
+            if SENTIMENT_MODEL_PATH and os.path.exists(SENTIMENT_MODEL_PATH):
+                try:
+                    _model = SentimentModel.load(SENTIMENT_MODEL_PATH)
+                except (OSError, ValueError, KeyError) as e:
+                    print(f"Sentiment model not loaded from {SENTIMENT_MODEL_PATH}: {e}", flush=True)
+            _model_loaded = True
+    return _model
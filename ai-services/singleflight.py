@@ -0,0 +1,63 @@
+"""
+Single-flight call coalescing: while a call for a key is in flight, identical calls wait for it
+and share its result instead of starting their own (one upstream LLM request for a double-fired
+follow-up or summary). Works across threads and asyncio tasks in one process: every in-flight
+call is a concurrent.futures.Future, which threads block on and tasks await via asyncio.wrap_future.
+"""
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    def __init__(self) -> None:
+        self._calls: dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def _join(self, key: str) -> tuple[Future, bool]:
+        """The key's in-flight future, and whether the caller just started it (and must run the call)."""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                return future, False
+            future = self._calls[key] = Future()
+            return future, True
+
+    def _finish(self, key: str, future: Future, result: Any = None, error: Optional[BaseException] = None) -> None:
+        with self._lock:
+            self._calls.pop(key, None)
+        if isinstance(error, Exception):
+            future.set_exception(error)
+        else:
+            # Result, or the leader was cancelled (client went away): waiters get the default instead
+            future.set_result(result)
+
+    def do(self, key: str, fn: Callable[[], T], default: Any = None) -> T:
+        """Run fn() for the first caller of key; concurrent callers block and get the same result."""
+        future, leader = self._join(key)
+        if not leader:
+            return future.result()
+        try:
+            result = fn()
+        except BaseException as e:
+            self._finish(key, future, default, e)
+            raise
+        self._finish(key, future, result)
+        return result
+
+    async def do_async(self, key: str, fn: Callable[[], Awaitable[T]], default: Any = None) -> T:
+        """do() for coroutines; waiting tasks (and threads) share the first caller's awaited result."""
+        future, leader = self._join(key)
+        if not leader:
+            # shield: a waiter being cancelled must not cancel the shared future
+            return await asyncio.shield(asyncio.wrap_future(future))
+        try:
+            result = await fn()
+        except BaseException as e:
+            self._finish(key, future, default, e)
+            raise
+        self._finish(key, future, result)
+        return result
@@ -7,19 +7,24 @@ import json
 import os
 from collections import Counter
 from contextlib import asynccontextmanager
-from datetime import datetime, timedelta, timezone
+from datetime import date, datetime, timedelta, timezone
 from typing import Any, Optional
 
 import jwt
 from fastapi import FastAPI, Header, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
 from sqlalchemy import create_engine, text
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import sessionmaker
 
-from config import ANALYTICS_DB_URL
-from llm import chat, is_available
+import llm_scheduler
+from config import ANALYTICS_DB_URL, LLM_CACHE_TTL_DAILY_SUMMARY
+from llm import aclose_clients, async_chat, is_available
 from db import init_db, ReflectionSummary
+from emotions import emotion_count_columns, top_emotions
+from metrics import render_metrics
 
 JWT_SECRET = os.getenv("JWT_SECRET", "your-256-bit-secret-for-jwt-signing-change-in-production")
 
@@ -31,6 +36,7 @@ Session = sessionmaker(bind=engine, autocommit=False, autoflush=False)
 async def lifespan(app: FastAPI):
     init_db()
     yield
+    await aclose_clients()
 
 
 app = FastAPI(title="Summary Service", version="1.0.0", lifespan=lifespan)
@@ -125,17 +131,16 @@ def get_theme_sentiment_buckets(session, user_id: str, start_dt: datetime, end_d
     """Return (low_themes, high_themes) for the date range. Low = score < -0.2, high = score > 0.2."""
     result = session.execute(
         text("""
-            WITH themed AS (
-                SELECT tr.entry_id, sr.score, jsonb_array_elements_text(tr.themes) AS theme
-                FROM theme_result tr
-                JOIN sentiment_result sr ON tr.entry_id = sr.entry_id AND tr.user_id = sr.user_id
-                WHERE tr.user_id = :uid AND tr.computed_at >= :start_dt AND tr.computed_at <= :end_dt
-            )
-            SELECT theme,
-                CASE WHEN score < -0.2 THEN 'low' WHEN score > 0.2 THEN 'high' ELSE NULL END AS bucket
-            FROM themed
+            SELECT t.name, b.bucket FROM (
+                SELECT DISTINCT et.theme_id, CASE WHEN sr.score < -0.2 THEN 'low' ELSE 'high' END AS bucket
+                FROM entry_theme et
+                JOIN sentiment_result sr ON sr.entry_id = et.entry_id
+                WHERE et.user_id = :uid AND et.day >= :start_day AND et.day <= :end_day
+                  AND (sr.score < -0.2 OR sr.score > 0.2)
+            ) b
+            JOIN theme t ON t.id = b.theme_id
         """),
-        {"uid": user_id, "start_dt": start_dt, "end_dt": end_dt},
+        {"uid": user_id, "start_day": start_dt.date(), "end_day": end_dt.date()},
     )
     rows = result.fetchall()
     low_set: set[str] = set()
@@ -151,22 +156,14 @@ def get_theme_sentiment_buckets(session, user_id: str, start_dt: datetime, end_d
 
 def get_top_emotions(session, user_id: str, start_dt: datetime, end_dt: datetime, limit: int = 5) -> list[str]:
     """Return most frequent emotions in the date range."""
-    result = session.execute(
-        text("""
-            SELECT emotions FROM sentiment_result
-            WHERE user_id = :uid AND computed_at >= :start_dt AND computed_at <= :end_dt
-              AND emotions IS NOT NULL
-              AND CASE WHEN jsonb_typeof(emotions) = 'array' THEN jsonb_array_length(emotions) > 0 ELSE false END
+    counts = session.execute(
+        text(f"""
+            SELECT {emotion_count_columns()} FROM sentiment_result
+            WHERE user_id = :uid AND computed_at >= :start_dt AND computed_at <= :end_dt AND emotion_mask <> 0
         """),
         {"uid": user_id, "start_dt": start_dt, "end_dt": end_dt},
-    )
-    counter: Counter[str] = Counter()
-    for (emotions_json,) in result.fetchall():
-        if emotions_json and isinstance(emotions_json, list):
-            for e in emotions_json:
-                if isinstance(e, str):
-                    counter[e] += 1
-    return [emotion for emotion, _ in counter.most_common(limit)]
+    ).fetchone()
+    return top_emotions(counts or [], limit)
 
 
 DAY_NAMES = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
@@ -193,15 +190,16 @@ def get_theme_counts_with_days(
     """(theme, count, list of day names) for recurring themes. Only themes with count >= 2."""
     result = session.execute(
         text("""
-            SELECT jsonb_array_elements_text(tr.themes) AS theme, DATE(tr.computed_at) AS d
-            FROM theme_result tr
-            WHERE tr.user_id = :uid AND tr.computed_at >= :start_dt AND tr.computed_at <= :end_dt
+            SELECT t.name, et.day
+            FROM entry_theme et
+            JOIN theme t ON t.id = et.theme_id
+            WHERE et.user_id = :uid AND et.day >= :start_day AND et.day <= :end_day
         """),
-        {"uid": user_id, "start_dt": start_dt, "end_dt": end_dt},
+        {"uid": user_id, "start_day": start_dt.date(), "end_day": end_dt.date()},
     )
-    theme_to_dates: dict[str, list[datetime]] = {}
+    theme_to_dates: dict[str, list[date]] = {}
     for theme, d in result.fetchall():
-        if not theme or not isinstance(d, datetime):
+        if not theme or not isinstance(d, date):
             continue
         t = _shorten_theme(theme.strip())
         if not t or len(t) > 40:
@@ -222,21 +220,21 @@ def get_gentle_connection(
     """One strong correlation: (theme, 'high'|'low') when theme appears mostly on high- or low-sentiment days."""
     result = session.execute(
         text("""
-            WITH themed AS (
-                SELECT tr.entry_id, sr.score, jsonb_array_elements_text(tr.themes) AS theme
-                FROM theme_result tr
-                JOIN sentiment_result sr ON tr.entry_id = sr.entry_id AND tr.user_id = sr.user_id
-                WHERE tr.user_id = :uid AND tr.computed_at >= :start_dt AND tr.computed_at <= :end_dt
+            WITH counts AS (
+                SELECT et.theme_id,
+                    COUNT(*) FILTER (WHERE sr.score > 0.2)::int AS high_days,
+                    COUNT(*) FILTER (WHERE sr.score < -0.2)::int AS low_days,
+                    COUNT(*)::int AS total
+                FROM entry_theme et
+                JOIN sentiment_result sr ON sr.entry_id = et.entry_id
+                WHERE et.user_id = :uid AND et.day >= :start_day AND et.day <= :end_day
+                GROUP BY et.theme_id
+                HAVING COUNT(*) >= 2
             )
-            SELECT theme,
-                SUM(CASE WHEN score > 0.2 THEN 1 ELSE 0 END)::int AS high_days,
-                SUM(CASE WHEN score < -0.2 THEN 1 ELSE 0 END)::int AS low_days,
-                COUNT(*)::int AS total
-            FROM themed
-            GROUP BY theme
-            HAVING COUNT(*) >= 2
+            SELECT t.name, c.high_days, c.low_days, c.total FROM counts c
+            JOIN theme t ON t.id = c.theme_id
         """),
-        {"uid": user_id, "start_dt": start_dt, "end_dt": end_dt},
+        {"uid": user_id, "start_day": start_dt.date(), "end_day": end_dt.date()},
     )
     for row in result.fetchall():
         theme, high_days, low_days, total = row[0], row[1] or 0, row[2] or 0, row[3] or 0
@@ -289,28 +287,26 @@ def get_theme_evolution(
 ) -> list[tuple[str, str]]:
     """(theme, 'early'|'late'|'steady') based on first half vs second half frequency."""
     mid = start_dt + (end_dt - start_dt) / 2
-    result1 = session.execute(
+    result = session.execute(
         text("""
-            SELECT jsonb_array_elements_text(themes) AS theme FROM theme_result
-            WHERE user_id = :uid AND computed_at >= :start_dt AND computed_at < :mid
+            SELECT t.name, c.first_half, c.second_half FROM (
+                SELECT theme_id,
+                    COUNT(*) FILTER (WHERE day < :mid_day)::int AS first_half,
+                    COUNT(*) FILTER (WHERE day >= :mid_day)::int AS second_half
+                FROM entry_theme
+                WHERE user_id = :uid AND day >= :start_day AND day <= :end_day
+                GROUP BY theme_id
+            ) c
+            JOIN theme t ON t.id = c.theme_id
         """),
-        {"uid": user_id, "start_dt": start_dt, "mid": mid},
+        {"uid": user_id, "start_day": start_dt.date(), "mid_day": mid.date(), "end_day": end_dt.date()},
     )
     first_half: Counter[str] = Counter()
-    for (t,) in result1.fetchall():
-        if t:
-            first_half[_shorten_theme(t.strip())] += 1
-    result2 = session.execute(
-        text("""
-            SELECT jsonb_array_elements_text(themes) AS theme FROM theme_result
-            WHERE user_id = :uid AND computed_at >= :mid AND computed_at <= :end_dt
-        """),
-        {"uid": user_id, "mid": mid, "end_dt": end_dt},
-    )
     second_half: Counter[str] = Counter()
-    for (t,) in result2.fetchall():
+    for t, a, b in result.fetchall():
         if t:
-            second_half[_shorten_theme(t.strip())] += 1
+            first_half[_shorten_theme(t.strip())] += a
+            second_half[_shorten_theme(t.strip())] += b
     out: list[tuple[str, str]] = []
     all_themes = set(first_half) | set(second_half)
     for theme in list(all_themes)[:12]:
@@ -328,7 +324,7 @@ def get_theme_evolution(
     return out[:5]
 
 
-def generate_summary_llm(
+async def generate_summary_llm(
     themes: list[str],
     sentiment_avg: float,
     period_label: str,
@@ -350,7 +346,7 @@ def generate_summary_llm(
         structure_parts.append(f"Frequent emotions: {', '.join(top_emotions[:5])}.")
     structure_str = " ".join(structure_parts)
     summary_timeout = float(os.getenv("SUMMARY_LLM_TIMEOUT", "90"))
-    return chat(
+    return await async_chat(
         messages=[
             {
                 "role": "system",
@@ -363,6 +359,9 @@ def generate_summary_llm(
         ],
         max_tokens=120,
         timeout=summary_timeout,
+        cache_site="summary_daily",
+        cache_ttl=LLM_CACHE_TTL_DAILY_SUMMARY,
+        workload=llm_scheduler.SUMMARY,
     )
 
 
@@ -681,40 +680,63 @@ def get_or_create_weekly_summary(
         session.close()
 
 
-def _generate_summary_for_period(
-    session,
+def _summary_inputs(user_id: str, start_dt: datetime, end_dt: datetime) -> dict[str, Any]:
+    """Sentiment average, themes and emotions for the period (blocking DB reads; run in the threadpool)."""
+    session = Session()
+    try:
+        result = session.execute(
+            text("""
+                SELECT AVG(score) FROM sentiment_result
+                WHERE user_id = :uid AND computed_at >= :start_dt AND computed_at <= :end_dt
+            """),
+            {"uid": user_id, "start_dt": start_dt, "end_dt": end_dt},
+        )
+        row = result.fetchone()
+        sentiment_avg = float(row[0]) if row and row[0] is not None else 0.0
+        result2 = session.execute(
+            text("""
+                SELECT t.name FROM (
+                    SELECT theme_id, COUNT(*) AS n
+                    FROM entry_theme
+                    WHERE user_id = :uid AND day >= :start_day AND day <= :end_day
+                    GROUP BY theme_id
+                    ORDER BY n DESC
+                    LIMIT 20
+                ) c
+                JOIN theme t ON t.id = c.theme_id
+                ORDER BY c.n DESC
+            """),
+            {"uid": user_id, "start_day": start_dt.date(), "end_day": end_dt.date()},
+        )
+        themes_raw = [r[0] for r in result2.fetchall()]
+        low_raw, high_raw = get_theme_sentiment_buckets(session, user_id, start_dt, end_dt)
+        top_emotions = get_top_emotions(session, user_id, start_dt, end_dt)
+    finally:
+        session.close()
+    return {
+        "themes": clean_themes_for_summary(themes_raw),
+        "sentiment_avg": sentiment_avg,
+        "low_themes": clean_themes_for_summary(low_raw),
+        "high_themes": clean_themes_for_summary(high_raw),
+        "top_emotions": top_emotions,
+    }
+
+
+async def _generate_summary_for_period(
     user_id: str,
     start_dt: datetime,
     end_dt: datetime,
     period_label: str,
     period_type: str,
 ) -> ReflectionSummary:
-    result = session.execute(
-        text("""
-            SELECT AVG(score) FROM sentiment_result
-            WHERE user_id = :uid AND computed_at >= :start_dt AND computed_at <= :end_dt
-        """),
-        {"uid": user_id, "start_dt": start_dt, "end_dt": end_dt},
-    )
-    row = result.fetchone()
-    sentiment_avg = float(row[0]) if row and row[0] is not None else 0.0
-    result2 = session.execute(
-        text("""
-            SELECT jsonb_array_elements_text(themes) AS theme
-            FROM theme_result
-            WHERE user_id = :uid AND computed_at >= :start_dt AND computed_at <= :end_dt
-        """),
-        {"uid": user_id, "start_dt": start_dt, "end_dt": end_dt},
-    )
-    themes_raw = list({r[0] for r in result2.fetchall()})[:20]
-    low_raw, high_raw = get_theme_sentiment_buckets(session, user_id, start_dt, end_dt)
-    top_emotions = get_top_emotions(session, user_id, start_dt, end_dt)
-    themes = clean_themes_for_summary(themes_raw)
-    low_themes = clean_themes_for_summary(low_raw)
-    high_themes = clean_themes_for_summary(high_raw)
+    """
+    Build the period's summary. DB reads run in the threadpool and no session is held while the
+    LLM call is awaited, so a slow model ties up neither a worker thread nor a DB connection.
+    """
+    inputs = await run_in_threadpool(_summary_inputs, user_id, start_dt, end_dt)
     summary_text = (
-        generate_summary_llm(themes, sentiment_avg, period_label, low_themes=low_themes, high_themes=high_themes, top_emotions=top_emotions)
-        or fallback_summary(themes, sentiment_avg, period_label, low_themes=low_themes, high_themes=high_themes, top_emotions=top_emotions)
+        await generate_summary_llm(period_label=period_label, **inputs)
+        or fallback_summary(period_label=period_label, **inputs)
     )
     return ReflectionSummary(
         user_id=user_id,
@@ -725,31 +747,17 @@ def _generate_summary_for_period(
     )
 
 
-@app.get("/api/v1/summaries/daily", response_model=SummaryResponse)
-def generate_daily_summary(
-    authorization: Optional[str] = Header(None),
-    x_user_id: Optional[str] = Header(None),
-):
-    """Generate an insightful reflection for today (entries from start of today UTC)."""
-    user_id = get_user_id(authorization, x_user_id)
+def _save_summary(summary: ReflectionSummary) -> SummaryResponse:
     session = Session()
     try:
-        end_dt = datetime.now(timezone.utc)
-        start_dt = end_dt.replace(hour=0, minute=0, second=0, microsecond=0)
-        summary = _generate_summary_for_period(
-            session, user_id, start_dt, end_dt, "today", "daily"
-        )
         session.add(summary)
         session.commit()
         return SummaryResponse(
             summary=summary.summary_text,
             period_start=summary.period_start.isoformat(),
             period_end=summary.period_end.isoformat(),
-            generated_at=summary.generated_at.isoformat() if summary.generated_at else end_dt.isoformat(),
+            generated_at=summary.generated_at.isoformat() if summary.generated_at else summary.period_end.isoformat(),
         )
-    except HTTPException:
-        session.rollback()
-        raise
     except Exception:
         session.rollback()
         raise
@@ -757,6 +765,19 @@ def generate_daily_summary(
         session.close()
 
 
+@app.get("/api/v1/summaries/daily", response_model=SummaryResponse)
+async def generate_daily_summary(
+    authorization: Optional[str] = Header(None),
+    x_user_id: Optional[str] = Header(None),
+):
+    """Generate an insightful reflection for today (entries from start of today UTC)."""
+    user_id = get_user_id(authorization, x_user_id)
+    end_dt = datetime.now(timezone.utc)
+    start_dt = end_dt.replace(hour=0, minute=0, second=0, microsecond=0)
+    summary = await _generate_summary_for_period(user_id, start_dt, end_dt, "today", "daily")
+    return await run_in_threadpool(_save_summary, summary)
+
+
 @app.get("/api/v1/summaries/monthly", response_model=SummaryResponse)
 def generate_monthly_summary(
     authorization: Optional[str] = Header(None),
@@ -802,6 +823,12 @@ def health():
     return {"status": "ok"}
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus text format (LLM response cache hits/misses per call site)."""
+    return render_metrics()
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=int(os.getenv("PORT", "8002")))
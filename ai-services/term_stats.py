@@ -0,0 +1,190 @@
+"""
+Incremental document frequencies for TF-IDF keyword themes (term_df, term_df_docs).
+
+The consumer counts each entry once, on its first write, into its user's scope and the global "*"
+scope, in the same transaction as the result rows. entry.updated events move the entry's terms from
+its previous content to the new one and entry.deleted events subtract them. The keyword theme path looks up the frequencies
+of an entry's terms and ranks words by TF-IDF (themes.extract_themes_tfidf), so words every entry
+contains ("today", "feel") lose to the ones that make this entry distinctive.
+
+Counts cover all words longer than two letters; stop words are filtered at scoring time, so a
+lexicon change does not invalidate the tables. Rebuild from the journal DB (consumer stopped):
+  python term_stats.py --rebuild
+"""
+import argparse
+import math
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Iterable, Optional
+
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from config import THEMES_USER_IDF_PRIOR_DOCS
+from db import Session as DBSession, TermDocumentCount, TermDocumentFrequency, content_hash, init_db
+from keywords import TokenizedDocument
+
+GLOBAL_SCOPE = "*"
+MAX_TERM_LENGTH = 64
+
+
+def document_terms(doc: TokenizedDocument) -> set[str]:
+    """Distinct words of an entry that count towards document frequency."""
+    return {t for t in doc.token_set if 2 < len(t) <= MAX_TERM_LENGTH}
+
+
+class DocumentFrequencyDelta:
+    """Accumulates per-scope document counts and term document frequencies for a batch of entries."""
+
+    def __init__(self) -> None:
+        self.df: Counter = Counter()
+        self.docs: Counter = Counter()
+
+    def add(self, user_id: str, terms: Iterable[str], sign: int = 1) -> None:
+        for scope in (user_id, GLOBAL_SCOPE):
+            self.docs[scope] += sign
+            for term in terms:
+                self.df[(scope, term)] += sign
+
+    def apply(self, session) -> None:
+        """Additive upserts (caller commits). Rows go in key order so concurrent writers lock alike."""
+        doc_rows = [{"scope": scope, "docs": n} for scope, n in sorted(self.docs.items()) if n]
+        if doc_rows:
+            stmt = pg_insert(TermDocumentCount).values(doc_rows)
+            session.execute(stmt.on_conflict_do_update(
+                index_elements=[TermDocumentCount.scope],
+                set_={"docs": TermDocumentCount.docs + stmt.excluded.docs},
+            ))
+        df_rows = [{"scope": scope, "term": term, "df": n} for (scope, term), n in sorted(self.df.items()) if n]
+        if df_rows:
+            stmt = pg_insert(TermDocumentFrequency).values(df_rows)
+            session.execute(stmt.on_conflict_do_update(
+                index_elements=[TermDocumentFrequency.scope, TermDocumentFrequency.term],
+                set_={"df": TermDocumentFrequency.df + stmt.excluded.df},
+            ))
+
+
+def _terms(content: Optional[str]) -> set[str]:
+    return document_terms(TokenizedDocument(content or ""))
+
+
+def apply_df_deltas(session, existing: dict, results: list[dict]) -> None:
+    """
+    Count entries written for the first time (not in `existing`) into the document frequencies. For an
+    edited entry (previous_content set) the previous terms are swapped for the new ones, but only when
+    the stored row was analyzed from that previous content, so a replayed update is not applied twice.
+    """
+    delta = DocumentFrequencyDelta()
+    for r in results:
+        old = existing.get(r["entry_id"])
+        if old is None:
+            delta.add(r["user_id"], _terms(r.get("content")))
+            continue
+        previous = r.get("previous_content")
+        if previous is None or content_hash(previous) == content_hash(r.get("content")):
+            continue
+        if old.get("content_hash") in (None, content_hash(previous)):
+            delta.add(old["user_id"], _terms(previous), sign=-1)
+            delta.add(r["user_id"], _terms(r.get("content")))
+    delta.apply(session)
+
+
+def remove_df_counts(session, existing: dict, deleted: list[dict]) -> None:
+    """
+    Uncount deleted entries that were counted (present in `existing`). Their terms are subtracted when
+    the event content is what the row was analyzed from; otherwise only the document count is.
+    """
+    delta = DocumentFrequencyDelta()
+    for r in deleted:
+        old = existing.get(r["entry_id"])
+        if old is None:
+            continue
+        known = old.get("content_hash") in (None, content_hash(r.get("content")))
+        delta.add(old["user_id"], _terms(r.get("content")) if known else (), sign=-1)
+    delta.apply(session)
+
+
+@dataclass
+class DocumentFrequencies:
+    """Frequencies of one entry's terms for its user and globally, enough to compute their idf."""
+
+    user_docs: int = 0
+    global_docs: int = 0
+    user_df: dict[str, int] = field(default_factory=dict)
+    global_df: dict[str, int] = field(default_factory=dict)
+
+    def idf(self, term: str) -> float:
+        """Smoothed idf; the user's own idf is blended in as they accumulate entries."""
+        global_idf = math.log((1 + self.global_docs) / (1 + self.global_df.get(term, 0))) + 1
+        if not self.user_docs:
+            return global_idf
+        user_idf = math.log((1 + self.user_docs) / (1 + self.user_df.get(term, 0))) + 1
+        weight = min(1.0, self.user_docs / max(THEMES_USER_IDF_PRIOR_DOCS, 1))
+        return weight * user_idf + (1 - weight) * global_idf
+
+
+def fetch_frequencies(user_id: str, terms: Iterable[str]) -> Optional[DocumentFrequencies]:
+    """One round trip for the entry's terms; None if the tables are unavailable (themes fall back to raw frequency)."""
+    terms = list(terms)
+    session = DBSession()
+    try:
+        stats = DocumentFrequencies()
+        for scope, docs in session.execute(
+            text("SELECT scope, docs FROM term_df_docs WHERE scope IN (:user_id, :all)"),
+            {"user_id": user_id, "all": GLOBAL_SCOPE},
+        ):
+            if scope == GLOBAL_SCOPE:
+                stats.global_docs = docs
+            else:
+                stats.user_docs = docs
+        if terms and stats.global_docs:
+            for scope, term, df in session.execute(
+                text("SELECT scope, term, df FROM term_df WHERE scope IN (:user_id, :all) AND term = ANY(:terms)"),
+                {"user_id": user_id, "all": GLOBAL_SCOPE, "terms": terms},
+            ):
+                (stats.global_df if scope == GLOBAL_SCOPE else stats.user_df)[term] = df
+        return stats
+    except Exception as e:
+        print(f"Term frequencies unavailable, using raw-frequency themes: {e}", flush=True)
+        return None
+    finally:
+        session.close()
+
+
+def rebuild(chunk_size: int = 1000) -> int:
+    """Recompute both tables from every journal entry. Returns the number of entries counted."""
+    from backfill import iter_db_chunks  # backfill imports the consumer, which imports this module
+
+    init_db()
+    session = DBSession()
+    total = 0
+    try:
+        session.execute(text("TRUNCATE term_df, term_df_docs"))
+        for events, _ in iter_db_chunks(chunk_size):
+            delta = DocumentFrequencyDelta()
+            for e in events:
+                delta.add(e["userId"], document_terms(TokenizedDocument(e.get("content") or "")))
+            delta.apply(session)
+            total += len(events)
+            print(f"{total} entries counted", flush=True)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+    return total
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Maintain the TF-IDF document frequency tables.")
+    parser.add_argument("--rebuild", action="store_true", help="recompute term_df / term_df_docs from the journal DB")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    args = parser.parse_args(argv)
+    if not args.rebuild:
+        parser.error("nothing to do (use --rebuild)")
+    print(f"Rebuilt document frequencies from {rebuild(args.chunk_size)} entries", flush=True)
+
+
+if __name__ == "__main__":
+    main()
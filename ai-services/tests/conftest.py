@@ -0,0 +1,22 @@
+import sys
+import threading
+import time
+from pathlib import Path
+
+# The service's modules are imported flat (as the consumer and the APIs run them)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def wait_until(predicate, timeout: float = 2.0) -> None:
+    """Poll predicate until it holds; fail the test after timeout seconds."""
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.005)
+
+
+def run_threads(n: int, target) -> list[threading.Thread]:
+    threads = [threading.Thread(target=target) for _ in range(n)]
+    for t in threads:
+        t.start()
+    return threads
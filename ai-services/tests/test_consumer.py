@@ -0,0 +1,29 @@
+from collections import deque
+from concurrent.futures import Future
+
+from consumer import _drop_revoked, _reenrichment_applies
+from db import content_hash
+
+P0, P1 = ("entries", 0), ("entries", 1)
+
+
+def test_revoked_partition_work_is_dropped():
+    owned, revoked = Future(), Future()
+    reenrich = Future()
+    in_flight = {owned: (P0, 1, "a"), revoked: (P1, 1, "b"), reenrich: (None, None, "c")}
+    busy = {"a": deque([(P0, 2, {})]), "b": deque([(P1, 2, {}), (P1, 3, {})]), "c": deque()}
+    unwritten = [(P0, 0, {"entry_id": "a"}), (P1, 0, {"entry_id": "b"}), (None, None, {"entry_id": "c"})]
+    stale = set()
+    kept = _drop_revoked({P1}, in_flight, busy, unwritten, stale)
+    assert stale == {revoked}
+    assert busy == {"a": deque([(P0, 2, {})]), "b": deque(), "c": deque()}
+    assert [r["entry_id"] for _, _, r in kept] == ["a", "c"]
+
+
+def test_reenrichment_applies_only_to_the_queued_provisional_row():
+    result = {"content": "queued text"}
+    queued = content_hash("queued text")
+    assert _reenrichment_applies({"provisional": True, "content_hash": queued}, result)
+    assert not _reenrichment_applies(None, result)  # deleted meanwhile
+    assert not _reenrichment_applies({"provisional": False, "content_hash": queued}, result)  # final result written
+    assert not _reenrichment_applies({"provisional": True, "content_hash": content_hash("edited")}, result)
@@ -0,0 +1,302 @@
+import asyncio
+import itertools
+import threading
+
+import pytest
+
+from conftest import run_threads, wait_until
+from llm_scheduler import (
+    BACKGROUND, INTERACTIVE, SUMMARY, WORKLOADS, LLMScheduler, SchedulerRejected, WorkloadLimits, admit,
+)
+
+
+def make_scheduler(
+    max_concurrency: int = 1, queue_size: int = 8, queue_timeout: float = 2.0, total: int = 0, **kwargs,
+) -> LLMScheduler:
+    """max_concurrency per class; total (all classes) defaults to enough for every class at once."""
+    limits = {w: WorkloadLimits(max_concurrency, queue_size, queue_timeout) for w in WORKLOADS}
+    return LLMScheduler(max_concurrency=total or max_concurrency * len(WORKLOADS), limits=limits, **kwargs)
+
+
+def queued(scheduler: LLMScheduler, workload: str = BACKGROUND) -> int:
+    return scheduler.stats()[workload]["queued"]
+
+
+def active(scheduler: LLMScheduler, workload: str = BACKGROUND) -> int:
+    return scheduler.stats()[workload]["active"]
+
+
+def test_slots_are_granted_up_to_the_class_limit():
+    scheduler = make_scheduler(max_concurrency=2)
+    scheduler.acquire(BACKGROUND)
+    scheduler.acquire(BACKGROUND)
+    assert active(scheduler) == 2
+    assert queued(scheduler) == 0
+    scheduler.release(BACKGROUND)
+    assert active(scheduler) == 1
+
+
+def test_queued_calls_are_served_in_arrival_order():
+    scheduler = make_scheduler()
+    scheduler.acquire(BACKGROUND)
+    order = []
+
+    def call(name):
+        with scheduler.slot(BACKGROUND):
+            order.append(name)
+
+    threads = []
+    for i, name in enumerate("abc"):
+        threads.append(threading.Thread(target=call, args=(name,)))
+        threads[-1].start()
+        wait_until(lambda: queued(scheduler) == i + 1)
+    scheduler.release(BACKGROUND)
+    for t in threads:
+        t.join(2)
+    assert order == ["a", "b", "c"]
+    assert scheduler.stats()[BACKGROUND]["admitted"] == 4
+    assert active(scheduler) == 0
+
+
+def test_classes_have_separate_slots():
+    scheduler = make_scheduler(queue_timeout=0.05)
+    scheduler.acquire(BACKGROUND)
+    with scheduler.slot(INTERACTIVE) as waited:
+        assert waited < 0.05
+        assert active(scheduler, INTERACTIVE) == 1
+    with pytest.raises(SchedulerRejected):
+        scheduler.acquire(BACKGROUND)
+
+
+def test_full_queue_rejects():
+    scheduler = make_scheduler(queue_size=1)
+    scheduler.acquire(BACKGROUND)
+
+    def call():
+        with scheduler.slot(BACKGROUND):
+            pass
+
+    waiter = threading.Thread(target=call)
+    waiter.start()
+    wait_until(lambda: queued(scheduler) == 1)
+    with pytest.raises(SchedulerRejected) as rejected:
+        scheduler.acquire(BACKGROUND)
+    assert (rejected.value.workload, rejected.value.reason) == (BACKGROUND, "full")
+    scheduler.release(BACKGROUND)
+    waiter.join(2)
+    assert scheduler.stats()[BACKGROUND]["rejected_full"] == 1
+    assert active(scheduler) == 0
+
+
+def test_expired_wait_rejects_and_leaves_the_queue():
+    scheduler = make_scheduler(queue_timeout=0.05)
+    scheduler.acquire(BACKGROUND)
+    with pytest.raises(SchedulerRejected) as rejected:
+        scheduler.acquire(BACKGROUND)
+    assert rejected.value.reason == "timeout"
+    assert queued(scheduler) == 0
+    assert scheduler.stats()[BACKGROUND]["rejected_timeout"] == 1
+    scheduler.release(BACKGROUND)
+    scheduler.acquire(BACKGROUND)  # the abandoned place was not handed the freed slot
+    assert active(scheduler) == 1
+
+
+def test_unknown_workload_is_an_error():
+    with pytest.raises(ValueError):
+        make_scheduler().acquire("batch")
+
+
+def test_on_change_reports_queue_and_active_counts():
+    changes = []
+    scheduler = make_scheduler(queue_timeout=0.05, on_change=lambda *change: changes.append(change))
+    scheduler.acquire(BACKGROUND)
+    with pytest.raises(SchedulerRejected):
+        scheduler.acquire(BACKGROUND)
+    scheduler.release(BACKGROUND)
+    assert changes == [(BACKGROUND, 0, 1), (BACKGROUND, 1, 1), (BACKGROUND, 0, 1), (BACKGROUND, 0, 0)]
+
+
+def test_async_waiter_is_granted_a_released_slot():
+    async def main():
+        scheduler = make_scheduler()
+        scheduler.acquire(BACKGROUND)
+        task = asyncio.create_task(scheduler.acquire_async(BACKGROUND))
+        await asyncio.sleep(0.01)
+        assert queued(scheduler) == 1
+        scheduler.release(BACKGROUND)
+        await asyncio.wait_for(task, 1)
+        return scheduler
+
+    scheduler = asyncio.run(main())
+    assert active(scheduler) == 1
+    assert queued(scheduler) == 0
+
+
+def test_async_wait_expires():
+    async def main():
+        scheduler = make_scheduler(queue_timeout=0.05)
+        scheduler.acquire(BACKGROUND)
+        with pytest.raises(SchedulerRejected) as rejected:
+            await scheduler.acquire_async(BACKGROUND)
+        return scheduler, rejected.value.reason
+
+    scheduler, reason = asyncio.run(main())
+    assert reason == "timeout"
+    assert queued(scheduler) == 0
+
+
+def test_async_cancel_while_queued_leaves_the_queue():
+    async def main():
+        scheduler = make_scheduler()
+        scheduler.acquire(BACKGROUND)
+        task = asyncio.create_task(scheduler.acquire_async(BACKGROUND))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return scheduler
+
+    scheduler = asyncio.run(main())
+    assert queued(scheduler) == 0
+    assert active(scheduler) == 1
+    assert scheduler.stats()[BACKGROUND]["rejected_timeout"] == 0
+
+
+def test_async_cancel_after_grant_releases_the_slot():
+    async def main():
+        scheduler = make_scheduler()
+        scheduler.acquire(BACKGROUND)
+        task = asyncio.create_task(scheduler.acquire_async(BACKGROUND))
+        await asyncio.sleep(0.01)
+        # The slot is handed to the queued task, which is cancelled before it gets to run
+        scheduler.release(BACKGROUND)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return scheduler
+
+    scheduler = asyncio.run(main())
+    assert active(scheduler) == 0
+    assert queued(scheduler) == 0
+    scheduler.acquire(BACKGROUND)
+
+
+def test_async_slot_releases_on_exit():
+    async def main():
+        scheduler = make_scheduler()
+        with pytest.raises(RuntimeError):
+            async with scheduler.slot_async(INTERACTIVE):
+                assert active(scheduler, INTERACTIVE) == 1
+                raise RuntimeError
+        return scheduler
+
+    assert active(asyncio.run(main()), INTERACTIVE) == 0
+
+
+def test_interactive_calls_are_served_before_background_ones():
+    scheduler = make_scheduler(total=1)
+    scheduler.acquire(BACKGROUND)
+    background = run_threads(1, lambda: scheduler.acquire(BACKGROUND))
+    wait_until(lambda: queued(scheduler) == 1)
+    interactive = run_threads(1, lambda: scheduler.acquire(INTERACTIVE))
+    wait_until(lambda: queued(scheduler, INTERACTIVE) == 1)
+    scheduler.release(BACKGROUND)
+    interactive[0].join(2)
+    assert active(scheduler, INTERACTIVE) == 1
+    assert queued(scheduler) == 1
+    scheduler.release(INTERACTIVE)
+    background[0].join(2)
+    assert active(scheduler) == 1
+
+
+def test_total_limit_spans_classes():
+    scheduler = make_scheduler(max_concurrency=2, total=2, queue_timeout=0.05)
+    scheduler.acquire(INTERACTIVE)
+    scheduler.acquire(SUMMARY)
+    with pytest.raises(SchedulerRejected):
+        scheduler.acquire(BACKGROUND)
+
+
+def test_admit_starts_waiting_rows_by_priority_within_the_limits():
+    limits = {w: WorkloadLimits(2, 8, 1) for w in WORKLOADS}
+    rows = [(5, INTERACTIVE, True), (6, INTERACTIVE, True), (7, INTERACTIVE, False), (2, SUMMARY, False),
+            (1, BACKGROUND, False), (3, BACKGROUND, False)]
+    # interactive 7 is over its class limit, so the next classes get the free slots in order
+    assert admit(rows, 4, limits) == [2, 1]
+    assert admit(rows, 2, limits) == []
+
+
+class MemorySlotTable:
+    """The llm_slot table in memory, shared by schedulers that stand in for separate processes."""
+
+    lease_seconds = 30.0
+
+    def __init__(self) -> None:
+        self.rows: dict[int, list] = {}  # id -> [owner, workload, active]
+        self.down = False
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def sync(self, owner, released, waiting, admit_rows):
+        if self.down:
+            raise ConnectionError("database unreachable")
+        with self._lock:
+            for row_id in released:
+                self.rows.pop(row_id, None)
+            added = [next(self._ids) for _ in waiting]
+            self.rows.update((row_id, [owner, w, False]) for row_id, w in zip(added, waiting))
+            order = sorted(self.rows, key=lambda i: (WORKLOADS.index(self.rows[i][1]), i))
+            for row_id in admit_rows([(i, self.rows[i][1], self.rows[i][2]) for i in order]):
+                self.rows[row_id][2] = True
+            return added, {i for i, (o, _, a) in self.rows.items() if o == owner and a}
+
+
+@pytest.fixture
+def processes():
+    """make(**kwargs) -> a scheduler admitting through one shared MemorySlotTable."""
+    table = MemorySlotTable()
+    schedulers = []
+
+    def make(**kwargs):
+        schedulers.append(make_scheduler(table=table, poll_seconds=0.005, **kwargs))
+        return schedulers[-1]
+
+    make.table = table
+    yield make
+    for scheduler in schedulers:
+        scheduler.close()
+
+
+def test_table_shares_the_total_limit_between_processes(processes):
+    a, b = processes(total=1, queue_timeout=0.1), processes(total=1, queue_timeout=0.1)
+    a.acquire(BACKGROUND)
+    with pytest.raises(SchedulerRejected):
+        b.acquire(INTERACTIVE)
+    wait_until(lambda: len(processes.table.rows) == 1)  # the abandoned wait gave up its row
+    a.release(BACKGROUND)
+    b.acquire(INTERACTIVE)
+    assert active(b, INTERACTIVE) == 1
+
+
+def test_table_serves_interactive_calls_of_any_process_first(processes):
+    a, b = processes(total=1), processes(total=1)
+    a.acquire(BACKGROUND)
+    background = run_threads(1, lambda: a.acquire(BACKGROUND))
+    wait_until(lambda: len(processes.table.rows) == 2)
+    interactive = run_threads(1, lambda: b.acquire(INTERACTIVE))
+    wait_until(lambda: len(processes.table.rows) == 3)
+    a.release(BACKGROUND)
+    interactive[0].join(2)
+    assert active(b, INTERACTIVE) == 1
+    assert queued(a) == 1
+    b.release(INTERACTIVE)
+    background[0].join(2)
+    assert active(a) == 1
+
+
+def test_unreachable_table_falls_back_to_local_limits(processes):
+    scheduler = processes(max_concurrency=2, queue_timeout=0.5)
+    processes.table.down = True
+    scheduler.acquire(BACKGROUND)
+    scheduler.acquire(BACKGROUND)
+    assert active(scheduler) == 2
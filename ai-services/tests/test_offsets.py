@@ -0,0 +1,68 @@
+from offsets import OffsetTracker
+
+P0, P1 = ("entries", 0), ("entries", 1)
+
+
+def tracker_with(tp, offsets) -> OffsetTracker:
+    tracker = OffsetTracker()
+    for offset in offsets:
+        tracker.add(tp, offset)
+    return tracker
+
+
+def test_in_order_completion_advances_the_position():
+    tracker = tracker_with(P0, [10, 11])
+    tracker.complete(P0, 10)
+    assert tracker.committable() == {P0: 11}
+    tracker.complete(P0, 11)
+    assert tracker.committable() == {P0: 12}
+    assert tracker.in_flight() == 0
+
+
+def test_out_of_order_completion_waits_for_the_gap():
+    tracker = tracker_with(P0, [0, 1, 2, 3])
+    tracker.complete(P0, 2)
+    tracker.complete(P0, 1)
+    assert tracker.committable() == {}
+    assert tracker.in_flight() == 4
+    tracker.complete(P0, 0)
+    assert tracker.committable() == {P0: 3}
+    assert tracker.in_flight() == 1
+    tracker.complete(P0, 3)
+    assert tracker.committable() == {P0: 4}
+
+
+def test_partitions_are_tracked_separately():
+    tracker = tracker_with(P0, [5, 6])
+    tracker.add(P1, 7)
+    tracker.complete(P1, 7)
+    tracker.complete(P0, 6)
+    assert tracker.committable() == {P1: 8}
+
+
+def test_committed_positions_are_not_reported_again():
+    tracker = tracker_with(P0, [0, 1])
+    tracker.complete(P0, 0)
+    tracker.mark_committed(tracker.committable())
+    assert tracker.committable() == {}
+    tracker.complete(P0, 1)
+    assert tracker.committable() == {P0: 2}
+
+
+def test_revoked_partition_ignores_late_completions():
+    tracker = tracker_with(P0, [0, 1])
+    tracker.add(P1, 0)
+    tracker.complete(P0, 0)
+    tracker.revoke([P0])
+    tracker.complete(P0, 1)
+    assert tracker.committable() == {}
+    assert tracker.in_flight() == 1
+
+
+def test_reassigned_partition_starts_fresh():
+    tracker = tracker_with(P0, [0, 1])
+    tracker.complete(P0, 1)
+    tracker.revoke([P0])
+    tracker.add(P0, 1)
+    tracker.complete(P0, 1)
+    assert tracker.committable() == {P0: 2}
@@ -0,0 +1,185 @@
+import asyncio
+import threading
+
+import pytest
+
+from conftest import run_threads, wait_until
+from singleflight import SingleFlight
+
+
+class CountingFlight(SingleFlight):
+    """SingleFlight that counts callers that joined a key, so tests can wait for all of them."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.joined = 0
+        self._count_lock = threading.Lock()
+
+    def _join(self, key):
+        joined = super()._join(key)
+        with self._count_lock:
+            self.joined += 1
+        return joined
+
+
+def test_concurrent_threads_share_one_call():
+    flight = CountingFlight()
+    release = threading.Event()
+    calls, results = [], []
+
+    def fn():
+        calls.append(1)
+        release.wait(2)
+        return "reply"
+
+    threads = run_threads(5, lambda: results.append(flight.do("k", fn)))
+    wait_until(lambda: flight.joined == 5)
+    release.set()
+    for t in threads:
+        t.join(2)
+    assert calls == [1]
+    assert results == ["reply"] * 5
+
+
+def test_leader_exception_reaches_waiting_threads():
+    flight = CountingFlight()
+    release = threading.Event()
+    errors = []
+
+    def fn():
+        release.wait(2)
+        raise ValueError("upstream failed")
+
+    def call():
+        try:
+            flight.do("k", fn)
+        except ValueError as e:
+            errors.append(str(e))
+
+    threads = run_threads(3, call)
+    wait_until(lambda: flight.joined == 3)
+    release.set()
+    for t in threads:
+        t.join(2)
+    assert errors == ["upstream failed"] * 3
+
+
+def test_key_is_released_after_the_call():
+    flight = SingleFlight()
+    assert flight.do("k", lambda: 1) == 1
+    assert flight.do("k", lambda: 2) == 2
+    with pytest.raises(RuntimeError):
+        flight.do("k", lambda: (_ for _ in ()).throw(RuntimeError()))
+    assert flight.do("k", lambda: 3) == 3
+
+
+def test_different_keys_do_not_coalesce():
+    flight = SingleFlight()
+    assert [flight.do(k, lambda k=k: k.upper()) for k in ("a", "b")] == ["A", "B"]
+
+
+def test_concurrent_tasks_share_one_call():
+    async def main():
+        flight = SingleFlight()
+        release = asyncio.Event()
+        calls = []
+
+        async def fn():
+            calls.append(1)
+            await release.wait()
+            return "reply"
+
+        tasks = [asyncio.create_task(flight.do_async("k", fn)) for _ in range(5)]
+        await asyncio.sleep(0)
+        release.set()
+        return calls, await asyncio.gather(*tasks)
+
+    calls, results = asyncio.run(main())
+    assert calls == [1]
+    assert results == ["reply"] * 5
+
+
+def test_leader_exception_reaches_waiting_tasks():
+    async def main():
+        flight = SingleFlight()
+        release = asyncio.Event()
+
+        async def fn():
+            await release.wait()
+            raise ValueError("upstream failed")
+
+        tasks = [asyncio.create_task(flight.do_async("k", fn)) for _ in range(3)]
+        await asyncio.sleep(0)
+        release.set()
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(r, ValueError) for r in results)
+
+
+def test_cancelled_leader_gives_waiters_the_default():
+    async def main():
+        flight = SingleFlight()
+
+        async def fn():
+            await asyncio.sleep(10)
+            return "reply"
+
+        leader = asyncio.create_task(flight.do_async("k", fn, default="fallback"))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(flight.do_async("k", fn, default="fallback"))
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await waiter
+
+    assert asyncio.run(main()) == "fallback"
+
+
+def test_cancelled_waiter_does_not_cancel_the_shared_call():
+    async def main():
+        flight = SingleFlight()
+        release = asyncio.Event()
+
+        async def fn():
+            await release.wait()
+            return "reply"
+
+        leader = asyncio.create_task(flight.do_async("k", fn))
+        await asyncio.sleep(0)
+        quitter = asyncio.create_task(flight.do_async("k", fn))
+        other = asyncio.create_task(flight.do_async("k", fn))
+        await asyncio.sleep(0)
+        quitter.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        return await leader, await other, quitter.cancelled()
+
+    assert asyncio.run(main()) == ("reply", "reply", True)
+
+
+def test_thread_waits_for_an_async_leader():
+    flight = CountingFlight()
+    results = []
+
+    async def main():
+        release = asyncio.Event()
+
+        async def fn():
+            await release.wait()
+            return "reply"
+
+        leader = asyncio.create_task(flight.do_async("k", fn))
+        await asyncio.sleep(0)
+        thread = threading.Thread(target=lambda: results.append(flight.do("k", lambda: "own call")))
+        thread.start()
+        while flight.joined < 2:
+            await asyncio.sleep(0.005)
+        release.set()
+        reply = await leader
+        await asyncio.get_running_loop().run_in_executor(None, thread.join, 2)
+        return reply
+
+    assert asyncio.run(main()) == "reply"
+    assert results == ["reply"]
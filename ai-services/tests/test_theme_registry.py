@@ -0,0 +1,35 @@
+import pytest
+
+from theme_registry import _singular, normalize_theme
+
+
+@pytest.mark.parametrize("word", [
+    "christmas", "bias", "diabetes", "herpes", "economics", "politics", "athletics", "species", "series",
+    "stress", "crisis", "tennis", "campus", "status", "chaos", "news", "always",
+])
+def test_words_that_are_not_plurals_are_kept(word):
+    assert _singular(word) == word
+
+
+@pytest.mark.parametrize("plural, singular", [
+    ("friends", "friend"), ("relationships", "relationship"), ("photos", "photo"),
+    ("anxieties", "anxiety"), ("movies", "movie"),
+    ("buses", "bus"), ("potatoes", "potato"),
+    ("classes", "class"), ("stresses", "stress"), ("wishes", "wish"), ("taxes", "tax"),
+    ("headaches", "headache"), ("games", "game"), ("ideas", "idea"), ("issues", "issue"),
+])
+def test_plurals_are_singularized(plural, singular):
+    assert _singular(plural) == singular
+
+
+def test_short_words_are_kept():
+    assert _singular("gas") == "gas"
+    assert _singular("bus") == "bus"
+
+
+@pytest.mark.parametrize("raw, key", [
+    ("Work stress", "work stress"), ("work-stress", "work stress"), ("job", "work"),
+    ("Exercises", "exercise"), ("friends", "friendship"), ("Christmas", "christmas"), ("the economics", "economics"),
+])
+def test_normalize_theme(raw, key):
+    assert normalize_theme(raw) == key
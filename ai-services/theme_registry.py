@@ -0,0 +1,224 @@
+"""
+Canonical theme registry (theme, entry_theme).
+
+Free-text theme tags from the LLM or the keyword path are normalized at write time: lowercased,
+punctuation dropped, leading/trailing stop words trimmed, the last word singularized and aliases
+from the lexicon (theme_aliases) merged, so "Work stress", "work-stress" and "job" land on stable
+integer ids. The consumer writes one entry_theme row per (entry, theme) in the same transaction as
+the result rows, so Insights and summaries aggregate with integer GROUP BYs over indexed rows
+instead of unnesting theme_result JSON. theme_result keeps the tags as analyzed.
+
+Fill the tables for existing entries (and after changing theme_aliases or seeding) with the
+consumer stopped:
+  python theme_registry.py --rebuild
+"""
+import argparse
+import threading
+from datetime import date
+from typing import Iterable, Optional
+
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+import lexicon
+from db import EntryTheme, Session as DBSession, Theme, init_db
+from keywords import tokenize
+
+MAX_THEME_LENGTH = 64
+# Words ending in "s" that are not plurals (the -as/-es/-us/-ss/-ics endings are already left alone)
+_SINGULAR_WORDS = frozenset({
+    "news", "series", "species", "always", "rabies", "scabies", "chaos", "ethos", "cosmos", "tennis",
+})
+# -ies plurals of words ending in -ie (the rule is -ies -> -y: "anxieties" -> "anxiety")
+_IE_PLURALS = frozenset({
+    "movies", "cookies", "calories", "selfies", "hoodies", "goodies", "brownies", "smoothies", "aunties",
+    "zombies", "rookies", "newbies", "veggies", "freebies", "sweeties", "boogies", "prairies", "walkies",
+})
+# Plurals that drop -es ("buses" -> "bus", "potatoes" -> "potato")
+_ES_PLURALS = frozenset({
+    "buses", "gases", "lenses", "bonuses", "viruses", "campuses", "circuses", "statuses", "atlases",
+    "canvases", "choruses", "geniuses", "potatoes", "tomatoes", "heroes", "echoes", "mosquitoes",
+})
+# Plurals that drop only the -s where the rules would leave the word alone (a final "s" after a, e or u
+# is more often part of the word: "christmas", "diabetes") or drop -es ("headaches" -> "headache")
+_S_PLURALS = frozenset({
+    "aches", "headaches", "heartaches", "backaches", "stomachaches", "toothaches", "earaches",
+    "niches", "caches", "cliches", "quiches", "avalanches", "moustaches", "mustaches", "psyches",
+    "ideas", "areas", "dramas", "traumas", "dilemmas", "agendas", "eras", "pizzas",
+    "games", "dates", "notes", "issues", "values", "colleagues", "chores", "places", "houses", "courses",
+    "times", "minutes", "changes", "challenges", "deadlines", "exercises", "expenses", "mistakes",
+    "routines", "schedules", "struggles", "pressures", "rules", "roles", "lines", "phones", "bikes",
+    "nurses", "wages", "prices", "choices", "voices", "races", "sales", "stores", "homes", "trees",
+})
+_ids: dict[str, int] = {}
+_ids_lock = threading.Lock()
+
+
+def _singular(word: str) -> str:
+    """
+    Singular of a theme's last word. Irregular cases come from the tables above; otherwise the word is
+    kept as is unless it is clearly a plural, since a made-up stem ("christma") is shown to users.
+    """
+    if len(word) <= 3 or word in _SINGULAR_WORDS:
+        return word
+    if word in _ES_PLURALS:
+        return word[:-2]
+    if word in _S_PLURALS:
+        return word[:-1]
+    if word.endswith("ies") and len(word) > 4:
+        return word[:-1] if word in _IE_PLURALS else word[:-3] + "y"
+    if word.endswith(("sses", "shes", "ches", "xes")):
+        return word[:-2]
+    if word.endswith(("as", "es", "us", "ss", "is", "ics")):
+        return word
+    return word[:-1] if word.endswith("s") else word
+
+
+def normalize_theme(raw: str, lex: Optional[lexicon.Lexicon] = None) -> Optional[str]:
+    """Canonical key for a theme tag, or None when nothing meaningful is left."""
+    lex = lex or lexicon.current()
+    words = tokenize(raw) if isinstance(raw, str) else []
+    key = " ".join(words)
+    if key in lex.theme_aliases:
+        return lex.theme_aliases[key]
+    while words and words[0] in lex.stop_words:
+        words.pop(0)
+    while words and words[-1] in lex.stop_words:
+        words.pop()
+    if not words:
+        return None
+    key = " ".join(words)
+    if key not in lex.theme_aliases:
+        words[-1] = _singular(words[-1])
+        key = " ".join(words)
+    key = lex.theme_aliases.get(key, key)
+    return key if 2 < len(key) <= MAX_THEME_LENGTH else None
+
+
+def canonical_themes(raw: Iterable[str], lex: Optional[lexicon.Lexicon] = None) -> list[str]:
+    """Distinct canonical keys of an entry's tags, in tag order."""
+    lex = lex or lexicon.current()
+    keys = (normalize_theme(t, lex) for t in raw or [])
+    return list(dict.fromkeys(k for k in keys if k))
+
+
+def resolve_ids(session, names: Iterable[str]) -> dict[str, int]:
+    """
+    Map canonical keys to theme ids, inserting new themes (caller commits). Ids of committed themes
+    are cached per process; ids inserted by this transaction are not, as it may still roll back.
+    """
+    names = set(names)
+    ids = {n: _ids[n] for n in names if n in _ids}
+    missing = sorted(names - ids.keys())
+    if not missing:
+        return ids
+    # Key order so concurrent writers inserting the same new themes lock alike
+    stmt = pg_insert(Theme).values([{"name": n} for n in missing]).on_conflict_do_nothing(index_elements=[Theme.name])
+    inserted = dict(session.execute(stmt.returning(Theme.name, Theme.id)).all())
+    ids.update(inserted)
+    existing = [n for n in missing if n not in inserted]
+    if existing:
+        found = dict(session.execute(
+            text("SELECT name, id FROM theme WHERE name = ANY(:names)"), {"names": existing},
+        ).all())
+        ids.update(found)
+        with _ids_lock:
+            _ids.update(found)
+    return ids
+
+
+def assign_theme_ids(session, results: list[dict]) -> list[dict]:
+    """Copies of the result dicts with theme_ids (the entry's canonical theme ids, in tag order)."""
+    lex = lexicon.current()
+    keys = [canonical_themes(r.get("themes"), lex) for r in results]
+    ids = resolve_ids(session, {k for entry_keys in keys for k in entry_keys})
+    return [{**r, "theme_ids": [ids[k] for k in entry_keys]} for r, entry_keys in zip(results, keys)]
+
+
+def _insert_entry_themes(session, results: list[dict], days: dict) -> None:
+    rows = sorted(
+        (
+            {"entry_id": r["entry_id"], "theme_id": theme_id, "user_id": r["user_id"], "day": days[r["entry_id"]]}
+            for r in results
+            for theme_id in r["theme_ids"]
+        ),
+        key=lambda row: (str(row["entry_id"]), row["theme_id"]),
+    )
+    if rows:
+        session.execute(pg_insert(EntryTheme).values(rows).on_conflict_do_nothing())
+
+
+def replace_entry_themes(session, existing: dict, results: list[dict], today: Optional[date] = None) -> None:
+    """
+    Rewrite entry_theme for entries whose themes changed (caller commits). Rows use the same day as
+    the rollups: re-analyzed entries keep their original day, new entries count on `today`.
+    """
+    changed = [
+        r for r in results
+        if r["entry_id"] not in existing or sorted(existing[r["entry_id"]]["theme_ids"]) != sorted(r["theme_ids"])
+    ]
+    stale = [r["entry_id"] for r in changed if r["entry_id"] in existing]
+    if stale:
+        session.execute(text("DELETE FROM entry_theme WHERE entry_id = ANY(:ids)"), {"ids": stale})
+    days = {r["entry_id"]: existing[r["entry_id"]]["day"] if r["entry_id"] in existing else today for r in changed}
+    _insert_entry_themes(session, changed, days)
+
+
+def rebuild(chunk_size: int = 1000) -> int:
+    """
+    Re-derive entry_theme and user_daily_theme from theme_result with the current lexicon.
+    Existing theme ids are kept. Returns the number of entries mapped.
+    """
+    init_db()
+    session = DBSession()
+    total = 0
+    last_id = None
+    try:
+        session.execute(text("TRUNCATE entry_theme, user_daily_theme"))
+        while True:
+            rows = session.execute(
+                text(f"""
+                    SELECT tr.entry_id, tr.user_id, tr.themes, DATE(COALESCE(sr.computed_at, tr.computed_at))
+                    FROM theme_result tr
+                    LEFT JOIN sentiment_result sr ON sr.entry_id = tr.entry_id
+                    {"WHERE tr.entry_id > :last_id" if last_id else ""}
+                    ORDER BY tr.entry_id
+                    LIMIT :limit
+                """),
+                {"last_id": last_id, "limit": chunk_size},
+            ).all()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            results = assign_theme_ids(session, [
+                {"entry_id": r[0], "user_id": r[1], "themes": r[2] if isinstance(r[2], list) else []}
+                for r in rows
+            ])
+            _insert_entry_themes(session, results, {r[0]: r[3] for r in rows})
+            total += len(rows)
+            print(f"{total} entries mapped", flush=True)
+        session.execute(text("""
+            INSERT INTO user_daily_theme (user_id, day, theme_id, count)
+            SELECT user_id, day, theme_id, COUNT(*) FROM entry_theme GROUP BY user_id, day, theme_id
+        """))
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+    return total
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Maintain the canonical theme registry.")
+    parser.add_argument("--rebuild", action="store_true", help="re-derive entry_theme / user_daily_theme from theme_result")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    args = parser.parse_args(argv)
+    if not args.rebuild:
+        parser.error("nothing to do (use --rebuild)")
+    print(f"Rebuilt entry themes for {rebuild(args.chunk_size)} entries", flush=True)
+
+
+if __name__ == "__main__":
+    main()
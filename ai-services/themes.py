@@ -1,18 +1,20 @@
-"""Theme extraction: simple keyword extraction (meaningful words). Optional OpenAI."""
-import re
+"""
+Theme extraction: simple keyword extraction (meaningful words). Optional OpenAI.
+Stop words come from the lexicon file (lexicon.py). With document frequencies from term_stats.py
+the offline path ranks words by TF-IDF instead of raw frequency.
+"""
+import math
 from collections import Counter
-from llm import get_client, get_model, is_available
-
-STOP = {
-    "the", "a", "an", "and", "or", "but", "in", "on", "at", "to", "for", "of",
-    "with", "by", "from", "as", "is", "was", "are", "were", "been", "be", "have",
-    "has", "had", "do", "does", "did", "will", "would", "could", "should", "may",
-    "might", "must", "can", "this", "that", "these", "those", "i", "you", "he",
-    "she", "it", "we", "they", "my", "your", "his", "her", "its", "our", "their",
-    "me", "him", "them", "what", "which", "who", "when", "where", "why", "how",
-    "all", "each", "every", "both", "few", "more", "most", "other", "some",
-    "than", "too", "very", "just", "so", "if", "then", "than", "into", "out",
-}
+from typing import TYPE_CHECKING, Optional
+
+import chunking
+import lexicon
+from config import THEMES_TFIDF_MIN_DOCS
+from keywords import TokenizedDocument
+from llm import chat, is_available
+
+if TYPE_CHECKING:
+    from term_stats import DocumentFrequencies
 
 # Reject LLM output that looks like prose or instructions instead of short tags
 LLM_JUNK_PHRASES = (
@@ -22,51 +24,79 @@ LLM_JUNK_PHRASES = (
 
 
 def extract_themes_simple(content: str, top_n: int = 5) -> list[str]:
-    content_lower = re.sub(r"[^a-z\s]", " ", content.lower())
-    words = [w for w in content_lower.split() if len(w) > 2 and w not in STOP]
-    if not words:
-        return []
-    counts = Counter(words)
+    return extract_themes_document(TokenizedDocument(content), top_n)
+
+
+def extract_themes_document(doc: TokenizedDocument, top_n: int = 5, lex: Optional[lexicon.Lexicon] = None) -> list[str]:
+    stop = (lex or lexicon.current()).stop_words
+    counts = Counter({w: c for w, c in doc.counts.items() if len(w) > 2 and w not in stop})
     return [w for w, _ in counts.most_common(top_n)]
 
 
+def extract_themes_tfidf(
+    doc: TokenizedDocument,
+    stats: Optional["DocumentFrequencies"],
+    top_n: int = 5,
+    lex: Optional[lexicon.Lexicon] = None,
+) -> list[str]:
+    """
+    Rank the entry's words by (1 + log tf) * idf against the user's and global document frequencies.
+    Ties keep first-occurrence order. Without enough counted entries this is extract_themes_document.
+    """
+    if stats is None or stats.global_docs < THEMES_TFIDF_MIN_DOCS:
+        return extract_themes_document(doc, top_n, lex)
+    stop = (lex or lexicon.current()).stop_words
+    candidates = [(w, c) for w, c in doc.counts.items() if len(w) > 2 and w not in stop]
+    ranked = sorted(candidates, key=lambda wc: -(1 + math.log(wc[1])) * stats.idf(wc[0]))
+    return [w for w, _ in ranked[:top_n]]
+
+
+def clean_llm_themes(raw: list, top_n: int = 5, lex: Optional[lexicon.Lexicon] = None) -> list[str]:
+    """Keep short theme tags from LLM output; drop numbering, prose, instructions and stop words."""
+    stop = (lex or lexicon.current()).stop_words
+    themes = []
+    for t in raw:
+        if len(themes) >= top_n:
+            break
+        if not isinstance(t, str):
+            continue
+        t = t.strip().strip('"').strip()
+        if len(t) > 45 or len(t) < 2:
+            continue
+        lower = t.lower()
+        if any(lower.startswith(f"{i}.") or lower.startswith(f"{i})") for i in range(10)):
+            continue
+        if any(phrase in lower for phrase in LLM_JUNK_PHRASES):
+            continue
+        if t.count(" ") > 4:
+            continue
+        if lower in stop:
+            continue
+        themes.append(t)
+    return themes
+
+
+def _themes_openai_chunk(content: str, top_n: int) -> list[str] | None:
+    text = chat(
+        messages=[
+            {"role": "system", "content": f"List up to {top_n} short theme tags (1-3 words each) for this journal entry. Reply as comma-separated values only, e.g. work stress, family, gratitude."},
+            {"role": "user", "content": content},
+        ],
+        max_tokens=80,
+    )
+    if not text:
+        return None
+    return clean_llm_themes(text.split(","), top_n) or None
+
+
 def extract_themes_openai(content: str, top_n: int = 5) -> list[str] | None:
-    if not is_available() or len(content) > 2000:
+    """LLM themes; long entries are tagged per chunk in parallel and the tags merged by chunk length."""
+    if not is_available() or not content.strip():
         return None
-    try:
-        client = get_client()
-        r = client.chat.completions.create(
-            model=get_model(),
-            messages=[
-                {"role": "system", "content": f"List up to {top_n} short theme tags (1-3 words each) for this journal entry. Reply as comma-separated values only, e.g. work stress, family, gratitude."},
-                {"role": "user", "content": content[:2000]},
-            ],
-            max_tokens=80,
-        )
-        text = (r.choices[0].message.content or "").strip()
-        raw = [t.strip() for t in text.split(",") if t.strip()]
-        themes = []
-        for t in raw:
-            if len(themes) >= top_n:
-                break
-            t = t.strip().strip('"').strip()
-            if len(t) > 45 or len(t) < 2:
-                continue
-            lower = t.lower()
-            if any(lower.startswith(f"{i}.") or lower.startswith(f"{i})") for i in range(10)):
-                continue
-            if any(phrase in lower for phrase in LLM_JUNK_PHRASES):
-                continue
-            if t.count(" ") > 4:
-                continue
-            if lower in STOP:
-                continue
-            themes.append(t)
-        if themes:
-            return themes
-    except Exception:
-        pass
-    return None
+    chunks = chunking.chunk_text(content)
+    results = chunking.map_chunks(lambda chunk: _themes_openai_chunk(chunk, top_n), chunks)
+    tagged = [(r, len(c)) for r, c in zip(results, chunks) if r]
+    return chunking.merge_ranked((r for r, _ in tagged), (w for _, w in tagged), top_n) or None
 
 
 def extract_themes(content: str, top_n: int = 5) -> list[str]:
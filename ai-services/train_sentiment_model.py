@@ -0,0 +1,115 @@
+"""
+Train the local sentiment model (sentiment_model.py) from LLM-labelled sentiment_result rows.
+
+Labels and scores come from the analytics DB (rows with sentiment_source = 'llm'); entry text comes
+from the journal DB (JOURNAL_DB_URL). A held-out split reports label accuracy and score MAE before
+the artifact is written as models/sentiment-<version>.npz and installed at SENTIMENT_MODEL_PATH.
+
+Usage:
+  python train_sentiment_model.py
+  python train_sentiment_model.py --include-unknown-source   # also use rows written before sentiment_source existed
+  python train_sentiment_model.py --no-install --out /tmp/sentiment-candidate.npz
+"""
+import argparse
+import os
+import shutil
+import sys
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+from sqlalchemy import create_engine, text
+
+from config import JOURNAL_DB_URL, SENTIMENT_MODEL_PATH
+from db import engine as analytics_engine
+from keywords import TokenizedDocument
+from sentiment_model import DEFAULT_N_FEATURES, LABELS, train
+
+MODELS_DIR = Path(__file__).resolve().parent / "models"
+FETCH_CHUNK = 5000
+
+
+def load_labelled_rows(include_unknown_source: bool, limit: Optional[int]) -> list[tuple[str, float, str]]:
+    """[(entry_id, score, label)] of non-provisional LLM-labelled rows, newest first."""
+    source_filter = "(sentiment_source = 'llm' OR sentiment_source IS NULL)" if include_unknown_source else "sentiment_source = 'llm'"
+    with analytics_engine.connect() as conn:
+        rows = conn.execute(
+            text(f"""
+                SELECT CAST(entry_id AS text), score, label FROM sentiment_result
+                WHERE {source_filter} AND NOT provisional AND label = ANY(:labels)
+                ORDER BY computed_at DESC
+                {"LIMIT :limit" if limit else ""}
+            """),
+            {"labels": list(LABELS), "limit": limit},
+        ).all()
+    return [(r[0], float(r[1]), r[2]) for r in rows]
+
+
+def load_contents(entry_ids: list[str]) -> dict[str, str]:
+    """entry_id -> content from the journal DB, fetched in chunks."""
+    journal = create_engine(JOURNAL_DB_URL, pool_pre_ping=True)
+    contents: dict[str, str] = {}
+    with journal.connect() as conn:
+        for start in range(0, len(entry_ids), FETCH_CHUNK):
+            chunk = entry_ids[start:start + FETCH_CHUNK]
+            rows = conn.execute(
+                text("SELECT CAST(id AS text), content FROM journal_entry WHERE id = ANY(CAST(:ids AS uuid[]))"),
+                {"ids": chunk},
+            ).all()
+            contents.update({r[0]: r[1] or "" for r in rows})
+    return contents
+
+
+def evaluate(model, docs: list[TokenizedDocument], labels: list[str], scores: list[float]) -> tuple[float, float]:
+    """(label accuracy, score mean absolute error) on a held-out set."""
+    predictions = [model.predict(d) for d in docs]
+    accuracy = float(np.mean([p[1] == label for p, label in zip(predictions, labels)]))
+    mae = float(np.mean([abs(p[0] - s) for p, s in zip(predictions, scores)]))
+    return accuracy, mae
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Train the local sentiment model from LLM-labelled rows.")
+    parser.add_argument("--include-unknown-source", action="store_true", help="also train on rows with sentiment_source NULL")
+    parser.add_argument("--limit", type=int, help="use at most this many of the newest rows")
+    parser.add_argument("--min-rows", type=int, default=200, help="refuse to train on fewer rows (default 200)")
+    parser.add_argument("--holdout", type=float, default=0.1, help="fraction held out for evaluation (default 0.1)")
+    parser.add_argument("--epochs", type=int, default=20)
+    parser.add_argument("--features", type=int, default=DEFAULT_N_FEATURES, help=f"hash buckets (default {DEFAULT_N_FEATURES})")
+    parser.add_argument("--out", help="artifact path (default models/sentiment-<version>.npz)")
+    parser.add_argument("--no-install", action="store_true", help=f"do not copy the artifact to SENTIMENT_MODEL_PATH ({SENTIMENT_MODEL_PATH})")
+    args = parser.parse_args(argv)
+
+    rows = load_labelled_rows(args.include_unknown_source, args.limit)
+    contents = load_contents([r[0] for r in rows])
+    rows = [r for r in rows if contents.get(r[0], "").strip()]
+    if len(rows) < args.min_rows:
+        print(f"Only {len(rows)} labelled rows with content (need {args.min_rows}); not training.", file=sys.stderr)
+        sys.exit(1)
+    docs = [TokenizedDocument(contents[r[0]]) for r in rows]
+    scores = [r[1] for r in rows]
+    labels = [r[2] for r in rows]
+
+    order = np.random.default_rng(0).permutation(len(rows))
+    n_holdout = int(len(rows) * args.holdout)
+    test, fit = order[:n_holdout], order[n_holdout:]
+    pick = lambda seq, idx: [seq[i] for i in idx]  # noqa: E731
+    model = train(pick(docs, fit), pick(labels, fit), pick(scores, fit), n_features=args.features, epochs=args.epochs)
+    if n_holdout:
+        accuracy, mae = evaluate(model, pick(docs, test), pick(labels, test), pick(scores, test))
+        print(f"Held-out ({n_holdout} rows): label accuracy {accuracy:.3f}, score MAE {mae:.3f}", flush=True)
+
+    out = args.out or str(MODELS_DIR / f"sentiment-{model.version}.npz")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    model.save(out)
+    print(f"Trained on {len(fit)} rows; wrote model version {model.version} to {out}", flush=True)
+    if not args.no_install and SENTIMENT_MODEL_PATH and os.path.abspath(out) != os.path.abspath(SENTIMENT_MODEL_PATH):
+        os.makedirs(os.path.dirname(os.path.abspath(SENTIMENT_MODEL_PATH)), exist_ok=True)
+        tmp = f"{SENTIMENT_MODEL_PATH}.tmp"
+        shutil.copyfile(out, tmp)
+        os.replace(tmp, SENTIMENT_MODEL_PATH)
+        print(f"Installed at {SENTIMENT_MODEL_PATH}; restart the consumer to pick it up.", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -9,6 +9,7 @@ public class EntryCreatedEvent {
     private String userId;
     private String content;
     private Instant createdAt;
+    private String type = "entry.created";
     private String source = "journal-service";
 
     public EntryCreatedEvent() {
@@ -53,6 +54,14 @@ public class EntryCreatedEvent {
         this.createdAt = createdAt;
     }
 
+    public String getType() {
+        return type;
+    }
+
+    public void setType(String type) {
+        this.type = type;
+    }
+
     public String getSource() {
         return source;
     }
@@ -0,0 +1,82 @@
+package com.journal.messaging;
+
+import java.time.Instant;
+import java.util.UUID;
+
+public class EntryDeletedEvent {
+
+    private UUID entryId;
+    private String userId;
+    private String content;
+    private Instant createdAt;
+    private Instant deletedAt;
+    private String type = "entry.deleted";
+    private String source = "journal-service";
+
+    public EntryDeletedEvent() {
+    }
+
+    public EntryDeletedEvent(UUID entryId, String userId, String content, Instant createdAt, Instant deletedAt) {
+        this.entryId = entryId;
+        this.userId = userId;
+        this.content = content;
+        this.createdAt = createdAt;
+        this.deletedAt = deletedAt;
+    }
+
+    public UUID getEntryId() {
+        return entryId;
+    }
+
+    public void setEntryId(UUID entryId) {
+        this.entryId = entryId;
+    }
+
+    public String getUserId() {
+        return userId;
+    }
+
+    public void setUserId(String userId) {
+        this.userId = userId;
+    }
+
+    public String getContent() {
+        return content;
+    }
+
+    public void setContent(String content) {
+        this.content = content;
+    }
+
+    public Instant getCreatedAt() {
+        return createdAt;
+    }
+
+    public void setCreatedAt(Instant createdAt) {
+        this.createdAt = createdAt;
+    }
+
+    public Instant getDeletedAt() {
+        return deletedAt;
+    }
+
+    public void setDeletedAt(Instant deletedAt) {
+        this.deletedAt = deletedAt;
+    }
+
+    public String getType() {
+        return type;
+    }
+
+    public void setType(String type) {
+        this.type = type;
+    }
+
+    public String getSource() {
+        return source;
+    }
+
+    public void setSource(String source) {
+        this.source = source;
+    }
+}
@@ -4,19 +4,37 @@ import org.springframework.beans.factory.annotation.Value;
 import org.springframework.kafka.core.KafkaTemplate;
 import org.springframework.stereotype.Component;
 
+import java.util.UUID;
+
+/**
+ * Publishes entry lifecycle events. Created, updated and deleted events share one topic keyed by
+ * entry id, so all events of an entry land on one partition and are consumed in order.
+ */
 @Component
 public class EntryEventPublisher {
 
-    private final KafkaTemplate<String, EntryCreatedEvent> kafkaTemplate;
+    private final KafkaTemplate<String, Object> kafkaTemplate;
 
     @Value("${journal.topic:journal.entry.created}")
     private String topic;
 
-    public EntryEventPublisher(KafkaTemplate<String, EntryCreatedEvent> kafkaTemplate) {
+    public EntryEventPublisher(KafkaTemplate<String, Object> kafkaTemplate) {
         this.kafkaTemplate = kafkaTemplate;
     }
 
     public void publishEntryCreated(EntryCreatedEvent event) {
-        kafkaTemplate.send(topic, event.getEntryId().toString(), event);
+        send(event.getEntryId(), event);
+    }
+
+    public void publishEntryUpdated(EntryUpdatedEvent event) {
+        send(event.getEntryId(), event);
+    }
+
+    public void publishEntryDeleted(EntryDeletedEvent event) {
+        send(event.getEntryId(), event);
+    }
+
+    private void send(UUID entryId, Object event) {
+        kafkaTemplate.send(topic, entryId.toString(), event);
     }
 }
@@ -0,0 +1,92 @@
+package com.journal.messaging;
+
+import java.time.Instant;
+import java.util.UUID;
+
+public class EntryUpdatedEvent {
+
+    private UUID entryId;
+    private String userId;
+    private String content;
+    private String previousContent;
+    private Instant createdAt;
+    private Instant updatedAt;
+    private String type = "entry.updated";
+    private String source = "journal-service";
+
+    public EntryUpdatedEvent() {
+    }
+
+    public EntryUpdatedEvent(UUID entryId, String userId, String content, String previousContent, Instant createdAt, Instant updatedAt) {
+        this.entryId = entryId;
+        this.userId = userId;
+        this.content = content;
+        this.previousContent = previousContent;
+        this.createdAt = createdAt;
+        this.updatedAt = updatedAt;
+    }
+
+    public UUID getEntryId() {
+        return entryId;
+    }
+
+    public void setEntryId(UUID entryId) {
+        this.entryId = entryId;
+    }
+
+    public String getUserId() {
+        return userId;
+    }
+
+    public void setUserId(String userId) {
+        this.userId = userId;
+    }
+
+    public String getContent() {
+        return content;
+    }
+
+    public void setContent(String content) {
+        this.content = content;
+    }
+
+    public String getPreviousContent() {
+        return previousContent;
+    }
+
+    public void setPreviousContent(String previousContent) {
+        this.previousContent = previousContent;
+    }
+
+    public Instant getCreatedAt() {
+        return createdAt;
+    }
+
+    public void setCreatedAt(Instant createdAt) {
+        this.createdAt = createdAt;
+    }
+
+    public Instant getUpdatedAt() {
+        return updatedAt;
+    }
+
+    public void setUpdatedAt(Instant updatedAt) {
+        this.updatedAt = updatedAt;
+    }
+
+    public String getType() {
+        return type;
+    }
+
+    public void setType(String type) {
+        this.type = type;
+    }
+
+    public String getSource() {
+        return source;
+    }
+
+    public void setSource(String source) {
+        this.source = source;
+    }
+}
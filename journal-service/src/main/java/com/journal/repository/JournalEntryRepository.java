@@ -27,5 +27,7 @@ public interface JournalEntryRepository extends JpaRepository<JournalEntry, UUID
     Page<JournalEntry> findByUserIdAndCreatedAtBetweenOrderByCreatedAtDesc(
         String userId, Instant from, Instant to, Pageable pageable);
 
+    List<JournalEntry> findByUserId(String userId);
+
     void deleteByUserId(String userId);
 }
@@ -1,7 +1,9 @@
 package com.journal.service;
 
 import com.journal.messaging.EntryCreatedEvent;
+import com.journal.messaging.EntryDeletedEvent;
 import com.journal.messaging.EntryEventPublisher;
+import com.journal.messaging.EntryUpdatedEvent;
 import com.journal.model.dto.CreateEntryRequest;
 import com.journal.model.dto.EntryResponse;
 import com.journal.model.dto.StreakResponse;
@@ -94,6 +96,7 @@ public class JournalEntryService {
     public EntryResponse update(String userId, UUID id, UpdateEntryRequest request) {
         JournalEntry entry = repository.findByUserIdAndId(userId, id)
             .orElseThrow(() -> new EntryNotFoundException(id));
+        String previousContent = entry.getContent();
         entry.setContent(request.getContent().trim());
         if (request.getMood() != null && !request.getMood().isBlank()) {
             entry.setMood(request.getMood().trim());
@@ -106,6 +109,23 @@ public class JournalEntryService {
             entry.setMoodNote(null);
         }
         entry = repository.save(entry);
+
+        if (!entry.getContent().equals(previousContent)) {
+            EntryUpdatedEvent event = new EntryUpdatedEvent(
+                entry.getId(),
+                entry.getUserId(),
+                entry.getContent(),
+                previousContent,
+                entry.getCreatedAt(),
+                entry.getUpdatedAt()
+            );
+            try {
+                eventPublisher.publishEntryUpdated(event);
+            } catch (Exception e) {
+                log.warn("Failed to publish entry.updated event (Kafka may be down). Entry saved. {}", e.getMessage());
+            }
+        }
+
         return toResponse(entry);
     }
 
@@ -114,11 +134,29 @@ public class JournalEntryService {
         JournalEntry entry = repository.findByUserIdAndId(userId, id)
             .orElseThrow(() -> new EntryNotFoundException(id));
         repository.delete(entry);
+        publishDeleted(entry);
     }
 
     @Transactional
     public void deleteAllByUser(String userId) {
+        List<JournalEntry> entries = repository.findByUserId(userId);
         repository.deleteByUserId(userId);
+        entries.forEach(this::publishDeleted);
+    }
+
+    private void publishDeleted(JournalEntry entry) {
+        EntryDeletedEvent event = new EntryDeletedEvent(
+            entry.getId(),
+            entry.getUserId(),
+            entry.getContent(),
+            entry.getCreatedAt(),
+            Instant.now()
+        );
+        try {
+            eventPublisher.publishEntryDeleted(event);
+        } catch (Exception e) {
+            log.warn("Failed to publish entry.deleted event (Kafka may be down). Entry deleted. {}", e.getMessage());
+        }
     }
 
     public StreakResponse getStreak(String userId) {
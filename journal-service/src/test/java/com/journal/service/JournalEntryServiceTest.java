@@ -1,9 +1,12 @@
 package com.journal.service;
 
 import com.journal.messaging.EntryCreatedEvent;
+import com.journal.messaging.EntryDeletedEvent;
 import com.journal.messaging.EntryEventPublisher;
+import com.journal.messaging.EntryUpdatedEvent;
 import com.journal.model.dto.CreateEntryRequest;
 import com.journal.model.dto.EntryResponse;
+import com.journal.model.dto.UpdateEntryRequest;
 import com.journal.model.entity.JournalEntry;
 import com.journal.repository.JournalEntryRepository;
 
@@ -59,6 +62,48 @@ class JournalEntryServiceTest {
         assertThat(eventCaptor.getValue().getContent()).isEqualTo("Test content");
     }
 
+    @Test
+    void update_publishesEventWithPreviousContent() {
+        String userId = "user-1";
+        JournalEntry entry = new JournalEntry();
+        entry.setId(UUID.randomUUID());
+        entry.setUserId(userId);
+        entry.setContent("Old content");
+        entry.setCreatedAt(java.time.Instant.now());
+        entry.setUpdatedAt(java.time.Instant.now());
+        when(repository.findByUserIdAndId(userId, entry.getId())).thenReturn(Optional.of(entry));
+        when(repository.save(any(JournalEntry.class))).thenAnswer(invocation -> invocation.getArgument(0));
+        UpdateEntryRequest request = new UpdateEntryRequest();
+        request.setContent("New content");
+
+        service.update(userId, entry.getId(), request);
+
+        ArgumentCaptor<EntryUpdatedEvent> eventCaptor = ArgumentCaptor.forClass(EntryUpdatedEvent.class);
+        verify(eventPublisher).publishEntryUpdated(eventCaptor.capture());
+        assertThat(eventCaptor.getValue().getType()).isEqualTo("entry.updated");
+        assertThat(eventCaptor.getValue().getContent()).isEqualTo("New content");
+        assertThat(eventCaptor.getValue().getPreviousContent()).isEqualTo("Old content");
+    }
+
+    @Test
+    void delete_publishesEventWithContent() {
+        String userId = "user-1";
+        JournalEntry entry = new JournalEntry();
+        entry.setId(UUID.randomUUID());
+        entry.setUserId(userId);
+        entry.setContent("Test content");
+        entry.setCreatedAt(java.time.Instant.now());
+        when(repository.findByUserIdAndId(userId, entry.getId())).thenReturn(Optional.of(entry));
+
+        service.delete(userId, entry.getId());
+
+        verify(repository).delete(entry);
+        ArgumentCaptor<EntryDeletedEvent> eventCaptor = ArgumentCaptor.forClass(EntryDeletedEvent.class);
+        verify(eventPublisher).publishEntryDeleted(eventCaptor.capture());
+        assertThat(eventCaptor.getValue().getEntryId()).isEqualTo(entry.getId());
+        assertThat(eventCaptor.getValue().getContent()).isEqualTo("Test content");
+    }
+
     @Test
     void getById_throwsWhenNotFound() {
         String userId = "user-1";
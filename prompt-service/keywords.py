@@ -0,0 +1,51 @@
+"""
+Compiled keyword matcher for the no-LLM fallbacks (same matcher as ai-services/keywords.py).
+Built once at import from a keyword -> labels mapping; each text gets one tokenizing pass with
+whole-word matching ("down" no longer matches "download") and multi-word phrases ("looking forward").
+"""
+import re
+from typing import Hashable, Iterable
+
+_TOKEN_RE = re.compile(r"[a-z]+")
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercase and split into alphabetic tokens (same as replacing [^a-z] with spaces and splitting)."""
+    return _TOKEN_RE.findall(text.lower())
+
+
+class KeywordMatcher:
+    """Match single words and phrases against a token stream in one linear pass."""
+
+    def __init__(self, mapping: dict[str, Iterable[Hashable]]):
+        self._words: dict[str, tuple] = {}
+        self._phrases: dict[str, list[tuple[tuple[str, ...], str, tuple]]] = {}
+        for keyword, labels in mapping.items():
+            parts = tuple(tokenize(keyword))
+            if not parts:
+                continue
+            labels = tuple(labels)
+            if len(parts) == 1:
+                self._words[parts[0]] = labels
+            else:
+                self._phrases.setdefault(parts[0], []).append((parts, keyword, labels))
+
+    def find_tokens(self, tokens: list[str]) -> dict[str, tuple]:
+        """Return {matched keyword: labels} for every distinct keyword present in the tokens."""
+        found: dict[str, tuple] = {}
+        words, phrases = self._words, self._phrases
+        for i, tok in enumerate(tokens):
+            labels = words.get(tok)
+            if labels is not None:
+                found[tok] = labels
+            for parts, keyword, phrase_labels in phrases.get(tok, ()):
+                if tuple(tokens[i:i + len(parts)]) == parts:
+                    found[keyword] = phrase_labels
+        return found
+
+    def find(self, text: str) -> dict[str, tuple]:
+        return self.find_tokens(tokenize(text))
+
+    def labels(self, text: str) -> set:
+        """Union of labels of all keywords present in the text."""
+        return {label for labels in self.find(text).values() for label in labels}
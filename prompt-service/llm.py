@@ -1,13 +1,30 @@
 """
 Generic LLM layer: use any OpenAI-compatible provider (OpenAI, Ollama, etc.).
-Same env vars as ai-services (LLM_PROVIDER, OPENAI_*, OLLAMA_*) so one .env works for both.
+Same env vars as ai-services (LLM_PROVIDER, OPENAI_*, OLLAMA_*, LLM_MAX_*) so one .env works for both.
+One shared client per (provider, base URL, timeout) keeps its connections alive between requests.
+Call sites opt in to the persistent response cache (llm_cache.py) with cache_site and cache_ttl.
+Identical concurrent calls are coalesced into one upstream request (singleflight.py), which then
+waits for a slot of its workload class (llm_scheduler.py; prompts are interactive, so they go ahead
+of summary and background calls, of every service when LLM_SCHEDULER_DB_URL is set).
 """
+import asyncio
 import os
+import threading
+from collections import Counter
 from typing import Any, Optional
 
+import llm_cache
+import llm_scheduler
+from singleflight import SingleFlight
+
 # Ollama can be slow; use a long timeout so follow-up/today prompts don't fail.
 OLLAMA_TIMEOUT = float(os.getenv("OLLAMA_TIMEOUT", "120"))
 
+# Connection pool per client (see ai-services/llm.py)
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "32"))
+LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "16"))
+LLM_KEEPALIVE_SECONDS = float(os.getenv("LLM_KEEPALIVE_SECONDS", "60"))
+
 _raw = (os.getenv("LLM_PROVIDER") or "").strip().lower()
 if _raw in ("openai", "ollama"):
     LLM_PROVIDER = _raw
@@ -35,15 +52,79 @@ def is_available() -> bool:
     return False
 
 
-def get_client():
-    from openai import OpenAI
+_clients: dict[tuple, Any] = {}
+_clients_lock = threading.Lock()
+# Identical concurrent requests (same model, messages and params) share one upstream call
+_in_flight = SingleFlight()
+# Every upstream call takes a slot for its workload class (see ai-services/llm_scheduler.py)
+scheduler = llm_scheduler.LLMScheduler(table=llm_scheduler.shared_table())
+
+
+def _client_settings() -> tuple[str, Optional[str], Optional[float]]:
     if LLM_PROVIDER == "ollama":
-        return OpenAI(api_key="ollama", base_url=OLLAMA_BASE_URL, timeout=OLLAMA_TIMEOUT)
+        return "ollama", OLLAMA_BASE_URL, OLLAMA_TIMEOUT
     if LLM_PROVIDER == "openai":
         if OPENAI_BASE_URL:
-            return OpenAI(api_key=OPENAI_API_KEY or "ollama", base_url=OPENAI_BASE_URL)
-        return OpenAI(api_key=OPENAI_API_KEY)
-    return OpenAI(api_key=OPENAI_API_KEY or "ollama", base_url=OPENAI_BASE_URL or None)
+            return OPENAI_API_KEY or "ollama", OPENAI_BASE_URL, None
+        return OPENAI_API_KEY, None, None
+    return OPENAI_API_KEY or "ollama", OPENAI_BASE_URL or None, None
+
+
+def _pool_limits():
+    import httpx
+    return httpx.Limits(
+        max_connections=LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=LLM_MAX_KEEPALIVE,
+        keepalive_expiry=LLM_KEEPALIVE_SECONDS,
+    )
+
+
+def _pooled_client(is_async: bool):
+    api_key, base_url, timeout = _client_settings()
+    key = (LLM_PROVIDER, base_url, timeout, is_async)
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                import httpx
+                from openai import AsyncOpenAI, OpenAI
+                options = {"timeout": timeout} if timeout is not None else {}
+                if is_async:
+                    client = AsyncOpenAI(
+                        api_key=api_key,
+                        base_url=base_url,
+                        http_client=httpx.AsyncClient(limits=_pool_limits()),
+                        **options,
+                    )
+                else:
+                    client = OpenAI(
+                        api_key=api_key,
+                        base_url=base_url,
+                        http_client=httpx.Client(limits=_pool_limits()),
+                        **options,
+                    )
+                _clients[key] = client
+    return client
+
+
+def get_client():
+    return _pooled_client(False)
+
+
+def get_async_client():
+    return _pooled_client(True)
+
+
+async def aclose_clients() -> None:
+    with _clients_lock:
+        clients = list(_clients.items())
+        _clients.clear()
+    for key, client in clients:
+        if key[-1]:
+            await client.close()
+        else:
+            client.close()
 
 
 def get_model() -> str:
@@ -52,18 +133,98 @@ def get_model() -> str:
     return OPENAI_MODEL
 
 
-def chat(messages: list[dict[str, str]], max_tokens: int = 80, **kwargs: Any) -> Optional[str]:
+_cache_counts: Counter = Counter()  # (site, "hit" | "miss") -> lookups
+_cache_counts_lock = threading.Lock()
+
+
+def cache_stats() -> dict[tuple[str, str], int]:
+    with _cache_counts_lock:
+        return dict(_cache_counts)
+
+
+def _reply_text(r) -> Optional[str]:
+    text = (r.choices[0].message.content or "").strip()
+    return text if text else None
+
+
+def _cache_key(messages: list[dict[str, str]], max_tokens: int, kwargs: dict) -> str:
+    return llm_cache.make_key(get_model(), messages, {"max_tokens": max_tokens, **kwargs})
+
+
+def _cached_reply(key: str, site: str) -> Optional[str]:
+    cached = llm_cache.get(key)
+    with _cache_counts_lock:
+        _cache_counts[(site, "hit" if cached is not None else "miss")] += 1
+    return cached
+
+
+def chat(
+    messages: list[dict[str, str]],
+    max_tokens: int = 80,
+    cache_site: str = "chat",
+    cache_ttl: Optional[float] = None,
+    workload: str = llm_scheduler.INTERACTIVE,
+    **kwargs: Any,
+) -> Optional[str]:
     if not is_available():
         return None
-    try:
-        client = get_client()
-        r = client.chat.completions.create(
-            model=get_model(),
-            messages=messages,
-            max_tokens=max_tokens,
-            **kwargs,
-        )
-        text = (r.choices[0].message.content or "").strip()
-        return text if text else None
-    except Exception:
+    key = _cache_key(messages, max_tokens, kwargs)
+    if cache_ttl and (cached := _cached_reply(key, cache_site)) is not None:
+        return cached
+
+    def complete() -> Optional[str]:
+        try:
+            client = get_client()
+            with scheduler.slot(workload):
+                r = client.chat.completions.create(
+                    model=get_model(),
+                    messages=messages,
+                    max_tokens=max_tokens,
+                    **kwargs,
+                )
+            text = _reply_text(r)
+        except llm_scheduler.SchedulerRejected:
+            return None
+        except Exception:
+            return None
+        if cache_ttl and text:
+            llm_cache.put(key, text, cache_ttl)
+        return text
+
+    return _in_flight.do(key, complete)
+
+
+async def async_chat(
+    messages: list[dict[str, str]],
+    max_tokens: int = 80,
+    cache_site: str = "chat",
+    cache_ttl: Optional[float] = None,
+    workload: str = llm_scheduler.INTERACTIVE,
+    **kwargs: Any,
+) -> Optional[str]:
+    if not is_available():
         return None
+    key = _cache_key(messages, max_tokens, kwargs)
+    if cache_ttl and (cached := await asyncio.to_thread(_cached_reply, key, cache_site)) is not None:
+        return cached
+
+    async def complete() -> Optional[str]:
+        try:
+            client = get_async_client()
+            async with scheduler.slot_async(workload):
+                r = await client.chat.completions.create(
+                    model=get_model(),
+                    messages=messages,
+                    max_tokens=max_tokens,
+                    **kwargs,
+                )
+            text = _reply_text(r)
+        except llm_scheduler.SchedulerRejected:
+            return None
+        except Exception:
+            return None
+        if cache_ttl and text:
+            await asyncio.to_thread(llm_cache.put, key, text, cache_ttl)
+        return text
+
+    return await _in_flight.do_async(key, complete)
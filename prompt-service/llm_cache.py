@@ -0,0 +1,102 @@
+"""
+Persistent LLM response cache: chat replies keyed by model, normalized messages and generation
+params, so a repeated prompt (the same Today nudge on every page load) skips the LLM.
+Same cache as ai-services/llm_cache.py.
+
+Opt-in per call site: llm.async_chat(..., cache_site="today_prompt", cache_ttl=seconds); entries expire
+after that call site's TTL. Local SQLite file (LLM_CACHE_PATH) so answers survive restarts, bounded
+to LLM_CACHE_MAX_ENTRIES with least-recently-used eviction. Safe across threads and processes (each
+process opens its own connection; WAL mode).
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Optional
+
+# Same settings as ai-services (set LLM_CACHE_PATH to an empty string to disable).
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".llm-cache.sqlite3"))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "10000"))
+
+# Evict at most every N writes; the table may briefly exceed the bound by that much.
+_EVICT_EVERY = 100
+
+_lock = threading.Lock()
+_conn: Optional[sqlite3.Connection] = None
+_conn_pid: Optional[int] = None
+_writes = 0
+
+
+def make_key(model: str, messages: list[dict[str, str]], params: dict[str, Any]) -> str:
+    """Whitespace differences in the messages share a key; every generation param is part of it."""
+    normalized = [
+        {"role": m.get("role"), "content": re.sub(r"\s+", " ", m.get("content") or "").strip()}
+        for m in messages
+    ]
+    payload = json.dumps([model, normalized, params], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _connection() -> Optional[sqlite3.Connection]:
+    """Return this process's connection (re-opened after fork), or None when the cache is disabled."""
+    global _conn, _conn_pid
+    if not LLM_CACHE_PATH:
+        return None
+    if _conn is None or _conn_pid != os.getpid():
+        conn = sqlite3.connect(LLM_CACHE_PATH, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used ON llm_cache (last_used)")
+        conn.commit()
+        _conn, _conn_pid = conn, os.getpid()
+    return _conn
+
+
+def get(key: str) -> Optional[str]:
+    """Return the cached reply and mark it recently used, or None when missing or expired."""
+    with _lock:
+        conn = _connection()
+        if conn is None:
+            return None
+        try:
+            now = time.time()
+            row = conn.execute("SELECT value FROM llm_cache WHERE key = ? AND expires_at > ?", (key, now)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE llm_cache SET last_used = ? WHERE key = ?", (now, key))
+            conn.commit()
+            return row[0]
+        except sqlite3.Error:
+            return None
+
+
+def put(key: str, value: str, ttl: float) -> None:
+    """Store a reply for ttl seconds; every _EVICT_EVERY writes, drop expired rows and trim by last use."""
+    global _writes
+    with _lock:
+        conn = _connection()
+        if conn is None:
+            return
+        try:
+            now = time.time()
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, expires_at, last_used) VALUES (?, ?, ?, ?)",
+                (key, value, now + ttl, now),
+            )
+            _writes += 1
+            if _writes % _EVICT_EVERY == 0:
+                conn.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (now,))
+                conn.execute(
+                    "DELETE FROM llm_cache WHERE key IN ("
+                    " SELECT key FROM llm_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                    (LLM_CACHE_MAX_ENTRIES,),
+                )
+            conn.commit()
+        except sqlite3.Error:
+            pass  # the cache is an optimization; never fail a request because of it
@@ -5,16 +5,44 @@ Fetches recent entries from Journal Service and uses LLM (or fallback) to genera
 import os
 import random
 import re
+from contextlib import asynccontextmanager
 from typing import Optional
 
 import httpx
 from fastapi import FastAPI, Header, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
 
-from llm import chat as llm_chat, is_available as llm_available
+from keywords import KeywordMatcher
+from llm import (
+    aclose_clients as llm_close_clients,
+    async_chat as llm_chat,
+    cache_stats as llm_cache_stats,
+    is_available as llm_available,
+    scheduler as llm_scheduler,
+)
+
+# Shared connection pool for Journal Service calls (created on first request)
+_journal_http: Optional[httpx.AsyncClient] = None
+
+
+def _journal_client() -> httpx.AsyncClient:
+    global _journal_http
+    if _journal_http is None:
+        _journal_http = httpx.AsyncClient(timeout=10.0)
+    return _journal_http
+
 
-app = FastAPI(title="Prompt Service", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    if _journal_http is not None:
+        await _journal_http.aclose()
+    await llm_close_clients()
+
+
+app = FastAPI(title="Prompt Service", version="1.0.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -25,6 +53,10 @@ app.add_middleware(
 )
 
 JOURNAL_SERVICE_URL = os.getenv("JOURNAL_SERVICE_URL", "http://localhost:8080")
+# LLM response cache TTLs per call site. The prompts embed the entries they are about, so a new or
+# edited entry gets a fresh answer; page reloads and repeated requests reuse the cached one.
+LLM_CACHE_TTL_TODAY_PROMPT = float(os.getenv("LLM_CACHE_TTL_TODAY_PROMPT", "3600"))
+LLM_CACHE_TTL_FOLLOW_UP = float(os.getenv("LLM_CACHE_TTL_FOLLOW_UP", "86400"))
 
 
 class PromptResponse(BaseModel):
@@ -56,39 +88,69 @@ def fallback_follow_up(last_entry: str) -> str:
     return pair[0] if pair else random.choice(FOLLOW_UP_PROMPTS)
 
 
+def _rule_matcher(rules: list[tuple[tuple[str, ...], object]]) -> KeywordMatcher:
+    """Compile ordered (keywords, result) rules into one matcher whose labels are rule indexes."""
+    mapping: dict[str, list[int]] = {}
+    for index, (keywords, _) in enumerate(rules):
+        for keyword in keywords:
+            mapping.setdefault(keyword, []).append(index)
+    return KeywordMatcher(mapping)
+
+
+# Ordered: the first rule whose keywords appear (as whole words) in the entry wins.
+_FOLLOW_UP_RULES: list[tuple[tuple[str, ...], list[str]]] = [
+    (
+        ("stress", "stressed", "stressful", "overwhelm", "overwhelmed", "overwhelming", "anxious", "anxiety",
+         "worried", "worry", "worrying", "work pressure"),
+        ["How did you find moments of calm today?", "What one thing at work could you do differently tomorrow?"],
+    ),
+    (
+        ("angry", "frustrated", "frustrating", "annoyed", "annoying", "mad"),
+        ["What would help you feel a bit lighter about that?", "What's one small step you could take from here?"],
+    ),
+    (
+        ("sad", "down", "lonely", "miss", "missed", "missing"),
+        ["What's one small thing that could bring you comfort?", "Who could you reach out to today?"],
+    ),
+    (
+        ("grateful", "thankful", "good", "happy", "relieved"),
+        ["What's one more thing you're grateful for right now?", "How did it feel to be heard?"],
+    ),
+    (
+        ("sleep", "slept", "sleeping", "sleepy", "tired", "exhausted", "rest", "rested"),
+        ["How are you feeling after rest (or lack of it)?", "What would help you wind down tonight?"],
+    ),
+    (
+        ("trip", "trips", "travel", "travels", "traveled", "travelled", "traveling", "travelling", "vacation",
+         "holiday", "holidays", "europe", "getaway"),
+        ["What's one thing you're most looking forward to about the trip?", "Which place do you want to see first?"],
+    ),
+    (
+        ("tomorrow", "next step", "next steps", "goal", "goals"),
+        ["What's one small step you could take from here?", "What would make tomorrow a bit better?"],
+    ),
+]
+_FOLLOW_UP_MATCHER = _rule_matcher(_FOLLOW_UP_RULES)
+
+
 def _fallback_follow_up_pair(last_entry: str) -> Optional[list[str]]:
     """Return 2 context-aware follow-ups for the entry (different angles), or None."""
     if not last_entry or not last_entry.strip():
         return None
-    content = last_entry.lower().strip()[:800]
-    if any(w in content for w in ["stress", "stressed", "overwhelm", "anxious", "worried", "work pressure"]):
-        return ["How did you find moments of calm today?", "What one thing at work could you do differently tomorrow?"]
-    if any(w in content for w in ["angry", "frustrated", "annoyed", "mad"]):
-        return ["What would help you feel a bit lighter about that?", "What's one small step you could take from here?"]
-    if any(w in content for w in ["sad", "down", "lonely", "miss"]):
-        return ["What's one small thing that could bring you comfort?", "Who could you reach out to today?"]
-    if any(w in content for w in ["grateful", "thankful", "good", "happy", "relieved"]):
-        return ["What's one more thing you're grateful for right now?", "How did it feel to be heard?"]
-    if any(w in content for w in ["sleep", "tired", "exhausted", "rest"]):
-        return ["How are you feeling after rest (or lack of it)?", "What would help you wind down tonight?"]
-    if any(w in content for w in ["trip", "travel", "vacation", "holiday", "europe", "traveling", "getaway"]):
-        return ["What's one thing you're most looking forward to about the trip?", "Which place do you want to see first?"]
-    if any(w in content for w in ["tomorrow", "next step", "goal"]):
-        return ["What's one small step you could take from here?", "What would make tomorrow a bit better?"]
-    return None
+    hits = _FOLLOW_UP_MATCHER.labels(last_entry.strip()[:800])
+    return list(_FOLLOW_UP_RULES[min(hits)][1]) if hits else None
 
 
-def get_recent_entries(token: str, limit: int = 10) -> list[dict]:
+async def get_recent_entries(token: str, limit: int = 10) -> list[dict]:
     """Fetch recent entries from Journal Service."""
     headers = {"Authorization": f"Bearer {token}"} if token else {}
     if not token:
         return []
     try:
-        r = httpx.get(
+        r = await _journal_client().get(
             f"{JOURNAL_SERVICE_URL}/api/v1/entries/recent",
             params={"limit": limit},
             headers=headers,
-            timeout=10.0,
         )
         r.raise_for_status()
         return r.json()
@@ -96,7 +158,7 @@ def get_recent_entries(token: str, limit: int = 10) -> list[dict]:
         return []
 
 
-def generate_prompt_with_llm(entries: list[dict]) -> Optional[str]:
+async def generate_prompt_with_llm(entries: list[dict]) -> Optional[str]:
     """
     Pre-entry nudge: suggest a prompt that references something they've written about
     often (e.g. "You've mentioned work a few times this week. Want to write about how it felt today?").
@@ -108,7 +170,7 @@ def generate_prompt_with_llm(entries: list[dict]) -> Optional[str]:
         for e in entries[:7]
     ]
     context = "\n".join(f"- {s}" for s in snippets if s)
-    text = llm_chat(
+    text = await llm_chat(
         messages=[
             {
                 "role": "system",
@@ -121,29 +183,60 @@ Output ONLY the nudge. No quotes, no preamble.""",
             {"role": "user", "content": f"Recent entries:\n{context}" if context else "No entries yet."},
         ],
         max_tokens=60,
+        cache_site="today_prompt",
+        cache_ttl=LLM_CACHE_TTL_TODAY_PROMPT,
     )
     return text.strip() if text else None
 
 
+_NUDGE_RULES: list[tuple[tuple[str, ...], str]] = [
+    (
+        ("work", "works", "working", "job", "jobs", "boss", "meeting", "meetings"),
+        "You've mentioned work a few times recently. Want to write about how it felt today?",
+    ),
+    (
+        ("stress", "stressed", "stressful", "overwhelm", "overwhelmed", "overwhelming"),
+        "You've written about stress lately. Want to write about how it felt today?",
+    ),
+    (
+        ("family", "kids", "child", "children", "parent", "parents"),
+        "Family has come up in your entries. How did it feel to spend time with them today?",
+    ),
+    (
+        ("sleep", "slept", "sleeping", "tired", "rest", "rested", "exhausted"),
+        "You've mentioned sleep or tiredness recently. Want to write about how you're resting?",
+    ),
+    (
+        ("trip", "trips", "travel", "travelled", "traveled", "traveling", "travelling", "vacation", "europe"),
+        "You've been writing about the trip. What are you most looking forward to?",
+    ),
+    (
+        ("grateful", "thankful", "happy"),
+        "You've written about gratitude lately. What's one thing you're grateful for right now?",
+    ),
+]
+_NUDGE_MATCHER = _rule_matcher(_NUDGE_RULES)
+
+# Single pass over the combined recent text when no theme recurs.
+_PROMPT_RULES: list[tuple[tuple[str, ...], str]] = [
+    (("stress", "stressed", "stressful", "work", "busy", "overwhelm", "overwhelmed"), "How did you find moments of calm today?"),
+    (("grateful", "thank", "thanks", "thankful", "good", "happy"), "What's one thing you're grateful for right now?"),
+    (("sleep", "slept", "tired", "rest", "rested"), "How are you feeling after rest (or lack of it)?"),
+]
+_PROMPT_MATCHER = _rule_matcher(_PROMPT_RULES)
+
+
 def _recurring_theme_nudge(entries: list[dict]) -> Optional[str]:
     """Build a nudge from recurring themes in recent entries (no LLM). E.g. 'You've mentioned work a few times recently. Want to write about how it felt today?'"""
     if not entries or len(entries) < 2:
         return None
-    recent = entries[:7]
-    def entries_mention(*words):
-        return sum(1 for e in recent if any(w in ((e.get("content") or "").lower()) for w in words)) >= 2
-    if entries_mention("work", "job", "boss", "meeting"):
-        return "You've mentioned work a few times recently. Want to write about how it felt today?"
-    if entries_mention("stress", "stressed", "overwhelm"):
-        return "You've written about stress lately. Want to write about how it felt today?"
-    if entries_mention("family", "kids", "child", "parent"):
-        return "Family has come up in your entries. How did it feel to spend time with them today?"
-    if entries_mention("sleep", "tired", "rest", "exhausted"):
-        return "You've mentioned sleep or tiredness recently. Want to write about how you're resting?"
-    if entries_mention("trip", "travel", "vacation", "europe"):
-        return "You've been writing about the trip. What are you most looking forward to?"
-    if entries_mention("grateful", "thankful", "happy"):
-        return "You've written about gratitude lately. What's one thing you're grateful for right now?"
+    counts = [0] * len(_NUDGE_RULES)
+    for e in entries[:7]:
+        for index in _NUDGE_MATCHER.labels(e.get("content") or ""):
+            counts[index] += 1
+    for index, count in enumerate(counts):
+        if count >= 2:
+            return _NUDGE_RULES[index][1]
     return None
 
 
@@ -154,25 +247,21 @@ def fallback_prompt(entries: list[dict]) -> str:
     nudge = _recurring_theme_nudge(entries)
     if nudge:
         return nudge
-    content = " ".join(e.get("content", "") for e in entries[:5]).lower()
-    if any(w in content for w in ["stress", "stressed", "work", "busy", "overwhelm"]):
-        return "How did you find moments of calm today?"
-    if any(w in content for w in ["grateful", "thank", "good", "happy"]):
-        return "What's one thing you're grateful for right now?"
-    if any(w in content for w in ["sleep", "tired", "rest"]):
-        return "How are you feeling after rest (or lack of it)?"
+    hits = _PROMPT_MATCHER.labels(" ".join(e.get("content") or "" for e in entries[:5]))
+    if hits:
+        return _PROMPT_RULES[min(hits)][1]
     return "What would you like to reflect on today?"
 
 
 @app.get("/api/v1/prompts/today", response_model=PromptResponse)
-def get_today_prompt(authorization: Optional[str] = Header(None)):
+async def get_today_prompt(authorization: Optional[str] = Header(None)):
     token = None
     if authorization and authorization.startswith("Bearer "):
         token = authorization[7:]
     if not token:
         raise HTTPException(status_code=401, detail="Authorization required")
-    entries = get_recent_entries(token)
-    prompt = generate_prompt_with_llm(entries)
+    entries = await get_recent_entries(token)
+    prompt = await generate_prompt_with_llm(entries)
     if not prompt:
         prompt = fallback_prompt(entries)
     # Sanitize: single line, no extra quotes
@@ -189,7 +278,7 @@ def get_suggestions(authorization: Optional[str] = Header(None)):
     return SuggestionsResponse(suggestions=SUGGESTION_PROMPTS[:5])
 
 
-def get_contextual_follow_ups(last_entry: str, count: int = 2) -> list[str]:
+async def get_contextual_follow_ups(last_entry: str, count: int = 2) -> list[str]:
     """
     Return 2 conversational, context-aware follow-up prompts based on what the user wrote.
     Uses the LLM when available; fills with keyword-based fallback when needed.
@@ -215,12 +304,14 @@ Format: output exactly two lines. Line 1: first question. Line 2: second questio
 ---
 
 Write TWO short follow-up questions (different angles) that refer to something specific in the entry above. One per line."""
-    text = llm_chat(
+    text = await llm_chat(
         messages=[
             {"role": "system", "content": system},
             {"role": "user", "content": user_content},
         ],
         max_tokens=100,
+        cache_site="follow_up",
+        cache_ttl=LLM_CACHE_TTL_FOLLOW_UP,
     )
     if not text or not text.strip():
         return [fallback_one, fallback_two]
@@ -239,9 +330,9 @@ Write TWO short follow-up questions (different angles) that refer to something s
     return [fallback_one, fallback_two]
 
 
-def _follow_up_prompts(last_entry: Optional[str]) -> list[str]:
+async def _follow_up_prompts(last_entry: Optional[str]) -> list[str]:
     if last_entry and last_entry.strip():
-        return get_contextual_follow_ups(last_entry.strip(), 2)
+        return await get_contextual_follow_ups(last_entry.strip(), 2)
     return [random.choice(FOLLOW_UP_PROMPTS), random.choice(FOLLOW_UP_PROMPTS)]
 
 
@@ -251,7 +342,7 @@ class FollowUpResponse(BaseModel):
 
 
 @app.get("/api/v1/prompts/follow-up", response_model=FollowUpResponse)
-def get_follow_up(
+async def get_follow_up(
     authorization: Optional[str] = Header(None),
     last_entry: Optional[str] = None,
 ):
@@ -259,7 +350,7 @@ def get_follow_up(
         pass
     else:
         raise HTTPException(status_code=401, detail="Authorization required")
-    prompts = _follow_up_prompts(last_entry)
+    prompts = await _follow_up_prompts(last_entry)
     return FollowUpResponse(prompt=prompts[0] if prompts else None, prompts=prompts[:2])
 
 
@@ -268,13 +359,13 @@ class FollowUpRequest(BaseModel):
 
 
 @app.post("/api/v1/prompts/follow-up", response_model=FollowUpResponse)
-def post_follow_up(authorization: Optional[str] = Header(None), body: Optional[FollowUpRequest] = None):
+async def post_follow_up(authorization: Optional[str] = Header(None), body: Optional[FollowUpRequest] = None):
     if authorization and authorization.startswith("Bearer "):
         pass
     else:
         raise HTTPException(status_code=401, detail="Authorization required")
     last = (body.last_entry if body else None) or ""
-    prompts = _follow_up_prompts(last)
+    prompts = await _follow_up_prompts(last)
     return FollowUpResponse(prompt=prompts[0] if prompts else None, prompts=prompts[:2])
 
 
@@ -283,6 +374,34 @@ def health():
     return {"status": "ok"}
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus text format: LLM response cache lookups per call site and scheduler queues per workload class."""
+    lines = [
+        "# HELP llm_cache_total LLM response cache lookups by call site and result (hit or miss).",
+        "# TYPE llm_cache_total counter",
+    ]
+    for (site, result), count in sorted(llm_cache_stats().items()):
+        lines.append(f'llm_cache_total{{result="{result}",site="{site}"}} {count}')
+    stats = llm_scheduler.stats()
+    for name, field, kind, doc in (
+        ("llm_queue_depth", "queued", "gauge", "LLM calls waiting for a scheduler slot, per workload class."),
+        ("llm_active_calls", "active", "gauge", "LLM calls holding a scheduler slot, per workload class."),
+        ("llm_queue_wait_seconds_sum", "wait_seconds", "counter", "Total time LLM calls waited for a slot, per workload class."),
+        ("llm_queue_wait_seconds_count", "admitted", "counter", "LLM calls admitted by the scheduler, per workload class."),
+    ):
+        lines += [f"# HELP {name} {doc}", f"# TYPE {name} {kind}"]
+        lines += [f'{name}{{workload="{w}"}} {s[field]}' for w, s in stats.items()]
+    lines += [
+        "# HELP llm_rejected_total LLM calls rejected by the scheduler, by workload class and reason (full or timeout).",
+        "# TYPE llm_rejected_total counter",
+    ]
+    for w, s in stats.items():
+        for reason in ("full", "timeout"):
+            lines.append(f'llm_rejected_total{{reason="{reason}",workload="{w}"}} {s["rejected_" + reason]}')
+    return "\n".join(lines) + "\n"
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=int(os.getenv("PORT", "8000")))
@@ -0,0 +1,5 @@
+-- SHA-256 of the content each sentiment_result row was analyzed from, so entry.updated / entry.deleted
+-- events adjust the TF-IDF document frequencies only when the stored row matches the event's previous
+-- content (a replayed event is not applied twice). Existing rows stay NULL and are trusted once.
+-- Run against the analytics DB.
+ALTER TABLE sentiment_result ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64);
@@ -0,0 +1,50 @@
+-- Per-user daily rollups read by the Insights API (sentiment series, week caption, theme counts, emotions over time).
+-- The consumer keeps them up to date incrementally; this script creates the tables and (re)builds them
+-- from sentiment_result. Safe to re-run, e.g. after loading seed data directly with psql.
+-- user_daily_theme is keyed by canonical theme id: analytics-add-theme-registry.sql creates it and
+-- `python ai-services/theme_registry.py --rebuild` rebuilds it.
+-- Stop the consumer while it runs. Requires analytics-unique-entry-id.sql.
+-- Run against the analytics DB.
+CREATE TABLE IF NOT EXISTS user_daily_sentiment (
+    user_id VARCHAR(255) NOT NULL,
+    day DATE NOT NULL,
+    score_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    score_count INTEGER NOT NULL DEFAULT 0,
+    score_sumsq DOUBLE PRECISION NOT NULL DEFAULT 0,
+    positive_count INTEGER NOT NULL DEFAULT 0,
+    negative_count INTEGER NOT NULL DEFAULT 0,
+    neutral_count INTEGER NOT NULL DEFAULT 0,
+    mixed_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, day)
+);
+
+CREATE TABLE IF NOT EXISTS user_daily_emotion (
+    user_id VARCHAR(255) NOT NULL,
+    day DATE NOT NULL,
+    emotion VARCHAR(50) NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, day, emotion)
+);
+
+BEGIN;
+TRUNCATE user_daily_sentiment, user_daily_emotion;
+
+INSERT INTO user_daily_sentiment
+    (user_id, day, score_sum, score_count, score_sumsq, positive_count, negative_count, neutral_count, mixed_count)
+SELECT user_id, DATE(computed_at), SUM(score), COUNT(*), SUM(score * score),
+    COUNT(*) FILTER (WHERE label = 'positive'),
+    COUNT(*) FILTER (WHERE label = 'negative'),
+    COUNT(*) FILTER (WHERE label = 'neutral'),
+    COUNT(*) FILTER (WHERE label = 'mixed')
+FROM sentiment_result
+GROUP BY user_id, DATE(computed_at);
+
+INSERT INTO user_daily_emotion (user_id, day, emotion, count)
+SELECT sr.user_id, DATE(sr.computed_at), e.emotion, COUNT(*)
+FROM sentiment_result sr
+CROSS JOIN LATERAL jsonb_array_elements_text(
+    CASE WHEN jsonb_typeof(sr.emotions) = 'array' THEN sr.emotions ELSE '[]'::jsonb END
+) AS e(emotion)
+WHERE e.emotion != ''
+GROUP BY sr.user_id, DATE(sr.computed_at), e.emotion;
+COMMIT;
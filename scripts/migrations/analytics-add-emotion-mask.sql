@@ -0,0 +1,22 @@
+-- Emotions as a smallint bitmask next to the JSONB list (bit i = EMOTION_TAXONOMY[i] in ai-services/emotions.py:
+-- anxious 1, sad 2, frustrated 4, grateful 8, calm 16, hopeful 32, tired 64, content 128), so per-emotion
+-- counts are one pass of bit tests. Backfills existing rows; safe to re-run, e.g. after loading seed data.
+-- Run against the analytics DB.
+ALTER TABLE sentiment_result ADD COLUMN IF NOT EXISTS emotion_mask SMALLINT NOT NULL DEFAULT 0;
+
+UPDATE sentiment_result sr SET emotion_mask = m.mask
+FROM (
+    SELECT s.entry_id, COALESCE(SUM(DISTINCT CASE e.emotion
+        WHEN 'anxious' THEN 1 WHEN 'sad' THEN 2 WHEN 'frustrated' THEN 4 WHEN 'grateful' THEN 8
+        WHEN 'calm' THEN 16 WHEN 'hopeful' THEN 32 WHEN 'tired' THEN 64 WHEN 'content' THEN 128
+    END), 0)::smallint AS mask
+    FROM sentiment_result s
+    LEFT JOIN LATERAL jsonb_array_elements_text(
+        CASE WHEN jsonb_typeof(s.emotions) = 'array' THEN s.emotions ELSE '[]'::jsonb END
+    ) AS e(emotion) ON true
+    GROUP BY s.entry_id
+) m
+WHERE sr.entry_id = m.entry_id AND sr.emotion_mask IS DISTINCT FROM m.mask;
+
+CREATE INDEX IF NOT EXISTS idx_sentiment_user_computed_emotions
+    ON sentiment_result (user_id, computed_at) INCLUDE (emotion_mask) WHERE emotion_mask <> 0;
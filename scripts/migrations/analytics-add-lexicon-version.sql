@@ -0,0 +1,6 @@
+-- Hot-reloadable lexicons: stamp the keyword lexicon version on each result row so a targeted
+-- re-analysis (backfill.py --stale-lexicon) can find rows from older lexicons.
+-- Run against the analytics DB.
+ALTER TABLE sentiment_result ADD COLUMN IF NOT EXISTS lexicon_version VARCHAR(64);
+ALTER TABLE theme_result ADD COLUMN IF NOT EXISTS lexicon_version VARCHAR(64);
+CREATE INDEX IF NOT EXISTS ix_sentiment_result_lexicon_version ON sentiment_result (lexicon_version);
@@ -0,0 +1,16 @@
+-- Lag-aware degradation: keyword-only rows written under backlog are marked provisional and queued
+-- for LLM re-enrichment once the consumer catches up.
+-- Run against the analytics DB.
+ALTER TABLE sentiment_result ADD COLUMN IF NOT EXISTS provisional BOOLEAN NOT NULL DEFAULT false;
+ALTER TABLE theme_result ADD COLUMN IF NOT EXISTS provisional BOOLEAN NOT NULL DEFAULT false;
+
+CREATE TABLE IF NOT EXISTS reenrichment_queue (
+    entry_id UUID PRIMARY KEY,
+    user_id VARCHAR(255) NOT NULL,
+    content TEXT NOT NULL,
+    entry_created_at TIMESTAMP,
+    enqueued_at TIMESTAMP DEFAULT (NOW() AT TIME ZONE 'utc'),
+    claimed_at TIMESTAMP,
+    attempts INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS ix_reenrichment_queue_enqueued_at ON reenrichment_queue (enqueued_at);
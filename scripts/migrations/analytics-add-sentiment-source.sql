@@ -0,0 +1,4 @@
+-- Local sentiment model: record which analyzer produced each sentiment row (llm | model | keyword).
+-- train_sentiment_model.py trains on the llm rows. Rows written before this migration stay NULL (unknown).
+-- Run against the analytics DB.
+ALTER TABLE sentiment_result ADD COLUMN IF NOT EXISTS sentiment_source VARCHAR(16);
@@ -0,0 +1,15 @@
+-- TF-IDF keyword themes: per-user ("scope" = user_id) and global ("*") document frequencies, kept up to
+-- date incrementally by the consumer. After creating the tables, fill them from existing entries with
+-- `python ai-services/term_stats.py --rebuild` (consumer stopped).
+-- Run against the analytics DB.
+CREATE TABLE IF NOT EXISTS term_df (
+    scope VARCHAR(255) NOT NULL,
+    term VARCHAR(64) NOT NULL,
+    df INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (scope, term)
+);
+
+CREATE TABLE IF NOT EXISTS term_df_docs (
+    scope VARCHAR(255) PRIMARY KEY,
+    docs INTEGER NOT NULL DEFAULT 0
+);
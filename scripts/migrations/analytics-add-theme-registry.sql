@@ -0,0 +1,30 @@
+-- Canonical theme registry: normalized themes with integer ids (theme), one row per entry theme
+-- (entry_theme), and user_daily_theme counted by theme_id instead of free text. The consumer keeps
+-- them up to date; after this script, fill them from theme_result with
+-- `python ai-services/theme_registry.py --rebuild` (consumer stopped). Re-run the rebuild after
+-- seeding or after editing theme_aliases in the lexicon.
+-- Run against the analytics DB.
+CREATE TABLE IF NOT EXISTS theme (
+    id SERIAL PRIMARY KEY,
+    name VARCHAR(64) NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS entry_theme (
+    entry_id UUID NOT NULL,
+    theme_id INTEGER NOT NULL REFERENCES theme (id),
+    user_id VARCHAR(255) NOT NULL,
+    day DATE NOT NULL,
+    PRIMARY KEY (entry_id, theme_id)
+);
+CREATE INDEX IF NOT EXISTS idx_entry_theme_user_day ON entry_theme (user_id, day, theme_id);
+CREATE INDEX IF NOT EXISTS ix_entry_theme_theme_id ON entry_theme (theme_id);
+
+-- The text-keyed rollup is rebuilt by theme_registry.py --rebuild.
+DROP TABLE IF EXISTS user_daily_theme;
+CREATE TABLE user_daily_theme (
+    user_id VARCHAR(255) NOT NULL,
+    day DATE NOT NULL,
+    theme_id INTEGER NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, day, theme_id)
+);
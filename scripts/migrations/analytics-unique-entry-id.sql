@@ -0,0 +1,19 @@
+-- One sentiment_result / theme_result row per entry so the consumer can upsert (replays, rebalances, backfills).
+-- Removes duplicate rows (keeps the earliest computed_at so entries stay on their original day), then
+-- replaces the plain entry_id indexes with unique ones.
+-- Run against the analytics DB.
+DELETE FROM sentiment_result a
+USING sentiment_result b
+WHERE a.entry_id = b.entry_id
+  AND (a.computed_at, a.id) > (b.computed_at, b.id);
+
+DELETE FROM theme_result a
+USING theme_result b
+WHERE a.entry_id = b.entry_id
+  AND (a.computed_at, a.id) > (b.computed_at, b.id);
+
+DROP INDEX IF EXISTS ix_sentiment_result_entry_id;
+CREATE UNIQUE INDEX IF NOT EXISTS ix_sentiment_result_entry_id ON sentiment_result (entry_id);
+
+DROP INDEX IF EXISTS ix_theme_result_entry_id;
+CREATE UNIQUE INDEX IF NOT EXISTS ix_theme_result_entry_id ON theme_result (entry_id);